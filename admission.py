@@ -0,0 +1,121 @@
+"""
+任务提交的准入控制
+- 等待队列深度上限（max_pending_tasks）：pending 任务过多时拒绝新的提交
+- 单次提交的任务数上限（max_tasks_per_request）
+- 按调用方限速（submit_rate_limit，每分钟任务数）：令牌桶，允许一次性提交一分钟的配额
+超限时接口返回 429 与 Retry-After，调用方据此自行降速，而不是拖慢整个系统。
+
+调用方按 X-API-Key 区分（只保存哈希），没有 API Key 的请求按客户端地址区分。
+限速状态保存在进程内，多 worker 部署时每个 worker 单独计数。
+"""
+import math
+import time
+import hashlib
+import threading
+
+# 队列已满时建议的重试间隔（秒）
+QUEUE_FULL_RETRY_AFTER = 30
+# 长时间没有提交的调用方会被清理，避免令牌桶无限增长
+IDLE_BUCKET_TTL = 3600
+
+
+class AdmissionError(Exception):
+    """提交被拒绝；retry_after 为建议的重试间隔（秒）"""
+
+    def __init__(self, message, code, retry_after, details=None):
+        super().__init__(message)
+        self.code = code
+        self.retry_after = retry_after
+        self.details = details or {}
+
+
+class SubmitRateLimiter:
+    """按调用方的令牌桶，每个令牌对应一个任务"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}  # client: [剩余令牌, 上次更新时间]
+
+    def consume(self, client, count, rate_per_minute):
+        """
+        尝试扣除 count 个令牌；成功返回剩余令牌数，不足时返回需要等待的秒数（负数表示等待时间）
+        """
+        capacity = float(rate_per_minute)
+        rate = capacity / 60.0
+        now = time.time()
+        with self.lock:
+            self._sweep(now)
+            tokens, updated = self.buckets.get(client, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if count <= tokens:
+                tokens -= count
+                self.buckets[client] = [tokens, now]
+                return int(tokens)
+            self.buckets[client] = [tokens, now]
+            return -max(1, math.ceil((count - tokens) / rate))
+
+    def _sweep(self, now):
+        if len(self.buckets) < 1000:
+            return
+        for client in [c for c, (_, updated) in self.buckets.items() if now - updated > IDLE_BUCKET_TTL]:
+            del self.buckets[client]
+
+
+submit_limiter = SubmitRateLimiter()
+
+
+def _int_setting(db, key, default):
+    try:
+        return int(db.get_setting(key, default))
+    except Exception:
+        return default
+
+
+def client_key(request):
+    """限速使用的调用方标识"""
+    api_key = request.headers.get('X-API-Key')
+    if api_key:
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    return 'addr:' + (request.remote_addr or '')
+
+
+def get_queue_status(db):
+    """等待队列深度与上限（max_pending 为 0 表示不限制）"""
+    pending = db.get_task_stats().get('pending', 0)
+    max_pending = _int_setting(db, 'max_pending_tasks', 2000)
+    return {
+        'pending': pending,
+        'max_pending': max_pending,
+        'available': max(0, max_pending - pending) if max_pending > 0 else None,
+    }
+
+
+def admit_submission(db, client, count):
+    """
+    检查能否接受 count 个新任务，不能时抛出 AdmissionError；
+    返回 {'queue': 队列状态, 'rate_remaining': 剩余配额或 None}
+    """
+    max_per_request = _int_setting(db, 'max_tasks_per_request', 500)
+    if max_per_request > 0 and count > max_per_request:
+        # 重试也不会成功，调用方需要拆分请求
+        raise AdmissionError(f"单次最多提交 {max_per_request} 个任务", 'TOO_MANY_TASKS', None,
+                             {'max_tasks_per_request': max_per_request})
+
+    queue = get_queue_status(db)
+    if queue['available'] is not None and count > queue['available']:
+        raise AdmissionError(f"等待队列已满（{queue['pending']}/{queue['max_pending']}），请稍后再提交",
+                             'QUEUE_FULL', QUEUE_FULL_RETRY_AFTER, {'queue': queue})
+
+    rate_remaining = None
+    rate_limit = _int_setting(db, 'submit_rate_limit', 600)
+    if rate_limit > 0:
+        if count > rate_limit:
+            raise AdmissionError(f"单次提交超过每分钟配额 {rate_limit}", 'TOO_MANY_TASKS', None,
+                                 {'submit_rate_limit': rate_limit})
+        result = submit_limiter.consume(client, count, rate_limit)
+        if result < 0:
+            raise AdmissionError(f"提交过于频繁（每分钟最多 {rate_limit} 个任务）", 'RATE_LIMITED', -result,
+                                 {'queue': queue, 'submit_rate_limit': rate_limit})
+        rate_remaining = result
+
+    return {'queue': queue, 'rate_remaining': rate_remaining}
@@ -2,10 +2,16 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from pathlib import Path
 import traceback
+import signal
+import sys
+import os
+import threading
 
 import storage
 from downloader import DownloadManager
+from rpc import RPCClient, RemoteStorageDB, RemoteDownloadManager, EventBridge, RPC_ADDRESS_ENV, RPC_TOKEN_ENV
 from utils import SECRET_KEY
+from response_utils import init_response_handling
 from routes.auth import create_auth_blueprint
 from routes.views import create_views_blueprint
 from routes.api import create_api_blueprint
@@ -23,46 +29,44 @@ CORS(app, supports_credentials=True)
 # 初始化基于文件的存储
 storage.init_storage()
 
-# 提供一个兼容原先 Database 接口的轻量包装器给其他模块使用
-class StorageDB:
-    def get_setting(self, key, default=None):
-        return storage.get_setting(key, default)
-
-    def set_setting(self, key, value):
-        return storage.set_setting(key, value)
-
-    def get_all_settings(self):
-        return storage.get_all_settings()
-
-    def create_task(self, url, custom_name=None):
-        return storage.create_task(url, custom_name)
-
-    def get_task(self, task_id):
-        return storage.get_task(task_id)
-
-    def get_all_tasks(self):
-        return storage.get_all_tasks()
-
-    def get_tasks_by_status(self, status):
-        return storage.get_tasks_by_status(status)
-
-    def update_task(self, task_id, **kwargs):
-        return storage.update_task(task_id, **kwargs)
-
-    def add_log(self, task_id, message):
-        return storage.add_log(task_id, message)
-
-    def get_task_logs(self, task_id):
-        return storage.get_task_logs(task_id)
-
-    def delete_task(self, task_id):
-        return storage.delete_task(task_id)
-
-# 实例化并传递给下载管理器与蓝图
-db = StorageDB()
-
-# 初始化下载管理器 (配置将从 storage 读取)
-download_manager = DownloadManager(db)
+# 设置了 DOWNLOADER_RPC_ADDRESS 时，下载队列运行在独立的守护进程（daemon.py）中，
+# 本进程只作为客户端，可以用多 worker 的 WSGI 服务器部署
+rpc_address = os.environ.get(RPC_ADDRESS_ENV, '').strip()
+
+if rpc_address:
+    rpc_client = RPCClient(rpc_address, token=os.environ.get(RPC_TOKEN_ENV) or None)
+    db = RemoteStorageDB(rpc_client)
+    download_manager = RemoteDownloadManager(rpc_client)
+    # 把守护进程的任务事件转发到本进程，供 /api/events 推送
+    EventBridge(rpc_client).start()
+else:
+    # 从任务文件重建变更序号与统计索引
+    storage.rebuild_task_index()
+    # 实例化并传递给下载管理器与蓝图
+    db = storage.StorageDB()
+    # 初始化下载管理器 (配置将从 storage 读取)
+    download_manager = DownloadManager(db)
+
+def _shutdown_handler(signum, frame):
+    """收到 SIGTERM/SIGINT 时优雅关闭：等待运行中的任务，超时后终止子进程并保留队列状态"""
+    try:
+        grace = float(storage.get_setting('shutdown_grace_period', 30))
+    except Exception:
+        grace = 30.0
+    print(f"收到信号 {signum}，正在关闭下载管理器（最多等待 {grace:.0f} 秒）...")
+    interrupted = download_manager.shutdown(timeout=grace)
+    if interrupted:
+        print(f"已中断任务 {interrupted}，将在重启后继续")
+    sys.exit(0)
+
+# 信号处理只能在主线程注册（例如被 WSGI 服务器在工作线程中导入时跳过）；
+# 客户端模式下关闭 Web 进程不影响守护进程中的下载
+if not rpc_address and threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGTERM, _shutdown_handler)
+    signal.signal(signal.SIGINT, _shutdown_handler)
+
+# JSON 序列化与响应压缩
+init_response_handling(app, db)
 
 # 注册蓝图
 app.register_blueprint(create_auth_blueprint(db))
@@ -0,0 +1,253 @@
+"""
+Aria2 RPC 客户端与推送任务监控
+所有推送出去的 GID 由一个后台线程统一跟踪：每轮通过 system.multicall 批量查询状态，
+复用同一个 requests.Session（连接池），完成后删除本地源文件并更新任务记录。
+传输进度（aria2_status / aria2_downloaded / aria2_total / aria2_speed）按节流间隔写入任务记录。
+"""
+import os
+import time
+import threading
+import requests
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except Exception:
+        return 0
+
+
+class Aria2Monitor:
+    """Aria2 推送监控器（单线程批量轮询）"""
+
+    # tellStatus 只取需要的字段，减少 RPC 响应体积
+    STATUS_KEYS = ['gid', 'status', 'totalLength', 'completedLength', 'downloadSpeed', 'errorMessage']
+
+    def __init__(self, db, poll_interval=2, track_timeout=3600):
+        """
+        Args:
+            db: 存储包装器（提供 get_setting / get_task / update_task / add_log）
+            poll_interval: 轮询间隔（秒）
+            track_timeout: 单个 GID 的最长跟踪时间（秒），超时后放弃并保留源文件
+        """
+        self.db = db
+        self.poll_interval = poll_interval
+        self.track_timeout = track_timeout
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.tracked = {}  # gid: {'task_id', 'file_path', 'delete_file', 'started', 'last_write', 'last_status'}
+        self.snapshots = {}  # gid: 最近一次查询到的进度，用于统计接口
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def _rpc_config(self):
+        return self.db.get_setting('aria2_rpc_url'), self.db.get_setting('aria2_rpc_secret')
+
+    def call(self, method, params, timeout=10):
+        """
+        调用单个 Aria2 RPC 方法，返回 result；RPC 返回错误时抛出异常。
+        如果设置了 secret，会把 token 放到 params 开头。
+        """
+        rpc_url, rpc_secret = self._rpc_config()
+        params = list(params)
+        if rpc_secret:
+            params.insert(0, f"token:{rpc_secret}")
+        payload = {
+            "jsonrpc": "2.0",
+            "method": method,
+            "id": method,
+            "params": params
+        }
+        response = self.session.post(rpc_url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise Exception(data['error'].get('message', str(data['error'])))
+        return data.get('result')
+
+    def multicall(self, calls, timeout=10):
+        """
+        批量调用，calls 为 [(method, params), ...]。
+        返回与 calls 等长的列表，每项为 result 或包含 code/message 的错误 dict。
+        """
+        rpc_url, rpc_secret = self._rpc_config()
+        items = []
+        for method, params in calls:
+            params = list(params)
+            if rpc_secret:
+                params.insert(0, f"token:{rpc_secret}")
+            items.append({'methodName': method, 'params': params})
+        payload = {
+            "jsonrpc": "2.0",
+            "method": "system.multicall",
+            "id": "multicall",
+            "params": [items]
+        }
+        response = self.session.post(rpc_url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise Exception(data['error'].get('message', str(data['error'])))
+        out = []
+        for item in data.get('result') or []:
+            # 成功项是单元素数组，失败项是 {code, message}
+            if isinstance(item, list):
+                out.append(item[0] if item else None)
+            else:
+                out.append(item if isinstance(item, dict) else {'code': -1, 'message': str(item)})
+        return out
+
+    def track(self, task_id, gid, file_path, delete_file=True):
+        """开始跟踪一个已推送的 GID"""
+        with self.lock:
+            self.tracked[gid] = {
+                'task_id': task_id,
+                'file_path': file_path,
+                'delete_file': delete_file,
+                'started': time.time(),
+                'last_write': 0,
+                'last_status': ''
+            }
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._monitor_worker, daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+
+    def get_tracked_count(self):
+        with self.lock:
+            return len(self.tracked)
+
+    def get_stats(self):
+        """汇总正在跟踪的 Aria2 传输：数量、活动数、总速度与已传输字节"""
+        with self.lock:
+            snapshots = [self.snapshots[g] for g in self.tracked if g in self.snapshots]
+            tracked = len(self.tracked)
+        return {
+            'tracked': tracked,
+            'active': sum(1 for x in snapshots if x['status'] == 'active'),
+            'waiting': sum(1 for x in snapshots if x['status'] in ('waiting', 'paused')),
+            'speed': sum(x['speed'] for x in snapshots),
+            'downloaded': sum(x['downloaded'] for x in snapshots),
+            'total': sum(x['total'] for x in snapshots)
+        }
+
+    def _monitor_worker(self):
+        """监控线程：没有待跟踪的 GID 时空闲等待"""
+        while True:
+            with self.lock:
+                pending = dict(self.tracked)
+            if not pending:
+                self.wakeup.wait(timeout=30)
+                self.wakeup.clear()
+                continue
+
+            try:
+                self.poll_once(pending)
+            except Exception as e:
+                print(f"Aria2 监控异常: {e}")
+                # Aria2 无法访问时超时同样生效，否则 GID 会被一直跟踪
+                self._expire_stale(pending, time.time())
+                time.sleep(5)
+                continue
+            time.sleep(self.poll_interval)
+
+    def poll_once(self, pending=None):
+        """批量查询一轮状态并处理结果"""
+        if pending is None:
+            with self.lock:
+                pending = dict(self.tracked)
+        if not pending:
+            return
+
+        gids = list(pending.keys())
+        results = self.multicall([('aria2.tellStatus', [gid, self.STATUS_KEYS]) for gid in gids], timeout=10)
+        now = time.time()
+        for gid, result in zip(gids, results):
+            info = pending[gid]
+            if isinstance(result, dict) and 'code' in result and 'status' not in result:
+                # GID 不存在等错误，视为已被移除
+                self._finish(gid)
+                self._log(info['task_id'], f"Aria2 任务查询失败: {result.get('message')}")
+                continue
+
+            status = (result or {}).get('status')
+            self._record_progress(gid, info, result or {}, now)
+            if status == 'complete':
+                self._finish(gid)
+                self._on_complete(info)
+            elif status in ('error', 'removed'):
+                self._finish(gid)
+                message = (result or {}).get('errorMessage') or ''
+                self._log(info['task_id'], f"Aria2 任务结束状态异常: {status} {message}".strip())
+            elif now - info['started'] > self.track_timeout:
+                self._finish(gid)
+                self._log(info['task_id'], "Aria2 监控超时，未删除源文件")
+
+    def _expire_stale(self, pending, now):
+        """停止跟踪超过 track_timeout 的 GID"""
+        for gid, info in pending.items():
+            if now - info['started'] > self.track_timeout:
+                self._finish(gid)
+                self._log(info['task_id'], "Aria2 监控超时，未删除源文件")
+
+    def _finish(self, gid):
+        with self.lock:
+            self.tracked.pop(gid, None)
+            self.snapshots.pop(gid, None)
+
+    def _record_progress(self, gid, info, result, now):
+        """记录进度快照；状态变化时立即写入任务记录，否则按 aria2_progress_interval 节流"""
+        status = result.get('status') or ''
+        snapshot = {
+            'status': status,
+            'downloaded': _to_int(result.get('completedLength')),
+            'total': _to_int(result.get('totalLength')),
+            'speed': _to_int(result.get('downloadSpeed'))
+        }
+        with self.lock:
+            self.snapshots[gid] = snapshot
+
+        try:
+            interval = float(self.db.get_setting('aria2_progress_interval', 5))
+        except Exception:
+            interval = 5.0
+        if status == info['last_status'] and now - info['last_write'] < interval:
+            return
+        info['last_status'] = status
+        info['last_write'] = now
+        try:
+            self.db.update_task(
+                info['task_id'],
+                aria2_status=status,
+                aria2_downloaded=snapshot['downloaded'],
+                aria2_total=snapshot['total'] or None,
+                aria2_speed=snapshot['speed']
+            )
+        except Exception:
+            pass
+
+    def _log(self, task_id, message):
+        try:
+            self.db.add_log(task_id, message)
+        except Exception:
+            pass
+
+    def _on_complete(self, info):
+        """Aria2 传输完成：按需删除源文件并更新任务记录"""
+        task_id = info['task_id']
+        file_path = info['file_path']
+        if not info.get('delete_file'):
+            self._log(task_id, "Aria2 下载完成")
+            return
+
+        self._log(task_id, "Aria2 下载完成，正在删除源文件")
+        try:
+            os.remove(file_path)
+            # 清空 file_path 之前先把文件名保存为 custom_name，前端仍能显示文件名
+            task = self.db.get_task(task_id)
+            if task and not task.get('custom_name'):
+                self.db.update_task(task_id, custom_name=os.path.basename(file_path))
+            self.db.update_task(task_id, file_path="")
+            self._log(task_id, "源文件已删除")
+        except Exception as e:
+            self._log(task_id, f"删除源文件失败: {e}")
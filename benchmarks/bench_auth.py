@@ -0,0 +1,110 @@
+"""
+认证请求延迟基准：用 Flask 测试客户端请求一个只套了 require_auth 的空接口，
+分别测 API Key、Cookie token、X-Admin-Password 与未认证请求的单次延迟。
+
+--cold 在每个请求前清空设置缓存与密码验证缓存，模拟改动前每次都解析 settings.json、
+每个 X-Admin-Password 请求都跑一次 bcrypt 的情况，用于前后对比。
+
+依赖：requirements.txt 中的包（Flask、bcrypt）
+用法：python benchmarks/bench_auth.py --requests 2000
+      python benchmarks/bench_auth.py --requests 50 --cold
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+PASSWORD = 'bench-password'
+API_KEY = 'bench-api-key'
+AUTH_TOKEN = 'bench-auth-token'
+
+
+def build_client():
+    """在当前目录（临时目录）下初始化存储与设置，返回 (测试客户端, storage, utils)"""
+    from flask import Flask, jsonify
+    import storage
+    import utils
+
+    storage.init_storage()
+    db = storage.StorageDB()
+    utils.set_admin_password_hash(db, PASSWORD)
+    db.set_setting('api_enabled', 'true')
+    db.set_setting('api_key', API_KEY)
+    db.set_setting('auth_token', AUTH_TOKEN)
+    # 设置文件再写一些常见的配置项，接近实际大小
+    for i in range(60):
+        db.set_setting(f'bench_padding_{i}', 'x' * 40)
+
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    @utils.require_auth(db)
+    def ping():
+        return jsonify({'ok': True})
+
+    return app.test_client(), storage, utils
+
+
+def clear_caches(storage, utils):
+    with storage._settings_lock:
+        storage._settings_cache.update({'key': None, 'values': None})
+    with utils._verified_lock:
+        utils._verified_credentials.clear()
+
+
+def measure(client, storage, utils, kwargs, expected, count, cold):
+    samples = []
+    for _ in range(count):
+        if cold:
+            clear_caches(storage, utils)
+        start = time.perf_counter()
+        response = client.get('/ping', **kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code != expected:
+            sys.exit(f"状态码 {response.status_code}，预期 {expected}: {kwargs}")
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def run(count, cold):
+    cases = [
+        ('API Key', {'headers': {'X-API-Key': API_KEY}}, 200),
+        ('Cookie token', {'cookie': AUTH_TOKEN}, 200),
+        ('X-Admin-Password', {'headers': {'X-Admin-Password': PASSWORD}}, 200),
+        ('错误的 API Key', {'headers': {'X-API-Key': 'wrong'}}, 401),
+        ('未认证', {}, 401),
+    ]
+    with tempfile.TemporaryDirectory() as workdir:
+        # storage 与 utils 都使用相对路径（./storage、./data），切到临时目录避免改动仓库中的数据
+        os.chdir(workdir)
+        client, storage, utils = build_client()
+        print(f"每种请求 {count} 次{'，每次请求前清空缓存（--cold）' if cold else ''}")
+        print(f"{'认证方式':<18} {'中位数(ms)':>10} {'p99(ms)':>10}")
+        for name, kwargs, expected in cases:
+            cookie = kwargs.pop('cookie', None)
+            if cookie:
+                client.set_cookie('auth_token', cookie)
+            # 预热一次，排除首个请求的导入与路由初始化开销
+            client.get('/ping', **kwargs)
+            median, p99 = measure(client, storage, utils, kwargs, expected, count, cold)
+            if cookie:
+                client.delete_cookie('auth_token')
+            print(f"{name:<18} {median:>10.3f} {p99:>10.3f}")
+        os.chdir(ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='认证请求延迟基准')
+    parser.add_argument('--requests', type=int, default=2000, help='每种认证方式的请求次数')
+    parser.add_argument('--cold', action='store_true', help='每个请求前清空设置缓存与密码验证缓存')
+    args = parser.parse_args()
+    run(args.requests, args.cold)
+
+
+if __name__ == '__main__':
+    main()
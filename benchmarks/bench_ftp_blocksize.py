@@ -0,0 +1,91 @@
+"""
+FTP 上传块大小基准：在本机启动 pyftpdlib 服务器，用不同的 blocksize 上传同一个文件，
+对比吞吐量与进度回调次数（回调会触发任务记录写入，次数越少开销越小）。
+
+依赖：pip install pyftpdlib
+用法：python benchmarks/bench_ftp_blocksize.py --size-mb 200
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ftp_uploader import FTPUploader  # noqa: E402
+
+BLOCK_SIZES = [8 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+
+
+def start_server(root):
+    """启动只监听 127.0.0.1 的 FTP 服务器，返回 (server, port)"""
+    try:
+        from pyftpdlib.authorizers import DummyAuthorizer
+        from pyftpdlib.handlers import FTPHandler
+        from pyftpdlib.servers import ThreadedFTPServer
+        from pyftpdlib.log import config_logging
+    except ImportError:
+        sys.exit('需要先安装 pyftpdlib: pip install pyftpdlib')
+
+    config_logging(level=logging.WARNING)
+    authorizer = DummyAuthorizer()
+    authorizer.add_user('bench', 'bench', root, perm='elradfmwMT')
+    handler = FTPHandler
+    handler.authorizer = authorizer
+    server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, kwargs={'timeout': 0.5}, daemon=True).start()
+    return server, server.address[1]
+
+
+def run(size_mb, repeat):
+    with tempfile.TemporaryDirectory() as local_dir, tempfile.TemporaryDirectory() as remote_dir:
+        source = os.path.join(local_dir, 'source.bin')
+        with open(source, 'wb') as f:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(size_mb):
+                f.write(chunk)
+
+        server, port = start_server(remote_dir)
+        try:
+            print(f"文件大小 {size_mb} MB，每个块大小上传 {repeat} 次取最快一次")
+            print(f"{'blocksize':>10} {'耗时(s)':>9} {'MB/s':>9} {'回调次数':>9}")
+            for blocksize in BLOCK_SIZES:
+                best = None
+                callbacks = 0
+                for _ in range(repeat):
+                    counter = {'calls': 0}
+
+                    def progress(uploaded, total):
+                        counter['calls'] += 1
+
+                    uploader = FTPUploader('127.0.0.1', port, 'bench', 'bench')
+                    success, msg = uploader.connect()
+                    if not success:
+                        sys.exit(msg)
+                    start = time.perf_counter()
+                    success, msg = uploader.upload_file(source, 'target.bin', progress, blocksize=blocksize)
+                    elapsed = time.perf_counter() - start
+                    uploader.disconnect()
+                    if not success:
+                        sys.exit(msg)
+                    if best is None or elapsed < best:
+                        best = elapsed
+                    callbacks = counter['calls']
+                print(f"{blocksize // 1024:>8}KB {best:>9.2f} {size_mb / best:>9.1f} {callbacks:>9}")
+        finally:
+            server.close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FTP 上传块大小基准')
+    parser.add_argument('--size-mb', type=int, default=200, help='上传文件大小（MB）')
+    parser.add_argument('--repeat', type=int, default=3, help='每个块大小重复次数')
+    args = parser.parse_args()
+    run(args.size_mb, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
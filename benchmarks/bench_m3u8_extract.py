@@ -0,0 +1,87 @@
+"""
+m3u8 链接提取基准：对 benchmarks/corpus 中的页面样本运行 page_parser.extract_m3u8_urls，
+输出耗时、吞吐量，并核对结果与 corpus/expected.json 是否一致。
+
+--legacy 同时运行改动前基于四个正则的提取方式作为对比
+（adversarial.html 上是平方复杂度，需要数秒）。
+
+用法：python benchmarks/bench_m3u8_extract.py --repeat 5 --legacy
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCH_DIR, 'corpus')
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import page_parser  # noqa: E402
+
+PAGE_URL = 'https://site.com/watch'
+
+
+def legacy_extract(html_content):
+    """改动前的实现：四个正则各扫描一遍全文"""
+    m3u8_urls = set()
+    for m in re.findall(r"var\s+hlsUrl\s*=\s*['\"]([^'\"]+\.m3u8[^'\"]*)['\"]", html_content):
+        m3u8_urls.add(m)
+    for m in re.findall(r'"url"\s*:\s*"([^"]+\.m3u8[^"]*)"', html_content):
+        m3u8_urls.add(m.replace('\\/', '/'))
+    for m in re.findall(r'src\s*=\s*["\']([^"\']+\.m3u8[^"\']*)["\']', html_content):
+        m3u8_urls.add(m)
+    for m in re.findall(r'(https?://[^\s"\'<>]+?\.m3u8[^\s"\'<>]*)', html_content):
+        m3u8_urls.add(m)
+    return [u for u in m3u8_urls if u.startswith('http')]
+
+
+def timed(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(repeat, legacy):
+    with open(os.path.join(CORPUS_DIR, 'expected.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+
+    header = f"{'样本':<20} {'大小(KB)':>9} {'耗时(ms)':>9} {'MB/s':>8} {'链接':>5}"
+    if legacy:
+        header += f" {'旧耗时(ms)':>10} {'旧MB/s':>8} {'旧链接':>6}"
+    print(f"每个样本运行 {repeat} 次取最快一次")
+    print(header)
+    mismatched = []
+    for name, urls in expected.items():
+        with open(os.path.join(CORPUS_DIR, name), encoding='utf-8') as f:
+            html = f.read()
+        mb = len(html.encode('utf-8')) / 1e6
+        elapsed, found = timed(lambda: page_parser.extract_m3u8_urls(html, PAGE_URL), repeat)
+        if found != urls:
+            mismatched.append(name)
+        line = f"{name:<20} {mb * 1000:>9.0f} {elapsed * 1000:>9.2f} {mb / elapsed:>8.1f} {len(found):>5}"
+        if legacy:
+            # 旧实现在病态输入上很慢，只运行一次
+            old_elapsed, old_found = timed(lambda: legacy_extract(html), 1 if 'adversarial' in name else repeat)
+            line += f" {old_elapsed * 1000:>10.2f} {mb / old_elapsed:>8.1f} {len(old_found):>6}"
+        print(line)
+    if mismatched:
+        sys.exit(f"提取结果与 expected.json 不一致: {', '.join(mismatched)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='m3u8 链接提取基准')
+    parser.add_argument('--repeat', type=int, default=5, help='每个样本的运行次数')
+    parser.add_argument('--legacy', action='store_true', help='同时运行改动前的正则实现')
+    args = parser.parse_args()
+    run(args.repeat, args.legacy)
+
+
+if __name__ == '__main__':
+    main()
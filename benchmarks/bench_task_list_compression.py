@@ -0,0 +1,130 @@
+"""
+任务列表响应大小与序列化耗时基准：在临时目录中创建一批带长 URL 的任务，
+对比完整字段 / ?fields= 投影、标准库 JSON / orjson、不压缩 / gzip / br 的响应大小与耗时。
+
+投影字段取自 static/js/common.js 中的 TASK_LIST_FIELDS（列表页实际请求的字段）。
+
+依赖：requirements.txt 中的包；orjson、brotli 可选，未安装时跳过对应的行
+用法：python benchmarks/bench_task_list_compression.py --tasks 1000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def list_fields():
+    """读取前端列表页使用的字段"""
+    with open(os.path.join(ROOT, 'static', 'js', 'common.js'), encoding='utf-8') as f:
+        match = re.search(r'TASK_LIST_FIELDS\s*=\s*\[(.*?)\]', f.read(), re.DOTALL)
+    return ','.join(re.findall(r"'(\w+)'", match.group(1)))
+
+
+def build_tasks(storage, count):
+    """按真实流程创建任务并写入下载结果，URL 带长签名参数"""
+    rng = random.Random(1)
+
+    def token(n):
+        return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(n))
+
+    for i in range(count):
+        url = (f"https://cdn{i % 7}.video-site.com/hls/{token(16)}/{token(24)}/master.m3u8"
+               f"?auth_key={token(64)}&expires={1700000000 + i}&sign={token(40)}")
+        policy = {'max_height': 1080, 'prefer_codec': 'avc1', 'audio_lang': 'zh'}
+        tid = storage.create_task(url, custom_name=f"视频 {i} {token(12)}", selection_policy=policy)
+        storage.update_task(
+            tid, status=rng.choice(['completed', 'completed', 'failed', 'pending']),
+            progress=100.0, file_path=f"./downloads/video_{i}_{token(8)}.mp4",
+            file_size=rng.randint(10 ** 8, 4 * 10 ** 9), duration=rng.uniform(60, 7200),
+            selected_variant={'url': url.replace('master', '1080p'), 'bandwidth': 5000000,
+                              'resolution': '1920x1080', 'codecs': 'avc1.640028,mp4a.40.2'},
+            expected_size=rng.randint(10 ** 8, 4 * 10 ** 9), total_size='1.2GB', downloaded_size='1.2GB',
+            error_message='' if i % 5 else f"HTTP 403: {token(80)}",
+        )
+    return storage.get_all_tasks()
+
+
+def timed(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def run(count, repeat):
+    from response_utils import parse_fields, project
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # storage 使用相对路径 ./storage，切到临时目录避免改动仓库中的数据
+        os.chdir(workdir)
+        import storage
+        tasks = build_tasks(storage, count)
+        os.chdir(ROOT)
+
+    fields = parse_fields(list_fields())
+    payloads = {
+        'full': {'tasks': tasks, 'seq': count * 2},
+        'fields': {'tasks': project(tasks, fields), 'seq': count * 2},
+    }
+    # 与 Flask 默认 JSON 实现相同的参数
+    encoders = [('json', lambda obj: json.dumps(obj, ensure_ascii=True, sort_keys=True,
+                                                separators=(',', ':')).encode('utf-8'))]
+    if orjson is not None:
+        encoders.append(('orjson', lambda obj: orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)))
+    compressors = [('-', lambda data: data), ('gzip', lambda data: gzip.compress(data, compresslevel=6, mtime=0))]
+    if brotli is not None:
+        from response_utils import BROTLI_QUALITY
+        compressors.append(('br', lambda data: brotli.compress(data, quality=BROTLI_QUALITY)))
+
+    print(f"{count} 个任务，每项运行 {repeat} 次取最快一次；fields={','.join(sorted(fields))}")
+    if orjson is None:
+        print("未安装 orjson，跳过 orjson 行")
+    if brotli is None:
+        print("未安装 brotli，跳过 br 行")
+    print(f"{'字段':<7} {'序列化':<7} {'压缩':<5} {'大小(KB)':>9} {'相对完整':>8} {'序列化(ms)':>10} {'压缩(ms)':>9} {'合计(ms)':>9}")
+    baseline = None
+    for payload_name, payload in payloads.items():
+        for encoder_name, encode in encoders:
+            encode_ms, data = timed(lambda: encode(payload), repeat)
+            for compressor_name, compress in compressors:
+                compress_ms, body = timed(lambda: compress(data), repeat)
+                if compressor_name == '-':
+                    compress_ms = 0.0
+                if baseline is None:
+                    baseline = len(body)
+                print(f"{payload_name:<7} {encoder_name:<7} {compressor_name:<5} {len(body) / 1024:>9.1f} "
+                      f"{len(body) / baseline:>8.1%} {encode_ms:>10.2f} {compress_ms:>9.2f} {encode_ms + compress_ms:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='任务列表响应大小与序列化耗时基准')
+    parser.add_argument('--tasks', type=int, default=1000, help='任务数量')
+    parser.add_argument('--repeat', type=int, default=5, help='每项重复次数')
+    args = parser.parse_args()
+    run(args.tasks, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
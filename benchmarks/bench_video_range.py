@@ -0,0 +1,151 @@
+"""
+视频 Range 拖动压测：在临时目录中启动应用（app.py，多线程 WSGI 服务器），
+生成一个数百 MB 的视频文件，用多个线程并发请求 /videos/<文件名>，模拟播放器拖动进度条：
+- bytes=N-M：随机位置的固定长度区间
+- bytes=N-：从随机位置读到末尾，读取 --span-kb 后断开连接（播放器拖动时的常见行为）
+输出吞吐量、延迟分位数（首字节与完整响应）、状态码分布以及 file_cache 的命中率，
+并核对每个响应的内容与文件一致。
+Werkzeug 的开发服务器不提供 wsgi.file_wrapper，所有区间都经过 _RangeStream（pread）输出。
+
+依赖：requirements.txt 中的包
+用法：python benchmarks/bench_video_range.py --size-mb 512 --requests 4000 --concurrency 16
+"""
+import argparse
+import http.client
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+VIDEO_NAME = 'bench.mp4'
+
+
+def create_video(path, size_mb):
+    """写入 size_mb MB 的伪随机内容（每 MB 开头写入序号，错位读取可以被发现）"""
+    block = bytearray(os.urandom(1024 * 1024))
+    with open(path, 'wb') as f:
+        for i in range(size_mb):
+            block[:8] = i.to_bytes(8, 'big')
+            f.write(block)
+
+
+def start_app(port=0):
+    """导入应用并在后台线程中用多线程 WSGI 服务器运行，返回 (server, port)"""
+    from werkzeug.serving import make_server
+    from app import app
+
+    # 不逐条打印访问日志
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_port
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def run(size_mb, requests, concurrency, span_kb, open_ratio, seed):
+    with tempfile.TemporaryDirectory() as workdir:
+        # 应用使用相对路径（./storage、./downloads、./data），切到临时目录避免改动仓库中的数据
+        os.chdir(workdir)
+        os.makedirs('downloads', exist_ok=True)
+        video = os.path.join(workdir, 'downloads', VIDEO_NAME)
+        start = time.perf_counter()
+        create_video(video, size_mb)
+        print(f"生成 {size_mb} MB 文件用时 {time.perf_counter() - start:.1f} 秒")
+
+        server, port = start_app()
+        from video_server import file_cache
+        size = os.path.getsize(video)
+        span = span_kb * 1024
+        rng = random.Random(seed)
+        plans = []
+        for _ in range(requests):
+            offset = rng.randrange(0, size - 1)
+            if rng.random() < open_ratio:
+                plans.append((f'bytes={offset}-', offset, min(size, offset + span), True))
+            else:
+                end = min(size, offset + span)
+                plans.append((f'bytes={offset}-{end - 1}', offset, end, False))
+
+        local = os.open(video, os.O_RDONLY)
+        stats = {'bytes': 0, 'status': Counter(), 'mismatch': 0, 'ttfb': [], 'total': []}
+        lock = threading.Lock()
+
+        def fetch(plan):
+            header, first, last, open_ended = plan
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            began = time.perf_counter()
+            try:
+                conn.request('GET', f'/videos/{VIDEO_NAME}', headers={'Range': header})
+                response = conn.getresponse()
+                ttfb = time.perf_counter() - began
+                # bytes=N- 只读取 span 字节后断开，其余请求读完整个响应
+                body = response.read(last - first) if open_ended else response.read()
+                elapsed = time.perf_counter() - began
+            finally:
+                conn.close()
+            ok = response.status == 206 and body == os.pread(local, last - first, first)
+            with lock:
+                stats['bytes'] += len(body)
+                stats['status'][response.status] += 1
+                stats['mismatch'] += 0 if ok else 1
+                stats['ttfb'].append(ttfb * 1000)
+                stats['total'].append(elapsed * 1000)
+
+        # 预热一次，排除导入与路由初始化开销
+        fetch(plans[0])
+        stats.update({'bytes': 0, 'status': Counter(), 'mismatch': 0, 'ttfb': [], 'total': []})
+        before = file_cache.get_stats()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(fetch, plans))
+        wall = time.perf_counter() - start
+        after = file_cache.get_stats()
+        server.shutdown()
+        os.close(local)
+        os.chdir(ROOT)
+
+    hits = after['hits'] - before['hits']
+    misses = after['misses'] - before['misses']
+    print(f"{requests} 个请求，并发 {concurrency}，区间 {span_kb} KB，bytes=N- 占 {open_ratio:.0%}")
+    print(f"耗时 {wall:.2f} 秒，{requests / wall:.0f} 请求/秒，吞吐量 {stats['bytes'] / wall / 1e6:.1f} MB/s")
+    for name in ('ttfb', 'total'):
+        label = '首字节' if name == 'ttfb' else '完整响应'
+        values = stats[name]
+        print(f"{label:<6} p50 {percentile(values, 0.5):7.2f} ms  p90 {percentile(values, 0.9):7.2f} ms  "
+              f"p99 {percentile(values, 0.99):7.2f} ms  max {max(values):7.2f} ms")
+    print(f"状态码 {dict(stats['status'])}，内容不一致 {stats['mismatch']} 个")
+    print(f"file_cache 命中 {hits}，未命中 {misses}，命中率 {hits / max(1, hits + misses):.1%}，"
+          f"当前打开 {after['open_files']} 个文件")
+    if stats['mismatch']:
+        sys.exit('存在内容不一致的响应')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视频 Range 拖动压测')
+    parser.add_argument('--size-mb', type=int, default=512, help='测试文件大小（MB）')
+    parser.add_argument('--requests', type=int, default=4000, help='请求总数')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发请求数')
+    parser.add_argument('--span-kb', type=int, default=512, help='每个请求读取的字节数（KB）')
+    parser.add_argument('--open-ratio', type=float, default=0.3, help='bytes=N- 请求所占比例')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子')
+    args = parser.parse_args()
+    run(args.size_mb, args.requests, args.concurrency, args.span_kb, args.open_ratio, args.seed)
+
+
+if __name__ == '__main__':
+    main()
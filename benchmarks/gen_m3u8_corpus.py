@@ -0,0 +1,69 @@
+"""
+生成 m3u8 提取基准用的页面样本（benchmarks/corpus/*.html），样本已提交到仓库，
+只有需要调整样本时才重新运行。随机数种子固定，重复运行结果相同。
+
+用法：python benchmarks/gen_m3u8_corpus.py
+"""
+import json
+import os
+import random
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+rng = random.Random(1)
+
+
+def rnd(n):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(n))
+
+
+def write(name, html, expected):
+    with open(os.path.join(CORPUS_DIR, name), 'w', encoding='utf-8') as f:
+        f.write(html)
+    return name, expected
+
+
+def main():
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    expected = {}
+
+    # 1. 普通播放页（约 200KB）：脚本变量中的绝对地址 + 相对地址的 <video src>
+    hls = f"https://cdn.site.com/hls/{rnd(10)}/index.m3u8"
+    body = ''.join(f'<div class="item"><a href="https://site.com/v/{rnd(8)}"><img src="https://img.site.com/{rnd(12)}.jpg"></a>'
+                   f'<span>{rnd(40)}</span></div>\n' for _ in range(1500))
+    html = (f'<html><head><title>Player - Site</title></head><body>{body}'
+            f'<script>var hlsUrl = "{hls}";</script><video src="/live/main.m3u8"></video></body></html>')
+    expected.update([write('player.html', html, [hls, 'https://site.com/live/main.m3u8'])])
+
+    # 2. 单页应用：内嵌约 1MB 的 JSON 状态，斜杠转义为 \/
+    items = []
+    urls = []
+    for i in range(4000):
+        url = f"https://cdn.site.com/{rnd(8)}/master.m3u8" if i % 400 == 0 else f"https://site.com/api/{rnd(12)}"
+        if url.endswith('.m3u8'):
+            urls.append(url)
+        items.append({'id': i, 'cover': f"https://img.site.com/{rnd(16)}.jpg", 'page': f"https://site.com/v/{rnd(10)}",
+                      'desc': rnd(200), 'url': url})
+    state = json.dumps({'items': items}).replace('/', '\\/')
+    html = f'<html><head><title>SPA</title></head><body><script>window.__STATE__={state};</script></body></html>'
+    expected.update([write('spa_state.html', html, urls)])
+
+    # 3. 压缩后的脚本（约 1MB）：大量无分隔的 URL 片段，最后才有一个 m3u8
+    js = ';'.join(f'e.p("{rnd(6)}")+"https://api.site.com/{rnd(10)}?"+t' for _ in range(16000))
+    html = f'<html><head><title>Min</title></head><body><script>{js};var s="https://cdn.site.com/a.m3u8"</script></body></html>'
+    expected.update([write('minified.html', html, ['https://cdn.site.com/a.m3u8'])])
+
+    # 4. 病态输入：连续的 http:// 没有任何边界字符，回溯型正则在这里是平方复杂度
+    html = '<title>x</title><p>' + 'http://a.b/' * 5000 + '</p>'
+    expected.update([write('adversarial.html', html, [])])
+
+    with open(os.path.join(CORPUS_DIR, 'expected.json'), 'w', encoding='utf-8') as f:
+        json.dump(expected, f, indent=2)
+        f.write('\n')
+    for name in expected:
+        size = os.path.getsize(os.path.join(CORPUS_DIR, name))
+        print(f"{name:<20} {size / 1024:8.0f} KB  {len(expected[name])} 个 m3u8")
+
+
+if __name__ == '__main__':
+    main()
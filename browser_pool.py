@@ -0,0 +1,283 @@
+"""
+Selenium 浏览器池
+- 保持最多 selenium_pool_size 个常驻的无头 Chrome，解析时借用，用完归还，不再每个页面启动一次浏览器
+- 每个浏览器使用独立的调试端口，并发解析互不冲突
+- 浏览器处理 selenium_max_pages 个页面后重建；出现崩溃等异常时直接丢弃；空闲超过 selenium_idle_timeout 秒自动关闭
+  （后台线程定时检查，归还时也会检查；quit 较慢，在锁外执行）
+- 每个页面结束后通过 CDP 清除 Cookie 与该来源的本地存储，下一个页面不会带上前一个站点的登录状态
+- 不再固定 sleep 5 秒：通过性能日志监听网络请求，发现 m3u8 请求或网络空闲后立即读取页面
+"""
+import os
+import json
+import atexit
+import time
+import socket
+import threading
+from urllib.parse import urlsplit
+
+from page_parser import USER_AGENT, PAGE_TIMEOUT
+
+# 连续多长时间没有进行中的请求视为网络空闲（秒）
+NETWORK_IDLE_WINDOW = 0.5
+# 轮询性能日志的间隔（秒）
+POLL_INTERVAL = 0.1
+# 页面结束后清理的存储类型（Cookie 另外用 Network.clearBrowserCookies 全部清除）
+CLEAR_STORAGE_TYPES = 'local_storage,session_storage,indexeddb,websql,cache_storage,service_workers'
+
+
+def _free_port():
+    """向系统申请一个空闲端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class _PooledDriver:
+    def __init__(self, driver, port):
+        self.driver = driver
+        self.port = port
+        self.pages = 0
+        self.last_used = time.time()
+
+
+class BrowserPool:
+    def __init__(self, db):
+        self.db = db
+        self.cond = threading.Condition()
+        self.idle = []  # 空闲的浏览器
+        self.total = 0  # 已创建且未关闭的浏览器数（含借出的）
+        self.stats = {'created': 0, 'recycled': 0, 'crashed': 0, 'pages': 0, 'waits': {}}
+        self.closed = threading.Event()
+        self.sweeper = threading.Thread(target=self._sweep_loop, daemon=True)
+        self.sweeper.start()
+
+    def _int_setting(self, key, default):
+        try:
+            return max(1, int(self.db.get_setting(key, default)))
+        except Exception:
+            return default
+
+    def size(self):
+        return self._int_setting('selenium_pool_size', 2)
+
+    def _create_driver(self):
+        try:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options
+            from selenium.webdriver.chrome.service import Service
+        except ImportError:
+            raise Exception('服务器未安装 selenium 库')
+
+        port = _free_port()
+        chrome_options = Options()
+        chrome_options.add_argument('--headless')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument(f'--remote-debugging-port={port}')
+        chrome_options.add_argument(f'user-agent={USER_AGENT}')
+        # DOMContentLoaded 后即返回，后续由网络监听决定何时读取页面
+        chrome_options.page_load_strategy = 'eager'
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+        chromedriver_path = self.db.get_setting('chromedriver_path')
+        service = None
+        if chromedriver_path:
+            if not os.path.isabs(chromedriver_path):
+                chromedriver_path = os.path.abspath(chromedriver_path)
+
+            if not os.path.exists(chromedriver_path):
+                raise Exception(f'ChromeDriver 不存在: {chromedriver_path}')
+
+            service = Service(executable_path=chromedriver_path)
+
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        driver.set_page_load_timeout(PAGE_TIMEOUT)
+        return _PooledDriver(driver, port)
+
+    def _quit(self, item):
+        try:
+            item.driver.quit()
+        except Exception:
+            pass
+
+    def _acquire(self, timeout):
+        deadline = time.time() + timeout
+        self._sweep_idle()
+        with self.cond:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.total < self.size():
+                    self.total += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception('没有空闲的浏览器，请稍后再试')
+                self.cond.wait(remaining)
+
+        # 启动浏览器较慢，放在锁外
+        try:
+            item = self._create_driver()
+        except Exception:
+            with self.cond:
+                self.total -= 1
+                self.cond.notify()
+            raise
+        with self.cond:
+            self.stats['created'] += 1
+        return item
+
+    def _release(self, item, broken=False):
+        item.last_used = time.time()
+        max_pages = self._int_setting('selenium_max_pages', 50)
+        discard = broken or item.pages >= max_pages
+        if discard:
+            self._quit(item)
+        with self.cond:
+            if discard:
+                self.total -= 1
+                self.stats['crashed' if broken else 'recycled'] += 1
+            else:
+                self.idle.append(item)
+            self.cond.notify()
+        self._sweep_idle()
+
+    def _sweep_interval(self):
+        return max(1, min(60, self._int_setting('selenium_idle_timeout', 300) / 2))
+
+    def _sweep_loop(self):
+        """后台定时关闭空闲浏览器，没有新的解析请求时也能按时退出 Chrome"""
+        while not self.closed.wait(self._sweep_interval()):
+            try:
+                self._sweep_idle()
+            except Exception as e:
+                print(f"清理空闲浏览器失败: {e}")
+
+    def _sweep_idle(self):
+        """关闭空闲过久的浏览器：锁内只摘下，quit 可能耗时数秒，放在锁外"""
+        timeout = self._int_setting('selenium_idle_timeout', 300)
+        now = time.time()
+        with self.cond:
+            expired = [i for i in self.idle if now - i.last_used > timeout]
+            for item in expired:
+                self.idle.remove(item)
+                self.total -= 1
+            if expired:
+                self.cond.notify_all()
+        for item in expired:
+            self._quit(item)
+
+    def _reset_session(self, driver, page_urls):
+        """清除 Cookie 与页面来源（请求地址与跳转后的地址）的本地存储，再回到空白页"""
+        origins = set()
+        for page_url in page_urls:
+            parts = urlsplit(page_url or '')
+            if parts.scheme in ('http', 'https') and parts.netloc:
+                origins.add(f'{parts.scheme}://{parts.netloc}')
+        for origin in sorted(origins):
+            driver.execute_cdp_cmd('Storage.clearDataForOrigin', {
+                'origin': origin,
+                'storageTypes': CLEAR_STORAGE_TYPES,
+            })
+        # 停留在 about:blank 时 delete_all_cookies 只作用于空白页，清不掉任何站点的 Cookie
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.get('about:blank')
+
+    def fetch(self, url):
+        """
+        用池中的浏览器打开页面，返回 (html, 网络中捕获的 m3u8 链接列表, 等待结束原因, 跳转后的最终地址)
+        等待结束原因：m3u8（捕获到 m3u8 请求）/ idle（网络空闲）/ timeout
+        """
+        item = self._acquire(timeout=PAGE_TIMEOUT * 2)
+        broken = False
+        try:
+            from selenium.common.exceptions import TimeoutException
+            driver = item.driver
+            driver.get_log('performance')  # 清空上一个页面残留的日志
+            try:
+                driver.get(url)
+            except TimeoutException:
+                # 页面加载超时，停止加载并使用已有内容
+                driver.execute_script('window.stop();')
+            m3u8_urls, reason = self._wait_for_media(driver)
+            html = driver.page_source
+            final_url = driver.current_url
+            item.pages += 1
+            with self.cond:
+                self.stats['pages'] += 1
+                self.stats['waits'][reason] = self.stats['waits'].get(reason, 0) + 1
+            # 清理 Cookie 与本地存储并回到空白页，避免影响下一个页面
+            try:
+                self._reset_session(driver, [url, final_url])
+            except Exception:
+                broken = True
+            return html, m3u8_urls, reason, final_url
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self._release(item, broken)
+
+    def _wait_for_media(self, driver):
+        """监听网络请求：出现 m3u8 请求或网络空闲时返回"""
+        try:
+            max_wait = float(self.db.get_setting('selenium_wait_timeout', 10))
+        except Exception:
+            max_wait = 10.0
+        deadline = time.time() + max_wait
+        inflight = set()
+        found = []
+        idle_since = time.time()
+        while time.time() < deadline:
+            for entry in driver.get_log('performance'):
+                try:
+                    message = json.loads(entry['message'])['message']
+                except Exception:
+                    continue
+                method = message.get('method')
+                params = message.get('params') or {}
+                if method == 'Network.requestWillBeSent':
+                    inflight.add(params.get('requestId'))
+                    request_url = (params.get('request') or {}).get('url', '')
+                    if '.m3u8' in request_url and request_url not in found:
+                        found.append(request_url)
+                elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                    inflight.discard(params.get('requestId'))
+            if found:
+                return found, 'm3u8'
+            if inflight:
+                idle_since = time.time()
+            elif time.time() - idle_since >= NETWORK_IDLE_WINDOW:
+                return found, 'idle'
+            time.sleep(POLL_INTERVAL)
+        return found, 'timeout'
+
+    def get_stats(self):
+        with self.cond:
+            stats = dict(self.stats, waits=dict(self.stats['waits']))
+            stats.update({'size': self.size(), 'open': self.total, 'idle': len(self.idle)})
+        return stats
+
+    def close(self):
+        self.closed.set()
+        with self.cond:
+            items, self.idle = self.idle, []
+            self.total -= len(items)
+        for item in items:
+            self._quit(item)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool(db):
+    """进程内共享的浏览器池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(db)
+            # 进程退出时关闭空闲的浏览器，避免遗留 Chrome 进程
+            atexit.register(_pool.close)
+        return _pool
@@ -0,0 +1,66 @@
+"""
+独立运行的下载守护进程
+下载队列、调度与子进程都在这里运行，Web 层通过本地 RPC 控制，可以多进程部署或单独重启而不打断下载。
+
+用法（需与 Web 进程使用相同的工作目录，以共享 ./storage 与下载目录）：
+    python daemon.py                       # 监听 unix://storage/downloader.sock
+    DOWNLOADER_RPC_ADDRESS=unix://storage/downloader.sock gunicorn -w 4 app:app
+使用 TCP 地址时必须设置 DOWNLOADER_RPC_TOKEN，否则拒绝启动。
+"""
+import os
+import argparse
+import signal
+import threading
+
+import storage
+from events import event_bus
+from downloader import DownloadManager
+from rpc import RPCServer, EventRelay, build_methods, RPC_ADDRESS_ENV, RPC_TOKEN_ENV, DEFAULT_RPC_ADDRESS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='M3U8 下载守护进程')
+    parser.add_argument('--listen', default=os.environ.get(RPC_ADDRESS_ENV) or DEFAULT_RPC_ADDRESS,
+                        help='RPC 监听地址，unix:///path/to.sock 或 http://127.0.0.1:5001（需设置 DOWNLOADER_RPC_TOKEN）')
+    args = parser.parse_args()
+
+    token = os.environ.get(RPC_TOKEN_ENV) or None
+    if not args.listen.startswith('unix://') and not token:
+        # 在启动下载管理器之前检查，避免恢复任务后才发现无法监听
+        parser.error(f"TCP 监听地址必须设置环境变量 {RPC_TOKEN_ENV}，或改用 unix:// 地址")
+
+    storage.init_storage()
+    storage.rebuild_task_index()
+    db = storage.StorageDB()
+    # 先订阅事件再创建下载管理器，恢复未完成任务时产生的事件也能转发给 Web 进程
+    relay = EventRelay(event_bus)
+    download_manager = DownloadManager(db)
+
+    server = RPCServer(args.listen, build_methods(db, download_manager, relay), token=token)
+    server.start()
+    print(f"下载守护进程已启动: {args.listen}")
+
+    stop_event = threading.Event()
+
+    def _signal_handler(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _signal_handler)
+    signal.signal(signal.SIGINT, _signal_handler)
+    # 用带超时的等待，保证主线程能及时处理信号
+    while not stop_event.is_set():
+        stop_event.wait(1)
+
+    try:
+        grace = float(storage.get_setting('shutdown_grace_period', 30))
+    except Exception:
+        grace = 30.0
+    print(f"正在关闭下载管理器（最多等待 {grace:.0f} 秒）...")
+    interrupted = download_manager.shutdown(timeout=grace)
+    if interrupted:
+        print(f"已中断任务 {interrupted}，将在重启后继续")
+    server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,16 +2,71 @@
 import subprocess
 import threading
 import os
+import signal
 import re
 import json
 import time
 import shutil
-import requests
+import random
+import heapq
+import uuid
 from urllib.parse import quote
 from pathlib import Path
 from datetime import datetime
-from queue import Queue
-from ftp_uploader import FTPUploader
+from queue import Queue, Empty
+from collections import Counter, deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from upload_backends import create_backends
+from aria2_monitor import Aria2Monitor
+from thumbnails import get_thumbnail_service
+import playlist
+
+# 失败分类：按日志尾部从后往前匹配，最近出现的错误优先
+# 状态码必须出现在 HTTP / status / code 之后，避免匹配进度行里的 403.25MB、500.00KB 之类的大小
+FAILURE_PATTERNS = [
+    ('disk_full', re.compile(r'no space left|disk full|not enough (?:disk )?space|磁盘空间不足', re.IGNORECASE)),
+    ('http_403', re.compile(r'(?:HTTP|status|code)[^\d\n]{0,40}\b403\b(?!\.\d)|\bforbidden\b', re.IGNORECASE)),
+    ('http_404', re.compile(r'(?:HTTP|status|code)[^\d\n]{0,40}\b404\b(?!\.\d)|\b404\s+not\s+found', re.IGNORECASE)),
+    ('http_5xx', re.compile(r'(?:HTTP|status|code)[^\d\n]{0,40}\b50[0234]\b(?!\.\d)|internal server error|bad gateway|service unavailable|gateway time-?out', re.IGNORECASE)),
+    ('timeout', re.compile(r'timed? ?out|timeout|超时', re.IGNORECASE)),
+    ('network', re.compile(r'connection (?:reset|refused|aborted|closed)|network is unreachable|name or service not known|no such host'
+                           r'|\bssl\b[^\n]{0,40}(?:error|fail|could not)|certificate verify failed', re.IGNORECASE)),
+    ('merge_error', re.compile(r'(?:merg|mux|ffmpeg)[^\n]{0,40}(?:error|fail|失败)|(?:error|fail)[^\n]{0,40}(?:merg|mux|ffmpeg)|合并失败', re.IGNORECASE)),
+]
+# 错误/警告行优先匹配；进度行（含 12.3MB/1.07GB 这类大小）不参与分类
+ERROR_LINE_RE = re.compile(r'\b(?:ERROR|ERR|WARN(?:ING)?|FATAL|Exception)\b|错误|失败', re.IGNORECASE)
+PROGRESS_LINE_RE = re.compile(r'\d+(?:\.\d+)?\s*[KMGT]i?B\s*/\s*\d', re.IGNORECASE)
+
+# 可自动重试的失败类型，其余类型立即标记为失败
+TRANSIENT_FAILURES = {'timeout', 'network', 'http_5xx', 'killed'}
+
+FAILURE_LABELS = {
+    'disk_full': '磁盘空间不足',
+    'http_403': 'HTTP 403 禁止访问',
+    'http_404': 'HTTP 404 资源不存在',
+    'http_5xx': '服务器错误 (5xx)',
+    'timeout': '网络超时',
+    'network': '网络连接错误',
+    'merge_error': '合并失败',
+    'killed': '进程被终止',
+    'output_missing': '找不到输出文件',
+    'unknown': '下载失败',
+}
+
+# 批量删除：保留的作业数量、并行停止任务的线程数
+BATCH_JOB_HISTORY = 50
+BATCH_STOP_WORKERS = 16
+
+SPEED_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def _speed_to_bytes(speed):
+    """把 24.69MBps / 12.5 MB/s 这类速度字符串换算为字节每秒，无法解析时返回 0"""
+    match = re.match(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B', speed or '', re.IGNORECASE)
+    if not match:
+        return 0
+    return int(float(match.group(1)) * SPEED_UNITS[match.group(2).upper()])
+
 
 class DownloadManager:
     def __init__(self, db):
@@ -22,17 +77,47 @@ class DownloadManager:
         self.queue_lock = threading.Lock()
         # 取消标志，用于在任务尚未启动或正在运行时请求取消
         self.cancel_flags = {}  # task_id: threading.Event()
+        # 等待自动重试的任务：(到期时间戳, task_id, task_data) 小顶堆
+        self.retry_schedule = []
+        # 按失败类型统计次数，供监控使用
+        self.failure_counters = Counter()
+        self.retry_counters = Counter()
+        # 运行中任务的当前速度（字节/秒），供统计接口汇总
+        self.task_speeds = {}
+        # 排空模式：为 True 时不再从等待队列派发新任务
+        self.draining = False
+        # 因服务关闭被中断的任务，重启后会重新排队
+        self.interrupted_tasks = set()
+        # 上传后端（FTP / S3 / SFTP / WebDAV），按各自的 <name>_enabled 设置启用
+        self.upload_backends = create_backends(db)
+        # Aria2 RPC 客户端与推送监控（所有 GID 共用一个轮询线程）
+        self.aria2 = Aria2Monitor(db)
+        # 后台删除队列：大文件和临时目录的删除不阻塞请求线程
+        self.deletion_queue = Queue()
+        self.last_temp_sweep = time.time()
+        # 批量删除作业：job_id -> 作业状态与每个 id 的结果
+        self.batch_jobs = OrderedDict()
+        self.batch_jobs_lock = threading.Lock()
         
+        # 恢复上次关闭时未完成的任务
+        self._recover_unfinished_tasks()
+
         # 启动队列处理线程
         self.queue_processor = threading.Thread(target=self._queue_processor_worker, daemon=True)
         self.queue_processor.start()
 
+        # 启动后台删除线程（同时负责定期清理孤立的临时目录）
+        self.deletion_worker = threading.Thread(target=self._deletion_worker, daemon=True)
+        self.deletion_worker.start()
+
     def start_download(self, task_id, url, custom_name=None):
         """提交下载任务"""
         # 如果已在活动任务中，拒绝重复提交
         with self.queue_lock:
             if task_id in self.active_tasks:
                 return False, "任务已在运行中"
+            # 手动启动时取消尚未到期的自动重试，避免之后再次入队
+            self._cancel_scheduled_retry(task_id)
             # 初始化/清除取消标志
             self.cancel_flags[task_id] = threading.Event()
         
@@ -45,7 +130,8 @@ class DownloadManager:
         
         # 重置任务状态（pending）
         try:
-            self.db.update_task(task_id, status='pending', progress=0, error_message='', speed='', eta='')
+            self.db.update_task(task_id, status='pending', progress=0, error_message='', speed='', eta='',
+                                retry_count=0, failure_class='', next_retry_at=None)
             self.db.add_log(task_id, "任务已加入等待队列")
         except Exception:
             pass
@@ -56,6 +142,14 @@ class DownloadManager:
         """队列处理线程"""
         while True:
             try:
+                # 把到期的自动重试任务放回等待队列
+                self._requeue_due_retries()
+
+                # 排空模式下不派发新任务，队列中的任务保持 pending 状态
+                if self.draining:
+                    time.sleep(1)
+                    continue
+
                 # 检查是否可以启动新任务
                 with self.queue_lock:
                     current_active = len(self.active_tasks)
@@ -105,11 +199,12 @@ class DownloadManager:
             # 获取配置
             n_m3u8dl_path = self.db.get_setting('n_m3u8dl_path', './bin/N_m3u8DL-RE')
             download_dir = self.db.get_setting('download_dir', './downloads')
-            temp_dir = self.db.get_setting('temp_dir', './temp')
+            # 每个任务使用独立的临时目录 temp_dir/<task_id>/，清理时只需删除整个目录
+            task_temp_dir = self._task_temp_dir(task_id)
             
             # 确保目录存在
             Path(download_dir).mkdir(parents=True, exist_ok=True)
-            Path(temp_dir).mkdir(parents=True, exist_ok=True)
+            task_temp_dir.mkdir(parents=True, exist_ok=True)
 
             # 注册为活动任务 (占位，process 稍后赋值)
             with self.queue_lock:
@@ -130,16 +225,19 @@ class DownloadManager:
             else:
                 save_name = f"video_{task_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
 
+            # 轨道选择：未配置策略时沿用 --auto-select（最佳画质 + 所有最佳轨道）
+            select_args = self._resolve_selection(task_id, url)
+
             # 构建命令
             cmd = [
                 n_m3u8dl_path,
                 url,
                 '--save-dir', download_dir,
                 '--save-name', save_name,
-                '--tmp-dir', temp_dir,
+                '--tmp-dir', str(task_temp_dir),
                 '--thread-count', '16',
                 '--download-retry-count', '5',
-                '--auto-select',
+            ] + select_args + [
                 '-M', 'format=mp4',
                 '--del-after-done',
                 '--log-level', 'INFO'
@@ -165,16 +263,21 @@ class DownloadManager:
 
             # 更新 process 对象
             with self.queue_lock:
-                if task_id in self.active_tasks:
+                if task_id in self.active_tasks and task_id not in self.interrupted_tasks:
                     self.active_tasks[task_id] = process
                 else:
-                    # 任务可能在启动过程中被取消
+                    # 任务可能在启动过程中被取消或因服务关闭被中断
+                    self.active_tasks.pop(task_id, None)
+                    self.interrupted_tasks.discard(task_id)
                     try:
                         process.terminate()
                     except Exception:
                         pass
                     return
 
+            # 保留最近的输出，用于失败分类
+            log_tail = deque(maxlen=50)
+
             # 读取输出：放在单独线程中读取 stdout，避免主线程被阻塞或因编码问题造成问题
             def _stdout_reader(proc, tid):
                 try:
@@ -190,6 +293,7 @@ class DownloadManager:
                             continue
                         line = line.strip()
                         if line:
+                            log_tail.append(line)
                             try:
                                 self.db.add_log(tid, line)
                             except Exception:
@@ -198,7 +302,9 @@ class DownloadManager:
                                 progress_info = self._parse_progress(line)
                                 if progress_info:
                                     update_data = {'progress': progress_info['progress']}
-                                    if 'speed' in progress_info: update_data['speed'] = progress_info['speed']
+                                    if 'speed' in progress_info:
+                                        update_data['speed'] = progress_info['speed']
+                                        self.task_speeds[tid] = _speed_to_bytes(progress_info['speed'])
                                     if 'eta' in progress_info: update_data['eta'] = progress_info['eta']
                                     if 'total_size' in progress_info: update_data['total_size'] = progress_info['total_size']
                                     if 'downloaded_size' in progress_info: update_data['downloaded_size'] = progress_info['downloaded_size']
@@ -257,7 +363,12 @@ class DownloadManager:
             return_code = process.returncode if process.returncode is not None else (process.wait() if process.poll() is None else process.returncode)
 
             # 移除活动任务
+            self.task_speeds.pop(task_id, None)
             with self.queue_lock:
+                cancel_event = self.cancel_flags.get(task_id)
+                cancelled = bool(cancel_event and cancel_event.is_set())
+                interrupted = task_id in self.interrupted_tasks
+                self.interrupted_tasks.discard(task_id)
                 if task_id in self.active_tasks:
                     try:
                         del self.active_tasks[task_id]
@@ -270,11 +381,19 @@ class DownloadManager:
                     except Exception:
                         pass
 
+            if interrupted and return_code != 0:
+                # 服务关闭时被中断，状态已由 shutdown 重置为 pending，重启后继续
+                # （退出码为 0 说明在中断前已经下载完成，shutdown 不会重置，照常记录完成）
+                return
+
             if return_code == 0:
                 # 下载成功，查找输出文件
                 output_file = self._find_output_file(save_name, download_dir)
 
                 if output_file:
+                    # 成功后临时目录已无用（失败时保留，便于重试复用已下载的分片）
+                    self.clean_temp_files(task_id)
+
                     try:
                         file_size = os.path.getsize(output_file)
                     except Exception:
@@ -297,6 +416,10 @@ class DownloadManager:
                         self.db.add_log(task_id, f"下载完成: {output_file}")
                     except Exception:
                         pass
+
+                    # 后台预先生成封面与拖动预览图
+                    if self.db.get_setting('thumbnail_auto_generate', 'true') == 'true':
+                        get_thumbnail_service(self.db).submit(output_file)
                     
                     # Aria2 推送
                     aria2_gid = None
@@ -306,22 +429,18 @@ class DownloadManager:
                     except Exception:
                         aria2_gid = None
 
-                    # FTP 上传
-                    ftp_uploaded = False
-                    try:
-                        if self.db.get_setting('ftp_enabled') == 'true':
-                            ftp_uploaded = self._upload_to_ftp(task_id, output_file)
-                    except Exception:
-                        ftp_uploaded = False
+                    # 上传到已启用的远端存储
+                    uploaded, delete_after_upload = self._upload_to_backends(task_id, output_file)
 
                     # 删除源文件
+                    aria2_tracked = False
                     try:
-                        # FTP 上传后删除
-                        if ftp_uploaded and self.db.get_setting('ftp_delete_after_upload') == 'true':
+                        # 所有启用的后端都上传成功后删除
+                        if uploaded and delete_after_upload:
                             try:
                                 os.remove(output_file)
                                 try:
-                                    self.db.add_log(task_id, "FTP 上传完成，源文件已删除")
+                                    self.db.add_log(task_id, "上传完成，源文件已删除")
                                 except Exception:
                                     pass
                                 # 更新 file_path 为空
@@ -341,12 +460,9 @@ class DownloadManager:
                         # Aria2 推送后删除
                         elif self.db.get_setting('delete_after_download') == 'true':
                             if aria2_gid:
-                                # 如果推送到 Aria2，启动监控线程等待 Aria2 下载完成再删除
-                                threading.Thread(
-                                    target=self._monitor_aria2_and_delete,
-                                    args=(task_id, aria2_gid, output_file),
-                                    daemon=True
-                                ).start()
+                                # 如果推送到 Aria2，交给监控器跟踪，Aria2 下载完成后再删除
+                                self.aria2.track(task_id, aria2_gid, output_file)
+                                aria2_tracked = True
                                 try:
                                     self.db.add_log(task_id, "已启动 Aria2 监控，将在传输完成后删除源文件")
                                 except Exception:
@@ -376,39 +492,27 @@ class DownloadManager:
                     except Exception:
                         pass
 
+                    # 不删除源文件时也跟踪 Aria2 传输进度
+                    if aria2_gid and not aria2_tracked:
+                        self.aria2.track(task_id, aria2_gid, output_file, delete_file=False)
+
                 else:
-                    try:
-                        self.db.update_task(
-                            task_id,
-                            status='failed',
-                            error_message='找不到输出文件'
-                        )
-                        self.db.add_log(task_id, "错误: 找不到输出文件")
-                    except Exception:
-                        pass
+                    self._handle_failure(task_id, url, custom_name, 'output_missing', "错误: 找不到输出文件")
+            elif cancelled:
+                # 手动停止的任务由 stop_download 负责更新状态，不计入失败
+                pass
             else:
-                # 检查是否是被手动停止的 (return code 通常是负数或特定值)
-                try:
-                    self.db.update_task(
-                        task_id,
-                        status='failed',
-                        error_message=f'下载失败，退出码: {return_code}'
-                    )
-                    self.db.add_log(task_id, f"下载失败，退出码: {return_code}")
-                except Exception:
-                    pass
+                failure_class = self._classify_failure(return_code, list(log_tail))
+                self._handle_failure(task_id, url, custom_name, failure_class, f"退出码: {return_code}")
 
         except Exception as e:
             try:
-                self.db.update_task(
-                    task_id,
-                    status='failed',
-                    error_message=str(e)
-                )
                 self.db.add_log(task_id, f"异常: {str(e)}")
             except Exception:
                 pass
+            self._handle_failure(task_id, url, custom_name, 'unknown', str(e))
 
+            self.task_speeds.pop(task_id, None)
             with self.queue_lock:
                 if task_id in self.active_tasks:
                     try:
@@ -416,6 +520,160 @@ class DownloadManager:
                     except Exception:
                         pass
 
+    def _classify_failure(self, return_code, log_tail):
+        """根据退出码和日志尾部判断失败类型：先看错误/警告行，再看其它非进度行"""
+        lines = [line for line in reversed(log_tail) if not PROGRESS_LINE_RE.search(line)]
+        error_lines = [line for line in lines if ERROR_LINE_RE.search(line)]
+        for group in (error_lines, lines):
+            for line in group:
+                for failure_class, pattern in FAILURE_PATTERNS:
+                    if pattern.search(line):
+                        return failure_class
+        if return_code is not None and return_code < 0:
+            # 被信号终止（如 OOM killer），通常可以重试
+            return 'killed'
+        return 'unknown'
+
+    def _retry_delay(self, attempt):
+        """指数退避加抖动：base * 2^(n-1)，不超过上限，并在 [delay/2, delay] 内随机"""
+        try:
+            base = float(self.db.get_setting('auto_retry_base_delay', 10))
+        except Exception:
+            base = 10.0
+        try:
+            max_delay = float(self.db.get_setting('auto_retry_max_delay', 600))
+        except Exception:
+            max_delay = 600.0
+        delay = min(max_delay, base * (2 ** max(0, attempt - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _handle_failure(self, task_id, url, custom_name, failure_class, detail):
+        """记录失败；可重试的类型在未超过次数上限时按退避时间重新排队"""
+        label = FAILURE_LABELS.get(failure_class, FAILURE_LABELS['unknown'])
+        message = f"{label}，{detail}" if detail else label
+        with self.queue_lock:
+            self.failure_counters[failure_class] += 1
+
+        task = self.db.get_task(task_id) or {}
+        retry_count = int(task.get('retry_count') or 0)
+        try:
+            max_retries = int(self.db.get_setting('auto_retry_max', 3))
+        except Exception:
+            max_retries = 3
+
+        if failure_class in TRANSIENT_FAILURES and retry_count < max_retries:
+            attempt = retry_count + 1
+            delay = self._retry_delay(attempt)
+            due = time.time() + delay
+            with self.queue_lock:
+                self.cancel_flags[task_id] = threading.Event()
+                heapq.heappush(self.retry_schedule, (due, task_id, {
+                    'task_id': task_id,
+                    'url': url,
+                    'custom_name': custom_name
+                }))
+                self.retry_counters[failure_class] += 1
+            try:
+                self.db.update_task(
+                    task_id,
+                    status='pending',
+                    error_message=message,
+                    failure_class=failure_class,
+                    retry_count=attempt,
+                    next_retry_at=datetime.fromtimestamp(due).isoformat(),
+                    speed='',
+                    eta=''
+                )
+                self.db.add_log(task_id, f"{message}，{delay:.0f} 秒后自动重试 ({attempt}/{max_retries})")
+            except Exception:
+                pass
+            return
+
+        try:
+            self.db.update_task(
+                task_id,
+                status='failed',
+                error_message=message,
+                failure_class=failure_class,
+                next_retry_at=None
+            )
+            if failure_class in TRANSIENT_FAILURES:
+                self.db.add_log(task_id, f"{message}，已达到自动重试上限 ({max_retries})")
+            else:
+                self.db.add_log(task_id, message)
+        except Exception:
+            pass
+
+    def _cancel_scheduled_retry(self, task_id):
+        """移除任务的待重试记录（调用方持有 queue_lock）"""
+        remaining = [item for item in self.retry_schedule if item[1] != task_id]
+        if len(remaining) != len(self.retry_schedule):
+            heapq.heapify(remaining)
+            self.retry_schedule = remaining
+
+    def _requeue_due_retries(self):
+        """将到期的重试任务移入等待队列；等待期间已被取消或删除的任务直接丢弃"""
+        now = time.time()
+        due_items = []
+        with self.queue_lock:
+            while self.retry_schedule and self.retry_schedule[0][0] <= now:
+                task_data = heapq.heappop(self.retry_schedule)[2]
+                cancel_event = self.cancel_flags.get(task_data['task_id'])
+                if cancel_event and cancel_event.is_set():
+                    continue
+                due_items.append(task_data)
+        for task_data in due_items:
+            task = self.db.get_task(task_data['task_id'])
+            if not task or task.get('status') != 'pending':
+                continue
+            try:
+                self.db.update_task(task_data['task_id'], next_retry_at=None, progress=0)
+                self.db.add_log(task_data['task_id'], "自动重试：任务重新加入等待队列")
+            except Exception:
+                pass
+            self.waiting_queue.put(task_data)
+
+    def get_failure_stats(self):
+        """返回各失败类型的次数、自动重试次数和等待重试的任务数"""
+        with self.queue_lock:
+            return {
+                'failures': dict(self.failure_counters),
+                'retries': dict(self.retry_counters),
+                'scheduled_retries': len(self.retry_schedule)
+            }
+
+    def _resolve_selection(self, task_id, url):
+        """根据全局与任务级策略解析主播放列表，返回 N_m3u8DL-RE 的轨道选择参数"""
+        task = self.db.get_task(task_id) or {}
+        policy = playlist.build_policy(self.db.get_setting, task.get('selection_policy'))
+        if not playlist.policy_is_active(policy):
+            return ['--auto-select']
+
+        variant = None
+        try:
+            variant = playlist.resolve_variant(url, policy)
+        except Exception as e:
+            try:
+                self.db.add_log(task_id, f"读取主播放列表失败，按策略上限过滤: {e}")
+            except Exception:
+                pass
+
+        if variant:
+            try:
+                self.db.update_task(task_id, selected_variant=variant, expected_size=variant.get('expected_size'))
+                desc = variant.get('resolution') or '未知分辨率'
+                if variant.get('bandwidth'):
+                    desc += f", {variant['bandwidth'] // 1000} kbps"
+                if variant.get('codecs'):
+                    desc += f", {variant['codecs']}"
+                if variant.get('expected_size'):
+                    desc += f", 预计 {variant['expected_size'] / 1024 / 1024:.1f} MB"
+                self.db.add_log(task_id, f"已选择变体: {desc}")
+            except Exception:
+                pass
+
+        return playlist.build_select_args(policy, variant)
+
     def _parse_progress(self, line):
         """解析进度信息"""
         info = {}
@@ -532,38 +790,30 @@ class DownloadManager:
 
     def stop_download(self, task_id):
         """停止下载任务"""
-        # 设置取消标志，优先通知等待/运行线程
+        # 锁内只设置取消标志并摘下进程对象，等待进程退出放在锁外，
+        # 避免一个任务的 wait 阻塞其它任务的停止（批量删除时会并行调用）
+        process = None
+        stopped = False
         with self.queue_lock:
             cancel_event = self.cancel_flags.get(task_id)
             if cancel_event:
                 cancel_event.set()
+            self._cancel_scheduled_retry(task_id)
 
             if task_id in self.active_tasks:
-                process = self.active_tasks[task_id]
-                if process: # 进程已启动
-                    try:
-                        process.terminate()
-                    except Exception:
-                        pass
-                    try:
-                        process.wait(timeout=5)
-                    except subprocess.TimeoutExpired:
-                        try:
-                            process.kill()
-                        except Exception:
-                            pass
-                
-                try:
-                    del self.active_tasks[task_id]
-                except Exception:
-                    pass
-                
-                try:
-                    self.db.update_task(task_id, status='cancelled')
-                    self.db.add_log(task_id, "任务已取消")
-                except Exception:
-                    pass
-                return True, "任务已停止"
+                process = self.active_tasks.pop(task_id, None)
+                self.task_speeds.pop(task_id, None)
+                stopped = True
+
+        if stopped:
+            # 进程尚未启动时 process 为 None，工作线程启动进程后发现任务已移除会自行结束它
+            self._terminate_process(process)
+            try:
+                self.db.update_task(task_id, status='cancelled')
+                self.db.add_log(task_id, "任务已取消")
+            except Exception:
+                pass
+            return True, "任务已停止"
 
         # 检查是否在等待队列中 (需要遍历队列，比较麻烦，简单做法是标记取消标志)
         task = self.db.get_task(task_id)
@@ -582,6 +832,262 @@ class DownloadManager:
 
         return False, "任务未在运行或等待中"
 
+    def delete_task(self, task, delete_file=True):
+        """
+        删除单个任务：立即返回，不等待下载进程退出
+        - 锁内设置取消标志，等待中的任务不会再被派发
+        - 任务记录立即删除（之后的状态与日志写入会因记录不存在而被忽略）
+        - 停止进程、删除视频文件与临时目录在后台线程中完成
+        """
+        task_id = task['id']
+        with self.queue_lock:
+            cancel_event = self.cancel_flags.get(task_id)
+            if cancel_event is None:
+                cancel_event = self.cancel_flags[task_id] = threading.Event()
+            cancel_event.set()
+            running = task_id in self.active_tasks
+
+        self.db.delete_task(task_id)
+        threading.Thread(target=self._finish_delete, args=(task, running, delete_file), daemon=True).start()
+
+    def _finish_delete(self, task, running, delete_file):
+        task_id = task['id']
+        if running or task.get('status') == 'pending':
+            try:
+                self.stop_download(task_id)
+            except Exception as e:
+                print(f"删除前停止任务失败 {task_id}: {e}")
+        if delete_file:
+            self.remove_path_async(task.get('file_path'))
+            self.remove_path_async(self._task_temp_dir(task_id))
+
+    def batch_delete(self, ids, delete_file=True):
+        """
+        批量删除任务：立即返回作业信息，停止、删除在后台线程中完成
+        - 需要停止的任务并行发送停止信号（每个最多等待 5 秒）
+        - 视频文件与临时目录交给后台删除队列
+        - 通过 get_batch_job(job_id) 查询每个 id 的处理结果
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'job_id': job_id,
+            'status': 'running',
+            'delete_file': bool(delete_file),
+            'total': len(ids),
+            'done': 0,
+            'created_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'results': [{'id': tid, 'status': 'queued'} for tid in ids],
+        }
+        with self.batch_jobs_lock:
+            self.batch_jobs[job_id] = job
+            # 只保留最近的作业结果
+            while len(self.batch_jobs) > BATCH_JOB_HISTORY:
+                self.batch_jobs.popitem(last=False)
+        threading.Thread(target=self._run_batch_delete, args=(job,), daemon=True).start()
+        return self.get_batch_job(job_id)
+
+    def get_batch_job(self, job_id):
+        """返回批量作业的快照，不存在时返回 None"""
+        with self.batch_jobs_lock:
+            job = self.batch_jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot['results'] = [dict(r) for r in job['results']]
+            return snapshot
+
+    def _set_batch_result(self, job, index, status, message=None):
+        with self.batch_jobs_lock:
+            result = job['results'][index]
+            result['status'] = status
+            if message:
+                result['message'] = message
+            if status not in ('queued', 'stopping'):
+                job['done'] += 1
+
+    def _run_batch_delete(self, job):
+        # results 会被 get_batch_job 并发读取，读写都在 batch_jobs_lock 内进行
+        with self.batch_jobs_lock:
+            raw_ids = [result['id'] for result in job['results']]
+        tasks = {}
+        for index, raw_id in enumerate(raw_ids):
+            try:
+                tid = int(raw_id)
+            except Exception:
+                self._set_batch_result(job, index, 'invalid_id')
+                continue
+            task = self.db.get_task(tid)
+            if not task:
+                self._set_batch_result(job, index, 'not_found')
+                continue
+            with self.batch_jobs_lock:
+                job['results'][index]['id'] = tid
+            tasks[index] = task
+
+        # 并行停止运行中/等待中的任务
+        with self.queue_lock:
+            active = set(self.active_tasks)
+        to_stop = [i for i, t in tasks.items() if t['id'] in active or t.get('status') == 'pending']
+        if to_stop:
+            for index in to_stop:
+                self._set_batch_result(job, index, 'stopping')
+
+            def _stop(index):
+                tid = tasks[index]['id']
+                try:
+                    self.stop_download(tid)
+                except Exception as e:
+                    try:
+                        self.db.add_log(tid, f"删除前停止任务失败: {str(e)}")
+                    except Exception:
+                        pass
+
+            with ThreadPoolExecutor(max_workers=min(BATCH_STOP_WORKERS, len(to_stop))) as pool:
+                list(pool.map(_stop, to_stop))
+
+        for index, task in tasks.items():
+            tid = task['id']
+            if job['delete_file']:
+                self.remove_path_async(task.get('file_path'))
+                self.remove_path_async(self._task_temp_dir(tid))
+            try:
+                self.db.delete_task(tid)
+                self._set_batch_result(job, index, 'deleted')
+            except Exception as e:
+                self._set_batch_result(job, index, 'error', str(e))
+
+        with self.batch_jobs_lock:
+            job['status'] = 'completed'
+            job['finished_at'] = datetime.now().isoformat()
+
+    def _recover_unfinished_tasks(self):
+        """启动时把 pending 和残留的 downloading 任务按创建顺序重新放入等待队列"""
+        try:
+            tasks = [t for t in self.db.get_all_tasks() if t.get('status') in ('pending', 'downloading')]
+        except Exception:
+            return
+        tasks.sort(key=lambda t: t.get('id', 0))
+        for task in tasks:
+            task_id = task['id']
+            with self.queue_lock:
+                self.cancel_flags[task_id] = threading.Event()
+            try:
+                self.db.update_task(task_id, status='pending', speed='', eta='', next_retry_at=None)
+                self.db.add_log(task_id, "服务重启，任务重新加入等待队列")
+            except Exception:
+                pass
+            self.waiting_queue.put({
+                'task_id': task_id,
+                'url': task['url'],
+                'custom_name': task.get('custom_name')
+            })
+
+    def _terminate_process(self, process, timeout=5):
+        """结束下载进程及其整个进程组（N_m3u8DL-RE 以新会话启动，会派生 ffmpeg 等子进程）"""
+        if process is None or process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except Exception:
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except Exception:
+                try:
+                    process.kill()
+                except Exception:
+                    pass
+            try:
+                process.wait(timeout=timeout)
+            except Exception:
+                pass
+
+    def drain(self):
+        """进入排空模式：停止派发新任务，运行中的任务继续执行"""
+        self.draining = True
+
+    def resume(self):
+        """退出排空模式，恢复派发"""
+        self.draining = False
+
+    def get_drain_status(self):
+        with self.queue_lock:
+            active = list(self.active_tasks.keys())
+        return {
+            'draining': self.draining,
+            'active_tasks': active,
+            'queued': self.waiting_queue.qsize()
+        }
+
+    def shutdown(self, timeout=30):
+        """
+        优雅关闭：
+        1. 停止派发新任务
+        2. 在 timeout 秒内等待运行中的任务自然结束
+        3. 仍未结束的任务终止其进程组，并重置为 pending，重启后自动继续
+        等待队列与重试中的任务本身就是 pending 状态，重启时会被恢复。
+        """
+        self.drain()
+        deadline = time.time() + max(0, timeout)
+        while time.time() < deadline:
+            with self.queue_lock:
+                if not self.active_tasks:
+                    break
+            time.sleep(0.5)
+
+        with self.queue_lock:
+            # 进程已经退出的任务由工作线程按退出码记录结果（完成或失败），不再中断
+            remaining = {tid: p for tid, p in self.active_tasks.items() if p is None or p.poll() is None}
+            self.interrupted_tasks.update(remaining.keys())
+
+        interrupted = []
+        for task_id, process in remaining.items():
+            self._terminate_process(process)
+            # 进程可能在快照之后、收到信号之前正常结束（退出码 0），此时下载已完成，不能改回 pending
+            if process is not None and process.poll() == 0:
+                with self.queue_lock:
+                    self.interrupted_tasks.discard(task_id)
+                continue
+            interrupted.append(task_id)
+            try:
+                task = self.db.get_task(task_id) or {}
+                self.db.update_task(task_id, status='pending', speed='', eta='')
+                self.db.add_log(task_id, "服务关闭，任务已中断，将在重启后继续")
+            except Exception:
+                task = {}
+            # 进程未退出（仅通过 API 排空）时，resume 后可以直接继续
+            with self.queue_lock:
+                self.cancel_flags[task_id] = threading.Event()
+            if task:
+                self.waiting_queue.put({
+                    'task_id': task_id,
+                    'url': task.get('url'),
+                    'custom_name': task.get('custom_name')
+                })
+        return interrupted
+
+    def get_runtime_stats(self):
+        """下载管理器自身的运行状态（统计接口使用，可通过 RPC 获取）"""
+        return {
+            'total_speed': self.get_total_speed(),
+            'active_tasks': self.get_active_tasks(),
+            'failure_stats': self.get_failure_stats(),
+            'draining': self.draining,
+            'aria2': self.aria2.get_stats(),
+            'upload_backends': self.get_upload_metrics()
+        }
+
+    def get_total_speed(self):
+        """所有运行中任务的总下载速度（字节/秒）"""
+        return sum(list(self.task_speeds.values()))
+
     def get_active_tasks(self):
         """获取活动任务列表"""
         with self.queue_lock:
@@ -590,8 +1096,6 @@ class DownloadManager:
     def _push_to_aria2(self, task_id, file_path):
         """推送到 Aria2。支持可选设置 aria2_out_dir（在 storage settings 中）作为 aria2 的 dir 参数。"""
         try:
-            rpc_url = self.db.get_setting('aria2_rpc_url')
-            rpc_secret = self.db.get_setting('aria2_rpc_secret')
             public_host = self.db.get_setting('public_host', 'http://localhost:5000').rstrip('/')
             aria2_out_dir = self.db.get_setting('aria2_out_dir', '') or ''
             
@@ -607,43 +1111,20 @@ class DownloadManager:
             if aria2_out_dir:
                 options['dir'] = aria2_out_dir
 
-            params = [[file_url], options]
-
-            payload = {
-                "jsonrpc": "2.0",
-                "method": "aria2.addUri",
-                "id": f"task-{task_id}",
-                "params": params
-            }
-            
-            # 如果设置了 secret，需要把 token 放到 params 开头
-            if rpc_secret:
-                payload['params'].insert(0, f"token:{rpc_secret}")
-                
             try:
-                response = requests.post(rpc_url, json=payload, timeout=10)
+                gid = self.aria2.call('aria2.addUri', [[file_url], options], timeout=10)
             except Exception as e:
-                self.db.add_log(task_id, f"Aria2 RPC 请求失败: {e}")
+                self.db.add_log(task_id, f"Aria2 推送失败: {e}")
                 return None
-            
-            if response.status_code == 200:
+
+            self.db.add_log(task_id, f"Aria2 推送成功, GID: {gid}")
+            if gid:
                 try:
-                    result = response.json()
+                    self.db.update_task(task_id, aria2_gid=gid, aria2_status='pushed',
+                                        aria2_downloaded=0, aria2_total=None, aria2_speed=0)
                 except Exception:
-                    self.db.add_log(task_id, f"Aria2 返回不可解析的 JSON: {response.text}")
-                    return None
-
-                gid = result.get('result')
-                self.db.add_log(task_id, f"Aria2 推送成功, GID: {gid}")
-                if gid:
-                    try:
-                        self.db.update_task(task_id, aria2_gid=gid)
-                    except Exception:
-                        pass
-                return gid
-            else:
-                self.db.add_log(task_id, f"Aria2 推送失败: {response.status_code} {response.text}")
-                return None
+                    pass
+            return gid
                 
         except Exception as e:
             try:
@@ -652,156 +1133,115 @@ class DownloadManager:
                 pass
             return None
 
-    def _monitor_aria2_and_delete(self, task_id, gid, file_path):
-        """监控 Aria2 任务状态并在完成后删除源文件"""
-        rpc_url = self.db.get_setting('aria2_rpc_url')
-        rpc_secret = self.db.get_setting('aria2_rpc_secret')
-        
-        max_retries = 60 * 60 # 1 hour timeout (assuming 1s sleep)
-        retries = 0
-        
-        while retries < max_retries:
-            try:
-                payload = {
-                    "jsonrpc": "2.0",
-                    "method": "aria2.tellStatus",
-                    "id": f"monitor-{task_id}",
-                    "params": [gid]
-                }
-                
-                if rpc_secret:
-                    payload['params'].insert(0, f"token:{rpc_secret}")
-                    
-                response = requests.post(rpc_url, json=payload, timeout=5)
-                
-                if response.status_code == 200:
-                    status_data = response.json().get('result', {})
-                    status = status_data.get('status')
-                    
-                    if status == 'complete':
-                        self.db.add_log(task_id, "Aria2 下载完成，正在删除源文件")
-                        try:
-                            os.remove(file_path)
-                            # 保留文件名以便前端显示，只清空路径或标记为已删除
-                            # 这里我们不把 file_path 设为空，而是设为一个特殊标记或者保留原路径但增加一个 deleted 标记
-                            # 但为了兼容现有逻辑，我们可以把 file_path 设为空，但确保 custom_name 或其他字段存有文件名
-                            # 实际上，前端显示逻辑优先取 custom_name，其次取 file_path 的 basename
-                            # 如果 file_path 被清空，且没有 custom_name，前端就无法显示文件名了
-                            # 解决方案：在清空 file_path 之前，确保 custom_name 有值（如果是自动生成的）
-                            
-                            task = self.db.get_task(task_id)
-                            if task and not task.get('custom_name'):
-                                # 如果没有自定义名，把当前文件名保存为自定义名
-                                filename = os.path.basename(file_path)
-                                self.db.update_task(task_id, custom_name=filename)
-                                
-                            self.db.update_task(task_id, file_path="")
-                            self.db.add_log(task_id, "源文件已删除")
-                        except Exception as e:
-                            self.db.add_log(task_id, f"删除源文件失败: {e}")
-                        return
-                    
-                    elif status in ['error', 'removed']:
-                        self.db.add_log(task_id, f"Aria2 任务结束状态异常: {status}")
-                        return
-                        
-                time.sleep(2)
-                retries += 1
-                
-            except Exception as e:
-                print(f"Aria2 监控异常: {e}")
-                time.sleep(5)
-                retries += 1
-                
-        self.db.add_log(task_id, "Aria2 监控超时，未删除源文件")
+    def _task_temp_dir(self, task_id):
+        """任务独立的临时目录"""
+        temp_dir = self.db.get_setting('temp_dir', './temp')
+        return Path(temp_dir) / str(task_id)
 
     def clean_temp_files(self, task_id, custom_name=None):
-        """清理临时文件"""
-        temp_dir = self.db.get_setting('temp_dir', './temp')
-        
-        # 1. 尝试删除以 task_id 命名的临时目录（如果有）
-        # N_m3u8DL-RE 可能会创建以 save_name 为前缀的临时目录
-        if custom_name:
-            save_name = custom_name
-        else:
-            # 这里很难精确知道自动生成的 save_name 中的时间戳，
-            # 但通常 N_m3u8DL-RE 会在 temp_dir 下创建临时文件
-            # 如果我们无法精确匹配，可能只能依赖 N_m3u8DL-RE 的 --del-after-done
-            pass
-            
-        # 简单实现：尝试删除 temp_dir 下包含 task_id 的文件或目录
-        # 注意：这可能不完全准确，取决于 N_m3u8DL-RE 的行为
-        try:
-            for item in os.listdir(temp_dir):
-                if str(task_id) in item:
-                    full_path = os.path.join(temp_dir, item)
-                    if os.path.isdir(full_path):
-                        shutil.rmtree(full_path, ignore_errors=True)
-                    else:
-                        os.remove(full_path)
-        except Exception:
-            pass
+        """清理临时文件：把任务独立的临时目录交给后台删除线程（custom_name 仅为兼容旧调用保留）"""
+        self.remove_path_async(self._task_temp_dir(task_id))
 
-    def _upload_to_ftp(self, task_id, file_path):
-        """上传文件到 FTP 服务器"""
+    def remove_path_async(self, path):
+        """将文件或目录加入后台删除队列，立即返回"""
+        if path:
+            self.deletion_queue.put(str(path))
+
+    def _remove_path(self, path):
         try:
-            # 获取 FTP 配置
-            ftp_host = self.db.get_setting('ftp_host', '')
-            ftp_port_str = self.db.get_setting('ftp_port', '21')
-            ftp_port = int(ftp_port_str) if ftp_port_str and ftp_port_str.strip() else 21
-            ftp_username = self.db.get_setting('ftp_username', '')
-            ftp_password = self.db.get_setting('ftp_password', '')
-            ftp_remote_dir = self.db.get_setting('ftp_remote_dir', '')
-            ftp_passive = self.db.get_setting('ftp_passive_mode', 'true') == 'true'
-
-            if not ftp_host or not ftp_username:
-                self.db.add_log(task_id, "FTP 配置不完整，跳过上传")
-                return False
-
-            self.db.add_log(task_id, f"开始上传到 FTP: {ftp_host}")
-
-            # 创建 FTP 上传器
-            uploader = FTPUploader(
-                host=ftp_host,
-                port=ftp_port,
-                username=ftp_username,
-                password=ftp_password,
-                remote_dir=ftp_remote_dir,
-                use_passive=ftp_passive
-            )
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            print(f"后台删除失败 {path}: {e}")
 
-            # 连接 FTP
-            success, msg = uploader.connect()
-            if not success:
-                self.db.add_log(task_id, f"FTP 连接失败: {msg}")
-                return False
+    def _deletion_worker(self):
+        """后台删除线程：处理删除队列，并定期清理孤立的临时目录"""
+        while True:
+            try:
+                path = self.deletion_queue.get(timeout=5)
+            except Empty:
+                path = None
 
-            self.db.add_log(task_id, "FTP 连接成功，开始上传文件...")
+            if path:
+                self._remove_path(path)
+            # 每轮都检查清理间隔，删除队列持续繁忙时也不会推迟清理
+            self._maybe_sweep_temp_dirs()
 
-            # 上传文件，带进度回调
-            def progress_callback(uploaded, total):
-                try:
-                    progress = (uploaded / total) * 100 if total > 0 else 0
-                    if int(progress) % 10 == 0:  # 每 10% 记录一次
-                        self.db.add_log(task_id, f"FTP 上传进度: {progress:.1f}%")
-                except Exception:
-                    pass
+    def _maybe_sweep_temp_dirs(self):
+        """距上次清理超过 temp_sweep_interval 秒时回收孤立的临时目录"""
+        try:
+            interval = float(self.db.get_setting('temp_sweep_interval', 600))
+        except Exception:
+            interval = 600.0
+        if interval > 0 and time.time() - self.last_temp_sweep >= interval:
+            self.last_temp_sweep = time.time()
+            try:
+                self.sweep_orphaned_temp_dirs()
+            except Exception as e:
+                print(f"清理临时目录异常: {e}")
 
-            filename = os.path.basename(file_path)
-            success, msg = uploader.upload_file(file_path, filename, progress_callback)
+    def sweep_orphaned_temp_dirs(self):
+        """
+        回收孤立的临时目录：
+        - 对应任务已不存在
+        - 任务不在运行/等待中，且目录超过 temp_orphan_max_age 秒未修改
+        返回回收的目录数量
+        """
+        temp_dir = self.db.get_setting('temp_dir', './temp')
+        try:
+            max_age = float(self.db.get_setting('temp_orphan_max_age', 86400))
+        except Exception:
+            max_age = 86400.0
+        if not os.path.isdir(temp_dir):
+            return 0
+
+        with self.queue_lock:
+            busy = set(self.active_tasks.keys())
+            busy.update(item[1] for item in self.retry_schedule)
+
+        removed = 0
+        now = time.time()
+        with os.scandir(temp_dir) as it:
+            for entry in it:
+                # 只处理 <task_id> 形式的目录，其余内容不属于本程序管理
+                if not entry.is_dir() or not entry.name.isdigit():
+                    continue
+                task_id = int(entry.name)
+                if task_id in busy:
+                    continue
+                task = self.db.get_task(task_id)
+                if task:
+                    if task.get('status') in ('pending', 'downloading'):
+                        continue
+                    try:
+                        if now - entry.stat().st_mtime < max_age:
+                            continue
+                    except Exception:
+                        continue
+                self.remove_path_async(entry.path)
+                removed += 1
+        return removed
 
-            uploader.disconnect()
+    def _upload_to_backends(self, task_id, file_path):
+        """
+        依次上传到所有启用的后端。
+        返回 (是否全部成功, 是否需要删除源文件)；未启用任何后端时返回 (False, False)。
+        """
+        enabled = [b for b in self.upload_backends if b.is_enabled()]
+        if not enabled:
+            return False, False
 
-            if success:
-                self.db.add_log(task_id, f"FTP 上传成功: {filename}")
-                return True
+        all_ok = True
+        delete_after = False
+        for backend in enabled:
+            if backend.upload(task_id, file_path):
+                delete_after = delete_after or backend.delete_after_upload()
             else:
-                self.db.add_log(task_id, f"FTP 上传失败: {msg}")
-                return False
+                all_ok = False
+        return all_ok, all_ok and delete_after
 
-        except Exception as e:
-            try:
-                self.db.add_log(task_id, f"FTP 上传异常: {str(e)}")
-            except Exception:
-                pass
-            return False
+    def get_upload_metrics(self):
+        """各上传后端的吞吐指标"""
+        return {b.name: b.get_metrics() for b in self.upload_backends if b.is_enabled() or b.metrics['uploads'] or b.metrics['failures']}
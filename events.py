@@ -0,0 +1,86 @@
+"""
+进程内事件总线（发布/订阅）
+任务的创建、字段更新、删除以及日志追加都会发布到这里，/api/events 通过 Server-Sent Events
+把事件推送给浏览器，前端只需按增量更新界面，不再定时轮询整个任务列表。
+
+主题约定：
+- 'task': 任务事件（task_created / task_updated / task_deleted / resync）
+- 'log:<task_id>': 单个任务的日志行，只推送给正在查看该任务日志的订阅者
+- '*': 订阅全部主题（下载守护进程向 Web 进程转发事件时使用）
+"""
+import json
+import threading
+from queue import Queue, Empty, Full
+
+
+class Subscription:
+    """单个订阅者：持有一个有界队列和关注的主题集合"""
+
+    def __init__(self, topics, max_queue):
+        self.topics = set(topics)
+        self.queue = Queue(maxsize=max_queue)
+
+    def get(self, timeout=None):
+        """取下一条事件 (seq, event, data)，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+class EventBus:
+    """线程安全的事件总线；订阅者消费过慢时丢弃积压并发送 resync，由客户端全量刷新"""
+
+    def __init__(self, max_queue=1000):
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.seq = 0
+
+    def subscribe(self, topics=('task',)):
+        sub = Subscription(topics, self.max_queue)
+        with self.lock:
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def subscriber_count(self):
+        with self.lock:
+            return len(self.subscribers)
+
+    def publish(self, topic, event, data):
+        """发布事件；没有订阅者时几乎没有开销"""
+        with self.lock:
+            if not self.subscribers:
+                return
+            self.seq += 1
+            item = (self.seq, event, data)
+            targets = [s for s in self.subscribers if topic in s.topics or '*' in s.topics]
+
+        for sub in targets:
+            try:
+                sub.queue.put_nowait(item)
+            except Full:
+                # 队列已满：清空积压，让客户端重新拉取一次全量数据
+                try:
+                    while True:
+                        sub.queue.get_nowait()
+                except Empty:
+                    pass
+                try:
+                    sub.queue.put_nowait((item[0], 'resync', {}))
+                except Full:
+                    pass
+
+
+def format_sse(seq, event, data):
+    """编码为一条 SSE 消息"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
+
+
+# 全局事件总线
+event_bus = EventBus()
@@ -1,17 +1,26 @@
 """
 FTP 上传工具模块
 支持将下载完成的视频文件上传到 FTP 服务器
+FTPConnectionPool 在多个上传之间复用已登录的连接，并缓存已创建的远程目录
 """
 import os
 import ftplib
+import hashlib
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
+# 默认上传块大小：1 MB，减少 storbinary 的循环与回调次数
+DEFAULT_BLOCKSIZE = 1024 * 1024
+
 
 class FTPUploader:
     """FTP 上传器"""
 
-    def __init__(self, host, port, username, password, remote_dir='', use_passive=True):
+    def __init__(self, host, port, username, password, remote_dir='', use_passive=True, dir_cache=None):
         """
         初始化 FTP 上传器
 
@@ -22,6 +31,7 @@ class FTPUploader:
             password: 密码
             remote_dir: 远程目录路径（可选）
             use_passive: 是否使用被动模式（默认 True）
+            dir_cache: 已确认存在的远程目录集合（可选，由连接池共享）
         """
         self.host = host
         self.port = port
@@ -29,7 +39,9 @@ class FTPUploader:
         self.password = password
         self.remote_dir = remote_dir
         self.use_passive = use_passive
+        self.dir_cache = dir_cache if dir_cache is not None else set()
         self.ftp = None
+        self.last_used = 0
 
     def connect(self):
         """连接到 FTP 服务器"""
@@ -39,10 +51,18 @@ class FTPUploader:
             self.ftp.login(self.username, self.password)
             self.ftp.set_pasv(self.use_passive)
 
-            # 切换到指定目录
+            # 切换到指定目录（已知存在的目录直接 cwd，失败时再逐级创建）
             if self.remote_dir:
-                self._ensure_remote_dir(self.remote_dir)
-                self.ftp.cwd(self.remote_dir)
+                try:
+                    if self.remote_dir not in self.dir_cache:
+                        raise ftplib.error_perm('550 not cached')
+                    self.ftp.cwd(self.remote_dir)
+                except ftplib.error_perm:
+                    self.dir_cache.discard(self.remote_dir)
+                    self._ensure_remote_dir(self.remote_dir)
+                    self.ftp.cwd(self.remote_dir)
+                    self.dir_cache.add(self.remote_dir)
+            self.last_used = time.time()
 
             return True, "FTP 连接成功"
         except Exception as e:
@@ -67,7 +87,27 @@ class FTPUploader:
                 except Exception:
                     pass
 
-    def upload_file(self, local_file, remote_filename=None, callback=None):
+    def is_alive(self):
+        """用 NOOP 检查控制连接是否可用"""
+        if not self.ftp:
+            return False
+        try:
+            self.ftp.voidcmd('NOOP')
+            return True
+        except Exception:
+            return False
+
+    def remote_size(self, remote_filename):
+        """通过 SIZE 获取远程文件大小，文件不存在或服务器不支持时返回 None"""
+        if not self.ftp:
+            return None
+        try:
+            self.ftp.voidcmd('TYPE I')
+            return self.ftp.size(remote_filename)
+        except Exception:
+            return None
+
+    def upload_file(self, local_file, remote_filename=None, callback=None, blocksize=DEFAULT_BLOCKSIZE, offset=0):
         """
         上传文件到 FTP 服务器
 
@@ -75,6 +115,8 @@ class FTPUploader:
             local_file: 本地文件路径
             remote_filename: 远程文件名（可选，默认使用本地文件名）
             callback: 进度回调函数，接收 (uploaded_bytes, total_bytes) 参数
+            blocksize: 每次发送的块大小（字节）
+            offset: 断点续传的起始偏移；大于 0 时先尝试 REST + STOR，服务器不支持 REST 时改用 APPE
 
         Returns:
             (success, message) 元组
@@ -94,7 +136,7 @@ class FTPUploader:
 
             # 获取文件大小
             file_size = os.path.getsize(local_file)
-            uploaded_size = 0
+            uploaded_size = offset
 
             # 定义进度回调
             def progress_callback(data):
@@ -105,13 +147,76 @@ class FTPUploader:
 
             # 上传文件
             with open(local_file, 'rb') as f:
-                self.ftp.storbinary(f'STOR {remote_filename}', f, blocksize=8192, callback=progress_callback)
+                if offset > 0:
+                    f.seek(offset)
+                    try:
+                        self.ftp.storbinary(f'STOR {remote_filename}', f, blocksize=blocksize,
+                                            callback=progress_callback, rest=offset)
+                    except ftplib.error_perm as e:
+                        # 仅在 REST 被拒绝（尚未传输数据）时回退到 APPE
+                        if uploaded_size != offset:
+                            raise
+                        f.seek(offset)
+                        self.ftp.storbinary(f'APPE {remote_filename}', f, blocksize=blocksize,
+                                            callback=progress_callback)
+                else:
+                    self.ftp.storbinary(f'STOR {remote_filename}', f, blocksize=blocksize, callback=progress_callback)
 
+            self.last_used = time.time()
             return True, f"文件上传成功: {remote_filename}"
 
         except Exception as e:
             return False, f"文件上传失败: {str(e)}"
 
+    def upload_file_resumable(self, local_file, remote_filename=None, callback=None, blocksize=DEFAULT_BLOCKSIZE,
+                              retries=3, backoff=5, log=None):
+        """
+        带断点续传的上传：失败后重新连接，用 SIZE 查询远端已有字节数并从该偏移继续。
+
+        Args:
+            retries: 失败后的最大重试次数
+            backoff: 重试等待的初始秒数，每次翻倍
+            log: 可选的日志函数，接收一条字符串
+
+        Returns:
+            (success, message, stats) 元组，stats 包含 attempts 与 resumed_bytes
+        """
+        if not remote_filename:
+            remote_filename = os.path.basename(local_file)
+        stats = {'attempts': 0, 'resumed_bytes': 0}
+        try:
+            file_size = os.path.getsize(local_file)
+        except Exception:
+            return False, f"本地文件不存在: {local_file}", stats
+
+        offset = 0
+        msg = ''
+        for attempt in range(retries + 1):
+            stats['attempts'] = attempt + 1
+            if attempt > 0:
+                delay = backoff * (2 ** (attempt - 1))
+                if log:
+                    log(f"FTP 上传失败: {msg}，{delay:.0f} 秒后重试 ({attempt}/{retries})")
+                time.sleep(delay)
+                self.disconnect()
+                success, connect_msg = self.connect()
+                if not success:
+                    msg = connect_msg
+                    continue
+                # 远端已有部分数据时从该位置续传；大小异常则整体重传
+                remote = self.remote_size(remote_filename)
+                offset = remote if remote and 0 < remote <= file_size else 0
+                if remote == file_size:
+                    return True, f"文件上传成功: {remote_filename}", stats
+                if offset and log:
+                    log(f"FTP 断点续传: 从 {offset} 字节处继续（剩余 {file_size - offset} 字节）")
+                stats['resumed_bytes'] += offset
+
+            success, msg = self.upload_file(local_file, remote_filename, callback, blocksize=blocksize, offset=offset)
+            if success:
+                return True, msg, stats
+        return False, msg, stats
+
     def disconnect(self):
         """断开 FTP 连接"""
         if self.ftp:
@@ -135,6 +240,145 @@ class FTPUploader:
         self.disconnect()
 
 
+class FTPConnectionPool:
+    """
+    FTP 连接池
+    按 (host, port, username, 密码哈希, remote_dir, use_passive) 分组，每组最多 max_size 个连接；
+    修改密码后旧凭据的空闲连接会被关闭，不会继续复用。
+    max_size 可以在运行时通过 set_max_size 调整，对已有分组立即生效。
+    取出时用 NOOP 做健康检查，空闲超过 idle_timeout 的连接直接关闭重建。
+    同一服务器/用户下已创建的远程目录会被缓存，避免每次上传都逐级 cwd/mkd。
+    """
+
+    def __init__(self, max_size=4, idle_timeout=120):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.cond = threading.Condition()
+        self.idle = {}           # key: [FTPUploader, ...]
+        self.in_use = Counter()  # key: 已借出（含正在建立）的连接数
+        self.dir_caches = {}     # (host, port, username): set(远程目录)
+
+    def _key(self, host, port, username, password, remote_dir, use_passive):
+        # 只保存密码的哈希，凭据变化时分组随之变化
+        secret = hashlib.sha256((password or '').encode('utf-8')).hexdigest()[:16]
+        return (host, int(port), username, secret, remote_dir or '', bool(use_passive))
+
+    def _uploader_key(self, uploader):
+        return self._key(uploader.host, uploader.port, uploader.username, uploader.password,
+                         uploader.remote_dir, uploader.use_passive)
+
+    def set_max_size(self, max_size):
+        """调整每组的连接上限：调大时唤醒等待者，调小时关闭多出的空闲连接"""
+        closing = []
+        with self.cond:
+            if max_size == self.max_size:
+                return
+            self.max_size = max_size
+            for bucket in self.idle.values():
+                while len(bucket) > max_size:
+                    closing.append(bucket.pop(0))
+            self.cond.notify_all()
+        for uploader in closing:
+            uploader.disconnect()
+
+    def _pop_stale_credentials(self, key):
+        """取出同一服务器/用户下其它凭据的空闲连接（调用方持有锁）"""
+        stale = []
+        for other in [k for k in self.idle if k != key and k[:3] == key[:3] and k[3] != key[3]]:
+            stale.extend(self.idle.pop(other))
+        return stale
+
+    def _release_slot(self, key):
+        with self.cond:
+            self.in_use[key] -= 1
+            if self.in_use[key] <= 0:
+                del self.in_use[key]
+            self.cond.notify_all()
+
+    def acquire(self, host, port, username, password, remote_dir='', use_passive=True, timeout=None):
+        """
+        获取一个已连接的 FTPUploader，返回 (uploader, message)；连接失败时 uploader 为 None。
+        使用完毕后必须调用 release()。
+        """
+        key = self._key(host, port, username, password, remote_dir, use_passive)
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while self.in_use[key] >= self.max_size:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None, "FTP 连接池已满，等待超时"
+                self.cond.wait(remaining)
+            self.in_use[key] += 1
+            stale = self._pop_stale_credentials(key)
+        for uploader in stale:
+            uploader.disconnect()
+
+        try:
+            while True:
+                with self.cond:
+                    bucket = self.idle.get(key) or []
+                    uploader = bucket.pop() if bucket else None
+                if uploader is None:
+                    break
+                if time.time() - uploader.last_used <= self.idle_timeout and uploader.is_alive():
+                    return uploader, "复用 FTP 连接"
+                uploader.disconnect()
+
+            with self.cond:
+                dir_cache = self.dir_caches.setdefault((host, int(port), username), set())
+            uploader = FTPUploader(host, port, username, password, remote_dir, use_passive, dir_cache=dir_cache)
+            success, msg = uploader.connect()
+            if not success:
+                self._release_slot(key)
+                return None, msg
+            return uploader, msg
+        except Exception as e:
+            self._release_slot(key)
+            return None, f"FTP 连接失败: {str(e)}"
+
+    def release(self, uploader, reusable=True):
+        """归还连接；上传出错等不可复用的情况下直接断开"""
+        key = self._uploader_key(uploader)
+        keep = False
+        if reusable and uploader.ftp:
+            with self.cond:
+                bucket = self.idle.setdefault(key, [])
+                # 上限调小后多出来的连接不再放回
+                if len(bucket) < self.max_size:
+                    bucket.append(uploader)
+                    keep = True
+        if not keep:
+            uploader.disconnect()
+        self._release_slot(key)
+
+    @contextmanager
+    def connection(self, host, port, username, password, remote_dir='', use_passive=True):
+        """with 语句形式：yield (uploader, message)，退出时自动归还"""
+        uploader, msg = self.acquire(host, port, username, password, remote_dir, use_passive)
+        reusable = True
+        try:
+            yield uploader, msg
+        except Exception:
+            reusable = False
+            raise
+        finally:
+            if uploader is not None:
+                self.release(uploader, reusable)
+
+    def close_all(self):
+        """关闭所有空闲连接"""
+        with self.cond:
+            buckets = list(self.idle.values())
+            self.idle = {}
+        for bucket in buckets:
+            for uploader in bucket:
+                uploader.disconnect()
+
+
+# 所有上传线程共享的连接池
+ftp_pool = FTPConnectionPool()
+
+
 def test_ftp_connection(host, port, username, password, remote_dir=''):
     """
     测试 FTP 连接
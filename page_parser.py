@@ -0,0 +1,345 @@
+"""
+网页视频解析：抓取页面，提取标题与 m3u8 链接
+- parse_page(db, url, use_selenium): 解析单个页面，失败时抛出异常；Selenium 模式使用 browser_pool 中的常驻浏览器
+- parse_many(db, urls, use_selenium): 批量解析，线程池并发执行，同一站点同时最多 parse_per_host_limit 个请求，
+  按完成顺序逐个产出结果（/api/parse/batch 以 NDJSON 流式返回）
+- 解析结果按页面 URL 缓存（parse_cache），重复解析同一页面直接返回
+- 可选探测（playlist_probe）：下载候选播放列表，剔除失效链接并按清晰度排序
+- extract_m3u8_urls: 单次扫描提取 m3u8 链接，相对链接按页面地址补全；最多下载和扫描 parse_max_scan_bytes 字节
+"""
+import re
+import time
+import codecs
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse, urljoin
+
+import requests
+
+from parse_cache import get_parse_cache
+from playlist_probe import apply_probe
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+PAGE_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Cache-Control': 'max-age=0',
+    'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"Windows"',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+PAGE_TIMEOUT = 15
+
+# 默认最多下载和扫描的页面大小，可通过 parse_max_scan_bytes 设置调整
+DEFAULT_MAX_SCAN_BYTES = 5 * 1024 * 1024
+M3U8_MARKER = '.m3u8'
+# 单个链接的最大长度，向两侧扩展时不超过这个范围
+MAX_URL_LENGTH = 2048
+# 链接的边界字符
+URL_QUOTES = '"\'`'
+URL_DELIMITERS = URL_QUOTES + ' \t\r\n<>()'
+_URL_END_RE = re.compile(r'[\s"\'`<>()]')
+_SCHEME_RE = re.compile(r'https?://', re.IGNORECASE)
+_ESCAPED_SLASH_RE = re.compile(r'\\+/')
+_ATTR_PREFIX_RE = re.compile(r'[\w:-]+=')
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+_BASE_HREF_RE = re.compile(r'<base\s[^>]*?href\s*=\s*["\']([^"\']+)', re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def _fetch_with_selenium(db, url):
+    """用浏览器池中的常驻浏览器打开页面，返回 (html, 网络中捕获的 m3u8 链接, 等待结束原因, 最终地址)"""
+    # 延迟导入：browser_pool 依赖本模块的常量
+    from browser_pool import get_browser_pool
+    try:
+        return get_browser_pool(db).fetch(url)
+    except Exception as e:
+        raise Exception(f'Selenium 抓取失败: {str(e)}')
+
+
+def _response_encoding(response, raw):
+    """响应头声明了 charset 时按声明解码，否则查找页面中的 <meta charset>，都没有时按 UTF-8"""
+    encoding = None
+    if 'charset' in (response.headers.get('Content-Type') or '').lower():
+        encoding = response.encoding
+    if not encoding:
+        match = _META_CHARSET_RE.search(raw, 0, 4096)
+        if match:
+            encoding = match.group(1).decode('ascii')
+    try:
+        return codecs.lookup(encoding or 'utf-8').name
+    except LookupError:
+        return 'utf-8'
+
+
+def _read_limited(response, max_bytes):
+    """最多读取 max_bytes 字节的响应体，超出部分不再下载"""
+    chunks = []
+    size = 0
+    try:
+        for chunk in response.iter_content(64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                break
+    finally:
+        response.close()
+    raw = b''.join(chunks)[:max_bytes]
+    return raw.decode(_response_encoding(response, raw), errors='replace')
+
+
+def _fetch_with_requests(url, max_bytes):
+    """返回 (页面内容, 重定向后的最终地址)"""
+    session = requests.Session()
+    response = session.get(url, headers=PAGE_HEADERS, timeout=PAGE_TIMEOUT, stream=True)
+
+    if response.status_code == 403:
+        response.close()
+        try:
+            import cloudscraper
+            scraper = cloudscraper.create_scraper(
+                browser={
+                    'browser': 'chrome',
+                    'platform': 'windows',
+                    'desktop': True
+                }
+            )
+            response = scraper.get(url, timeout=PAGE_TIMEOUT, stream=True)
+            if response.status_code == 403:
+                raise Exception('解析失败 (403 Forbidden): Cloudscraper 也无法绕过')
+        except ImportError:
+            raise Exception('解析失败 (403 Forbidden): 未安装 cloudscraper')
+        except Exception as e:
+            raise Exception(f'Cloudscraper 尝试失败: {str(e)}')
+
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    return _read_limited(response, max_bytes), response.url
+
+
+def _clean_title(text):
+    text = re.sub(r'<[^>]+>', '', text)
+    # 移除换行符，防止批量格式错乱
+    text = text.replace('\n', ' ').replace('\r', '')
+    text = re.sub(r'[^\w\s\-\u4e00-\u9fa5]', '', text)
+    return text.strip()
+
+
+def extract_title(html_content):
+    title = "未命名视频"
+    title_tag_match = _TITLE_RE.search(html_content)
+    if title_tag_match:
+        raw_title = title_tag_match.group(1).strip()
+        if ' - ' in raw_title:
+            raw_title = raw_title.split(' - ')[0]
+        elif ' | ' in raw_title:
+            raw_title = raw_title.split(' | ')[0]
+
+        cleaned = _clean_title(raw_title)
+        if cleaned:
+            title = cleaned
+    return title
+
+
+def _base_url(html_content, page_url):
+    """相对链接的基准地址：页面中的 <base href> 优先，其次是页面地址"""
+    match = _BASE_HREF_RE.search(html_content, 0, 64 * 1024)
+    if match and page_url:
+        return urljoin(page_url, match.group(1).strip())
+    return page_url
+
+
+def _clean_candidate(raw, quoted, base):
+    """还原转义并补全为绝对地址；无法确定为链接的片段返回 None"""
+    url = raw.replace('\\u002F', '/').replace('\\u002f', '/')
+    url = _ESCAPED_SLASH_RE.sub('/', url).replace('&amp;', '&').rstrip('\\')
+    scheme = _SCHEME_RE.search(url)
+    if scheme:
+        return url[scheme.start():]
+    if not quoted:
+        # 不带引号的属性值，如 <source src=/hls/index.m3u8>
+        attr = _ATTR_PREFIX_RE.match(url)
+        if not attr:
+            return None
+        url = url[attr.end():]
+    # 只有扩展名没有文件名（如 endsWith(".m3u8")）不是链接
+    if not base or not url or url.startswith(M3U8_MARKER) or url.startswith(('data:', 'blob:', 'javascript:')):
+        return None
+    absolute = urljoin(base, url)
+    return absolute if absolute.startswith(('http://', 'https://')) else None
+
+
+def extract_m3u8_urls(html_content, page_url=None, max_chars=None):
+    """
+    单次扫描提取页面中的 m3u8 链接，按出现顺序去重返回
+    - 用 str.find 定位每个 .m3u8，再向两侧扩展到引号、空白、尖括号等边界，不使用会回溯的正则
+    - 还原 JSON 转义的斜杠（\\/、\\u002F）和 &amp;
+    - 相对链接按 <base href> 或页面地址补全；不在引号或属性值中的相对片段视为噪声丢弃
+    - 只扫描前 max_chars 个字符
+    """
+    text = html_content[:max_chars] if max_chars else html_content
+    base = _base_url(text, page_url)
+    found = OrderedDict()
+    marker_len = len(M3U8_MARKER)
+    pos = text.find(M3U8_MARKER)
+    while pos != -1:
+        window = max(0, pos - MAX_URL_LENGTH)
+        left = max(text.rfind(d, window, pos) for d in URL_DELIMITERS)
+        start = left + 1 if left >= 0 else window
+        end = pos + marker_len
+        match = _URL_END_RE.search(text, end, end + MAX_URL_LENGTH)
+        end = match.start() if match else min(len(text), end + MAX_URL_LENGTH)
+        quoted = left >= 0 and text[left] in URL_QUOTES
+        url = _clean_candidate(text[start:end], quoted, base)
+        if url:
+            found[url] = None
+        pos = text.find(M3U8_MARKER, end)
+    return list(found)
+
+
+def _max_scan_bytes(db):
+    try:
+        return max(64 * 1024, int(db.get_setting('parse_max_scan_bytes', DEFAULT_MAX_SCAN_BYTES)))
+    except Exception:
+        return DEFAULT_MAX_SCAN_BYTES
+
+
+def parse_page(db, url, use_selenium=False, use_cache=True):
+    """
+    解析单个页面，返回字典或抛出异常
+    成功的结果写入解析缓存；use_cache 为 False 时跳过缓存读取，强制重新抓取
+    """
+    cache = get_parse_cache(db)
+    if use_cache:
+        cached = cache.get(url, use_selenium)
+        if cached:
+            return cached
+    else:
+        cache.record_bypass()
+
+    network_urls = []
+    wait_reason = None
+    max_bytes = _max_scan_bytes(db)
+    if use_selenium:
+        html_content, network_urls, wait_reason, final_url = _fetch_with_selenium(db, url)
+    else:
+        html_content, final_url = _fetch_with_requests(url, max_bytes)
+    html_content = html_content[:max_bytes]
+    title = extract_title(html_content)
+    # 浏览器实际请求过的 m3u8 排在前面，页面源码中找到的其次
+    page_urls = extract_m3u8_urls(html_content, final_url or url)
+    valid_urls = network_urls + [u for u in page_urls if u not in network_urls]
+
+    if not valid_urls:
+        raise Exception('未找到 M3U8 链接或不支持该网站')
+
+    result = {
+        'success': True,
+        'count': len(valid_urls),
+        'results': valid_urls,
+        'title': title,
+        'url': url
+    }
+    cache.put(url, use_selenium, result)
+    if wait_reason:
+        result['wait'] = wait_reason
+    return result
+
+
+def _timed_parse(db, url, use_selenium, use_cache, probe=False):
+    """解析（可选探测候选链接）并记录耗时，异常转换为失败结果"""
+    start = time.time()
+    try:
+        result = parse_page(db, url, use_selenium, use_cache)
+        if probe:
+            result = apply_probe(db, result)
+    except Exception as e:
+        result = {'success': False, 'url': url, 'error': str(e)}
+    result['elapsed_ms'] = int((time.time() - start) * 1000)
+    return result
+
+
+def _host_of(url):
+    try:
+        return urlparse(url).hostname or url
+    except Exception:
+        return url
+
+
+def _int_setting(db, key, default):
+    try:
+        return max(1, int(db.get_setting(key, default)))
+    except Exception:
+        return default
+
+
+def parse_many(db, urls, use_selenium=False, use_cache=True, probe=False):
+    """
+    并发解析多个页面，按完成顺序产出 (index, result)
+    - 全局并发数 parse_workers；同一站点同时最多 parse_per_host_limit 个请求，避免被目标站限流
+    - Selenium 模式下并发数不超过浏览器池大小
+    - probe 为 true 时探测每个页面的候选链接（playlist_probe），只保留可用的并排序
+    - 生成器被提前关闭（客户端断开）时不再提交新的页面
+    """
+    workers = _int_setting(db, 'parse_workers', 8)
+    per_host = _int_setting(db, 'parse_per_host_limit', 2)
+    if use_selenium:
+        from browser_pool import get_browser_pool
+        workers = min(workers, get_browser_pool(db).size())
+
+    queued = OrderedDict()  # host: deque[(index, url)]
+    for index, url in enumerate(urls):
+        queued.setdefault(_host_of(url), deque()).append((index, url))
+
+    running = {}  # future: (index, host)
+    host_running = Counter()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='parse') as pool:
+        def _fill():
+            # 按站点依次取页面，站点并发数与全局并发数都未满时才提交
+            for host, pending in queued.items():
+                while pending and host_running[host] < per_host and len(running) < workers:
+                    index, url = pending.popleft()
+                    host_running[host] += 1
+                    running[pool.submit(_timed_parse, db, url, use_selenium, use_cache, probe)] = (index, host)
+
+        _fill()
+        while running:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, host = running.pop(future)
+                host_running[host] -= 1
+                yield index, future.result()
+            _fill()
+
+
+def summarize(results, elapsed):
+    """批量解析的汇总：成功/失败数、总耗时与单页耗时分布（毫秒）"""
+    latencies = sorted(r.get('elapsed_ms', 0) for r in results)
+    succeeded = sum(1 for r in results if r.get('success'))
+
+    def _percentile(p):
+        if not latencies:
+            return 0
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+    return {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'elapsed_ms': int(elapsed * 1000),
+        'page_p50_ms': _percentile(0.5),
+        'page_p95_ms': _percentile(0.95),
+        'page_max_ms': latencies[-1] if latencies else 0,
+    }
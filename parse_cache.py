@@ -0,0 +1,174 @@
+"""
+页面解析结果缓存
+- 按规范化后的页面 URL 与解析方式（requests / selenium）缓存标题和提取到的 m3u8 链接
+- 条目数上限 parse_cache_size（LRU 淘汰），有效期 parse_cache_ttl 秒；只缓存解析成功的结果
+- parse_cache_persist 为 true 时写入 ./storage/parse_cache.json，重启后仍可命中
+- 请求带 no_cache 时跳过缓存重新解析（结果仍会写回缓存）
+"""
+import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+CACHE_PATH = Path('./storage/parse_cache.json')
+# 持久化时两次写盘的最小间隔（秒），进程退出时再写一次
+SAVE_INTERVAL = 5
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """规范化页面 URL：协议与域名小写，去掉默认端口、片段，查询参数排序"""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+            host = f"{host}:{parts.port}"
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((scheme, host, parts.path or '/', query, ''))
+    except Exception:
+        return url.strip()
+
+
+class ParseCache:
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # 串行写盘，保证后写入的快照不会被旧快照覆盖
+        self.entries = OrderedDict()  # key: (写入时间, 结果)
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'bypass': 0}
+        self.loaded = False
+        self.dirty = False
+        self.last_save = 0
+
+    def _int_setting(self, key, default):
+        try:
+            return int(self.db.get_setting(key, default))
+        except Exception:
+            return default
+
+    def _persist_enabled(self):
+        return str(self.db.get_setting('parse_cache_persist', 'false')).lower() == 'true'
+
+    def _key(self, url, use_selenium):
+        return f"{'selenium' if use_selenium else 'requests'} {normalize_url(url)}"
+
+    def _ensure_loaded(self):
+        """首次使用时从磁盘加载（调用方持有锁）"""
+        if self.loaded:
+            return
+        self.loaded = True
+        if not self._persist_enabled():
+            return
+        try:
+            with open(CACHE_PATH, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            ttl = self._int_setting('parse_cache_ttl', 600)
+            now = time.time()
+            for key, stored_at, result in data:
+                if now - stored_at < ttl:
+                    self.entries[key] = (stored_at, result)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取解析缓存失败: {e}")
+
+    def get(self, url, use_selenium):
+        """命中时返回结果副本（带 cached 与 cache_age 字段），否则返回 None"""
+        key = self._key(url, use_selenium)
+        ttl = self._int_setting('parse_cache_ttl', 600)
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            stored_at, result = entry
+            age = time.time() - stored_at
+            if age >= ttl:
+                del self.entries[key]
+                self.dirty = True
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+        return dict(result, results=list(result['results']), cached=True, cache_age=int(age))
+
+    def record_bypass(self):
+        with self.lock:
+            self.stats['bypass'] += 1
+
+    def put(self, url, use_selenium, result):
+        if not result.get('success'):
+            return
+        size = self._int_setting('parse_cache_size', 500)
+        if size <= 0:
+            return
+        stored = {k: result[k] for k in ('success', 'count', 'title', 'url') if k in result}
+        stored['results'] = list(result.get('results') or [])
+        key = self._key(url, use_selenium)
+        with self.lock:
+            self._ensure_loaded()
+            self.entries[key] = (time.time(), stored)
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+            self.dirty = True
+        self.save()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.dirty = True
+        self.save(force=True)
+
+    def save(self, force=False):
+        """持久化开启时写入磁盘；距离上次写入不足 SAVE_INTERVAL 秒时跳过（force 除外）"""
+        if not self._persist_enabled():
+            return
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty or (not force and time.time() - self.last_save < SAVE_INTERVAL):
+                    return
+                data = [[key, stored_at, result] for key, (stored_at, result) in self.entries.items()]
+                self.dirty = False
+                self.last_save = time.time()
+            try:
+                CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+                tmp = CACHE_PATH.with_suffix('.tmp')
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                tmp.replace(CACHE_PATH)
+            except Exception as e:
+                print(f"保存解析缓存失败: {e}")
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return dict(self.stats,
+                        size=len(self.entries),
+                        max_size=self._int_setting('parse_cache_size', 500),
+                        ttl=self._int_setting('parse_cache_ttl', 600),
+                        hit_rate=round(self.stats['hits'] / lookups, 3) if lookups else 0,
+                        persist=self._persist_enabled())
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_parse_cache(db):
+    """进程内共享的解析缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ParseCache(db)
+            # 退出前把尚未写盘的结果保存下来
+            atexit.register(lambda: _cache.save(force=True))
+        return _cache
@@ -0,0 +1,237 @@
+"""
+M3U8 播放列表解析与清晰度选择模块
+在启动 N_m3u8DL-RE 之前读取主播放列表（master playlist），按选择策略挑出合适的变体，
+并生成对应的 --select-video / --select-audio / --select-subtitle 参数。
+
+选择策略为一个 dict，字段均可为空（表示不限制）：
+- max_height: 最大分辨率高度（如 720）
+- max_bandwidth: 最大码率（bps）
+- video_codec: 偏好的视频编码前缀（如 avc1 / hvc1）
+- audio_lang: 音轨语言，多个用逗号分隔（如 zh,en）
+- subtitle_lang: 字幕语言，多个用逗号分隔
+"""
+import re
+import math
+import requests
+from urllib.parse import urljoin
+
+POLICY_KEYS = ['max_height', 'max_bandwidth', 'video_codec', 'audio_lang', 'subtitle_lang']
+
+# 全局设置中对应的键名
+POLICY_SETTING_KEYS = {
+    'max_height': 'select_max_height',
+    'max_bandwidth': 'select_max_bandwidth',
+    'video_codec': 'select_video_codec',
+    'audio_lang': 'select_audio_lang',
+    'subtitle_lang': 'select_subtitle_lang',
+}
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+_ATTR_RE = re.compile(r'([A-Z0-9\-]+)=("[^"]*"|[^,]*)')
+
+
+def _parse_attributes(text):
+    """解析 #EXT-X-...: 后面的属性列表"""
+    attrs = {}
+    for key, value in _ATTR_RE.findall(text):
+        attrs[key] = value.strip('"')
+    return attrs
+
+
+def _to_int(value):
+    try:
+        if value is None or str(value).strip() == '':
+            return None
+        return int(float(value))
+    except Exception:
+        return None
+
+
+def is_master_playlist(text):
+    return '#EXT-X-STREAM-INF' in (text or '')
+
+
+def parse_master_playlist(text, base_url=''):
+    """
+    解析主播放列表，返回变体列表，每项包含：
+    url, bandwidth, average_bandwidth, width, height, resolution, codecs, frame_rate
+    """
+    variants = []
+    pending = None
+    for raw in (text or '').splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            attrs = _parse_attributes(line.split(':', 1)[1])
+            width = height = None
+            resolution = attrs.get('RESOLUTION', '')
+            if 'x' in resolution:
+                w, h = resolution.lower().split('x', 1)
+                width, height = _to_int(w), _to_int(h)
+            pending = {
+                'bandwidth': _to_int(attrs.get('BANDWIDTH')),
+                'average_bandwidth': _to_int(attrs.get('AVERAGE-BANDWIDTH')),
+                'width': width,
+                'height': height,
+                'resolution': resolution,
+                'codecs': attrs.get('CODECS', ''),
+                'frame_rate': attrs.get('FRAME-RATE', ''),
+            }
+        elif line.startswith('#'):
+            continue
+        elif pending is not None:
+            pending['url'] = urljoin(base_url, line)
+            variants.append(pending)
+            pending = None
+    return variants
+
+
+def parse_media_duration(text):
+    """累加媒体播放列表中所有 #EXTINF 时长（秒）"""
+    total = 0.0
+    for line in (text or '').splitlines():
+        if line.startswith('#EXTINF:'):
+            try:
+                total += float(line[8:].split(',', 1)[0])
+            except Exception:
+                continue
+    return total
+
+
+def fetch_playlist(url, session=None, timeout=10, headers=None):
+    """下载播放列表文本，返回 (text, final_url)；headers 为额外的请求头（如 Referer）"""
+    getter = session or requests
+    request_headers = {'User-Agent': USER_AGENT}
+    if headers:
+        request_headers.update(headers)
+    response = getter.get(url, headers=request_headers, timeout=timeout)
+    response.raise_for_status()
+    return response.text, response.url or url
+
+
+def build_policy(settings_getter, overrides=None):
+    """
+    合并全局设置与任务级策略，任务级非空值优先。
+    settings_getter: 形如 db.get_setting 的函数
+    """
+    policy = {}
+    for key in POLICY_KEYS:
+        value = None
+        if overrides and overrides.get(key) not in (None, ''):
+            value = overrides.get(key)
+        else:
+            value = settings_getter(POLICY_SETTING_KEYS[key], '')
+        if key in ('max_height', 'max_bandwidth'):
+            value = _to_int(value)
+            if value is not None and value <= 0:
+                value = None
+        else:
+            value = str(value or '').strip() or None
+        policy[key] = value
+    return policy
+
+
+def policy_is_active(policy):
+    return bool(policy) and any(policy.get(k) for k in POLICY_KEYS)
+
+
+def select_variant(variants, policy):
+    """
+    按策略从变体中挑选：
+    1. 过滤掉超出 max_height / max_bandwidth 的变体（全部超限时取最小的一个）
+    2. 有偏好编码且存在匹配时只在匹配项中挑
+    3. 取分辨率最高、码率最高的一个
+    """
+    if not variants:
+        return None
+
+    max_height = policy.get('max_height')
+    max_bandwidth = policy.get('max_bandwidth')
+
+    def within_limits(v):
+        if max_height and v.get('height') and v['height'] > max_height:
+            return False
+        if max_bandwidth and v.get('bandwidth') and v['bandwidth'] > max_bandwidth:
+            return False
+        return True
+
+    candidates = [v for v in variants if within_limits(v)]
+    if not candidates:
+        # 没有满足限制的变体时退而求其次，选最小的
+        return min(variants, key=lambda v: (v.get('height') or 0, v.get('bandwidth') or 0))
+
+    codec = (policy.get('video_codec') or '').lower()
+    if codec:
+        preferred = [v for v in candidates if any(c.strip().lower().startswith(codec) for c in v.get('codecs', '').split(','))]
+        if preferred:
+            candidates = preferred
+
+    return max(candidates, key=lambda v: (v.get('height') or 0, v.get('bandwidth') or 0))
+
+
+def resolve_variant(url, policy, session=None, timeout=10):
+    """
+    读取主播放列表并按策略挑选变体。
+    返回选中的变体 dict（附带 duration 与 expected_size），非主播放列表时返回 None。
+    """
+    text, final_url = fetch_playlist(url, session=session, timeout=timeout)
+    if not is_master_playlist(text):
+        return None
+
+    variant = select_variant(parse_master_playlist(text, final_url), policy)
+    if not variant:
+        return None
+
+    variant = dict(variant)
+    variant['duration'] = None
+    variant['expected_size'] = None
+    try:
+        media_text, _ = fetch_playlist(variant['url'], session=session, timeout=timeout)
+        duration = parse_media_duration(media_text)
+        if duration > 0:
+            variant['duration'] = round(duration, 3)
+            # 优先用平均码率估算，峰值码率会明显高估
+            bitrate = variant.get('average_bandwidth') or variant.get('bandwidth')
+            if bitrate:
+                variant['expected_size'] = int(bitrate * duration / 8)
+    except Exception:
+        pass
+    return variant
+
+
+def _lang_filter(langs):
+    items = [x.strip() for x in (langs or '').split(',') if x.strip()]
+    return 'lang="' + '|'.join(re.escape(x) for x in items) + '"'
+
+
+def build_select_args(policy, variant=None):
+    """
+    生成 N_m3u8DL-RE 的轨道选择参数，用于替代 --auto-select。
+    已解析出变体时用其码率精确锁定；否则按策略上限过滤。
+    """
+    video = []
+    if variant and variant.get('bandwidth'):
+        kbps = variant['bandwidth'] / 1000
+        video.append(f'bwMin={int(math.floor(kbps))}')
+        video.append(f'bwMax={int(math.ceil(kbps))}')
+        if variant.get('resolution'):
+            video.append(f'res="{re.escape(variant["resolution"])}"')
+    else:
+        # 主播放列表读取失败时只能按码率/编码过滤，高度上限无法用正则可靠表达
+        if policy.get('max_bandwidth'):
+            video.append(f'bwMax={int(policy["max_bandwidth"] // 1000)}')
+        if policy.get('video_codec'):
+            video.append(f'codecs="{re.escape(policy["video_codec"])}"')
+    video = ':'.join(video + ['for=best']) if video else 'best'
+
+    audio = 'best'
+    if policy.get('audio_lang'):
+        audio = _lang_filter(policy['audio_lang']) + ':for=all'
+
+    subtitle = 'best'
+    if policy.get('subtitle_lang'):
+        subtitle = _lang_filter(policy['subtitle_lang']) + ':for=all'
+
+    return ['--select-video', video, '--select-audio', audio, '--select-subtitle', subtitle]
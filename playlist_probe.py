@@ -0,0 +1,185 @@
+"""
+m3u8 候选链接探测与排序
+页面解析出多个 m3u8 时，并发下载每个候选的播放列表（共用一个带连接池的 Session），
+区分主播放列表 / 媒体播放列表，读取变体码率、分辨率与总时长，给出预估大小：
+- 无法访问、内容不是 M3U8 或没有分片的链接直接剔除（放在 dropped 中）
+- 主播放列表按全局清晰度策略（playlist.build_policy）挑选变体，再读取该变体的媒体播放列表
+- 点播列表时长低于 probe_min_duration 秒视为短片（常见于广告），排在后面
+- 排序：非短片 > 分辨率 > 码率 > 时长，相同时保持页面中的顺序
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import playlist
+
+_lock = threading.Lock()
+_session = None
+_executor = None
+
+
+def _int_setting(db, key, default):
+    try:
+        return max(1, int(db.get_setting(key, default)))
+    except Exception:
+        return default
+
+
+def _get_executor(db):
+    """进程内共享的探测线程池与 Session，连接池大小与并发数一致"""
+    global _session, _executor
+    with _lock:
+        if _executor is None:
+            workers = _int_setting(db, 'probe_workers', 8)
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='probe')
+        return _executor, _session
+
+
+def _segment_urls(text, base_url):
+    return [urljoin(base_url, line.strip()) for line in text.splitlines()
+            if line.strip() and not line.startswith('#')]
+
+
+def _byterange_total(text):
+    """#EXT-X-BYTERANGE 形式的列表，分片大小直接写在列表中"""
+    total = 0
+    for line in text.splitlines():
+        if line.startswith('#EXT-X-BYTERANGE:'):
+            try:
+                total += int(line[17:].split('@', 1)[0])
+            except Exception:
+                return None
+    return total or None
+
+
+def _segment_size(session, url, headers, timeout):
+    """HEAD 请求读取单个分片的大小，失败时返回 None"""
+    try:
+        response = session.head(url, headers={'User-Agent': playlist.USER_AGENT, **headers},
+                                timeout=timeout, allow_redirects=True)
+        if response.ok:
+            return int(response.headers.get('Content-Length') or 0) or None
+    except Exception:
+        pass
+    return None
+
+
+def probe_candidate(session, url, policy, headers=None, timeout=8, min_duration=60):
+    """
+    探测单个候选链接，返回字典：
+    url, alive, type(master/media), variants, resolution, height, bandwidth,
+    duration, segments, live, short, estimated_size, elapsed_ms；不可用时带 error
+    """
+    start = time.time()
+    headers = headers or {}
+    info = {'url': url, 'alive': False}
+    try:
+        text, final_url = playlist.fetch_playlist(url, session=session, timeout=timeout, headers=headers)
+        if not text.lstrip('\ufeff \r\n').startswith('#EXTM3U'):
+            raise Exception('不是有效的 M3U8')
+
+        bitrate = None
+        if playlist.is_master_playlist(text):
+            variants = playlist.parse_master_playlist(text, final_url)
+            variant = playlist.select_variant(variants, policy)
+            if not variant:
+                raise Exception('主播放列表中没有可用的变体')
+            bitrate = variant.get('average_bandwidth') or variant.get('bandwidth')
+            info.update({
+                'type': 'master',
+                'variants': len(variants),
+                'variant_url': variant['url'],
+                'resolution': variant.get('resolution') or None,
+                'height': variant.get('height'),
+                'bandwidth': variant.get('bandwidth'),
+            })
+            try:
+                text, final_url = playlist.fetch_playlist(variant['url'], session=session, timeout=timeout, headers=headers)
+            except Exception as e:
+                raise Exception(f'变体播放列表无法访问: {str(e)}')
+        else:
+            info['type'] = 'media'
+
+        segments = _segment_urls(text, final_url)
+        if not segments:
+            raise Exception('播放列表中没有分片')
+        duration = playlist.parse_media_duration(text)
+        live = '#EXT-X-ENDLIST' not in text
+        info.update({
+            'duration': round(duration, 3) if duration > 0 else None,
+            'segments': len(segments),
+            'live': live,
+            # 直播列表只包含最近几个分片，时长不代表节目长度
+            'short': not live and 0 < duration < min_duration,
+            'estimated_size': None,
+        })
+
+        if not live:
+            if bitrate and duration > 0:
+                info['estimated_size'] = int(bitrate * duration / 8)
+            else:
+                # 媒体播放列表没有码率信息：按 BYTERANGE 累加，或用中间一个分片的大小估算
+                size = _byterange_total(text)
+                if size is None:
+                    sample = _segment_size(session, segments[len(segments) // 2], headers, timeout)
+                    size = sample * len(segments) if sample else None
+                info['estimated_size'] = size
+        info['alive'] = True
+    except Exception as e:
+        info['error'] = str(e)
+    info['elapsed_ms'] = int((time.time() - start) * 1000)
+    return info
+
+
+def _rank_key(info):
+    return (not info.get('short'), info.get('height') or 0, info.get('bandwidth') or 0, info.get('duration') or 0)
+
+
+def probe_candidates(db, urls, referer=None):
+    """
+    并发探测多个候选链接，返回
+    {'candidates': 排序后的可用链接, 'dropped': 不可用的链接, 'best': 最佳链接或 None, 'elapsed_ms': 耗时}
+    """
+    start = time.time()
+    executor, session = _get_executor(db)
+    policy = playlist.build_policy(db.get_setting)
+    timeout = _int_setting(db, 'probe_timeout', 8)
+    try:
+        min_duration = max(0, int(db.get_setting('probe_min_duration', 60)))
+    except Exception:
+        min_duration = 60
+    # 很多 CDN 校验 Referer，带上页面地址
+    headers = {'Referer': referer} if referer else {}
+
+    futures = [executor.submit(probe_candidate, session, url, policy, headers, timeout, min_duration)
+               for url in urls]
+    infos = [f.result() for f in futures]
+    # sorted 是稳定排序，条件相同的候选保持页面中的顺序
+    candidates = sorted([i for i in infos if i['alive']], key=_rank_key, reverse=True)
+    return {
+        'candidates': candidates,
+        'dropped': [i for i in infos if not i['alive']],
+        'best': candidates[0]['url'] if candidates else None,
+        'elapsed_ms': int((time.time() - start) * 1000),
+    }
+
+
+def apply_probe(db, result):
+    """
+    对解析结果做探测：results 替换为排序后的可用链接并附带 probe 详情；
+    所有候选都不可用时抛出异常
+    """
+    probe = probe_candidates(db, result.get('results') or [], referer=result.get('url'))
+    if not probe['candidates']:
+        reason = probe['dropped'][0].get('error') if probe['dropped'] else ''
+        raise Exception(f"{len(probe['dropped'])} 个 M3U8 链接均不可用: {reason}")
+    urls = [c['url'] for c in probe['candidates']]
+    return dict(result, results=urls, count=len(urls), probe=probe)
@@ -0,0 +1,115 @@
+"""
+API 响应处理
+- ?fields= 字段投影：列表页只取需要渲染的字段
+- JSON 响应压缩：客户端支持时使用 br（需安装 brotli）或 gzip，超过 compression_min_size 字节才压缩
+- 快速 JSON 序列化：安装 orjson 时自动使用，未安装时沿用 Flask 默认实现
+"""
+import gzip
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 动态内容压缩优先速度，brotli 质量 4 的压缩率已高于 gzip 6
+BROTLI_QUALITY = 4
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """使用 orjson 序列化；需要缩进输出或遇到无法处理的类型时退回默认实现"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and 'indent' not in kwargs:
+            try:
+                return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+
+def parse_fields(value):
+    """解析 ?fields=id,status,progress，未指定时返回 None；id 总是保留"""
+    if not value:
+        return None
+    fields = {f.strip() for f in value.split(',') if f.strip()}
+    if not fields:
+        return None
+    fields.add('id')
+    return fields
+
+
+def project(items, fields):
+    """只保留 fields 中的字段，fields 为 None 时原样返回"""
+    if fields is None:
+        return items
+    return [{k: v for k, v in item.items() if k in fields} for item in items]
+
+
+def compression_settings(db):
+    """压缩相关设置（storage 已按 settings.json 的变化缓存，这里每次直接读取，修改立即生效）"""
+    values = {'enabled': str(db.get_setting('compression_enabled', 'true')).lower() == 'true'}
+    try:
+        values['min_size'] = int(db.get_setting('compression_min_size', 1024))
+    except Exception:
+        values['min_size'] = 1024
+    try:
+        values['level'] = min(9, max(1, int(db.get_setting('compression_level', 6))))
+    except Exception:
+        values['level'] = 6
+    return values
+
+
+def _choose_encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_response(db, response):
+    """after_request：压缩较大的 JSON 响应（流式响应、文件与已编码的响应不处理）"""
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype != 'application/json'):
+        return response
+
+    settings = compression_settings(db)
+    if not settings['enabled']:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = _choose_encoding()
+    if not encoding:
+        return response
+    data = response.get_data()
+    if len(data) < settings['min_size']:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(data, compresslevel=settings['level'], mtime=0)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # 压缩后的字节与原文不同，强 ETag 改为弱 ETag
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = 'W/' + etag
+    return response
+
+
+def init_response_handling(app, db):
+    """注册快速 JSON 序列化与响应压缩"""
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
+    app.after_request(lambda response: compress_response(db, response))
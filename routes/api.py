@@ -1,8 +1,20 @@
-from flask import Blueprint, request, jsonify, send_from_directory
+from flask import Blueprint, request, jsonify, Response, make_response, send_file, stream_with_context
 from utils import require_auth
+from events import event_bus, format_sse
+from video_server import send_video, video_settings, resolve_video_path, file_cache
+from thumbnails import get_thumbnail_service, KINDS as THUMBNAIL_KINDS
+from response_utils import parse_fields, project
+from admission import admit_submission, client_key, get_queue_status, AdmissionError
+from queue import Queue
+import playlist
+import page_parser
+from browser_pool import get_browser_pool
+from parse_cache import get_parse_cache
+from playlist_probe import apply_probe
 import os
-import requests
-import re
+import json
+import time
+import hashlib
 import secrets
 import traceback
 import threading
@@ -10,10 +22,54 @@ import threading
 def create_api_blueprint(db, download_manager):
     api_bp = Blueprint('api', __name__)
 
+    # 新提交的任务由一个后台线程依次加入下载队列，不再为每个请求创建线程
+    start_queue = Queue()
+
+    def _start_worker():
+        while True:
+            it = start_queue.get()
+            try:
+                download_manager.start_download(it['task_id'], it['url'], it.get('name'))
+            except Exception as e:
+                # 记录失败到日志
+                try:
+                    db.add_log(it['task_id'], f"start_download error: {str(e)}")
+                    db.update_task(it['task_id'], status='failed', error_message=str(e))
+                except Exception:
+                    pass
+
+    threading.Thread(target=_start_worker, daemon=True).start()
+
     @api_bp.route('/api/tasks', methods=['GET'])
     @require_auth(db)
     def get_tasks():
-        """获取所有任务，支持 status 参数和分页（page, per_page）"""
+        """
+        获取所有任务，支持 status 参数和分页（page, per_page）
+        - since=<seq>：只返回该序号之后新增/修改的任务与被删除的任务 id（忽略 status 与分页）
+        - fields=id,status,progress：只返回指定字段（id 总是包含）
+        - 响应带 ETag，If-None-Match 命中时返回 304（任务没有任何变化）
+        """
+        seq = db.get_change_seq()
+        # ETag 由变更序号与查询参数共同决定；压缩后的响应带弱 ETag，比较时忽略 W/ 前缀
+        etag = f'"{seq}-{hashlib.md5(request.query_string).hexdigest()[:8]}"'
+        if etag in [t.strip().replace('W/', '', 1) for t in request.headers.get('If-None-Match', '').split(',')]:
+            response = make_response('', 304)
+            response.headers['ETag'] = etag
+            return response
+
+        fields = parse_fields(request.args.get('fields'))
+        since = request.args.get('since')
+        if since is not None:
+            try:
+                since = int(since)
+            except Exception:
+                return jsonify({'error': 'since 必须为整数'}), 400
+            changes = db.get_task_changes(since)
+            changes['tasks'] = project(changes['tasks'], fields)
+            response = jsonify(changes)
+            response.headers['ETag'] = etag
+            return response
+
         status = request.args.get('status')
         try:
             page = int(request.args.get('page', '1'))
@@ -35,8 +91,9 @@ def create_api_blueprint(db, download_manager):
         end = start + per_page
         page_tasks = tasks[start:end]
 
-        return jsonify({
-            'tasks': page_tasks,
+        response = jsonify({
+            'tasks': project(page_tasks, fields),
+            'seq': seq,
             'pagination': {
                 'total': total,
                 'page': page,
@@ -44,6 +101,8 @@ def create_api_blueprint(db, download_manager):
                 'total_pages': total_pages
             }
         })
+        response.headers['ETag'] = etag
+        return response
 
     @api_bp.route('/api/tasks', methods=['POST'])
     @require_auth(db)
@@ -54,11 +113,18 @@ def create_api_blueprint(db, download_manager):
         - 单个：{ "url": "http://...m3u8", "name": "optional" }
         - 批量：{ "text": "http...\\nhttp...|name\\n..." } 或 提交单个 url 字段包含多行
         响应会尽快返回，并在后台启动下载以避免提交时阻塞。
+        超过等待队列上限或提交频率限制时返回 429 与 Retry-After；
+        响应头 X-Queue-Depth / X-Queue-Limit 给出当前等待队列深度，调用方可据此降速。
         """
         data = request.get_json() or {}
         text = (data.get('text') or '').strip()
         url = (data.get('url') or '').strip()
         custom_name = (data.get('name') or '').strip() or None
+        # 任务级清晰度选择策略（可选），字段见 playlist.POLICY_KEYS
+        selection = data.get('selection') or {}
+        if not isinstance(selection, dict):
+            return jsonify({'error': 'selection 必须为对象'}), 400
+        selection = {k: selection[k] for k in playlist.POLICY_KEYS if selection.get(k) not in (None, '')}
 
         lines = []
         # 优先处理 text（批量）
@@ -81,7 +147,7 @@ def create_api_blueprint(db, download_manager):
             else:
                 return jsonify({'error': '请提供下载链接或文本批量内容'}), 400
 
-        created = []
+        entries = []
         for entry in lines:
             # 支持 "url|filename" 的格式
             if '|' in entry:
@@ -101,31 +167,51 @@ def create_api_blueprint(db, download_manager):
             
             if not u:
                 continue
-            tid = db.create_task(u, name)
+            entries.append((u, name))
+
+        # 准入控制：在写入任何任务之前检查，整批接受或整批拒绝
+        try:
+            admitted = admit_submission(db, client_key(request), len(entries))
+        except AdmissionError as e:
+            body = {'error': str(e), 'code': e.code}
+            body.update(e.details)
+            if e.retry_after is None:
+                return jsonify(body), 413
+            body['retry_after'] = e.retry_after
+            response = jsonify(body)
+            response.status_code = 429
+            response.headers['Retry-After'] = str(e.retry_after)
+            _queue_headers(response, e.details.get('queue'))
+            return response
+
+        created = []
+        for u, name in entries:
+            tid = db.create_task(u, name, selection or None)
             created.append({'task_id': tid, 'url': u, 'name': name})
 
         # 后台启动下载，避免阻塞 HTTP 响应
-        def _start_tasks(tasks):
-            for it in tasks:
-                try:
-                    download_manager.start_download(it['task_id'], it['url'], it.get('name'))
-                except Exception as e:
-                    # 记录失败到日志
-                    try:
-                        db.add_log(it['task_id'], f"start_download error: {str(e)}")
-                        db.update_task(it['task_id'], status='failed', error_message=str(e))
-                    except Exception:
-                        pass
-
-        if created:
-            t = threading.Thread(target=_start_tasks, args=(created,), daemon=True)
-            t.start()
-
-        return jsonify({
+        for it in created:
+            start_queue.put(it)
+
+        queue = admitted['queue']
+        queue['pending'] += len(created)
+        if queue['available'] is not None:
+            queue['available'] = max(0, queue['available'] - len(created))
+        response = jsonify({
             'success': True,
             'created': created,
-            'count': len(created)
+            'count': len(created),
+            'queue': queue
         })
+        _queue_headers(response, queue)
+        if admitted['rate_remaining'] is not None:
+            response.headers['X-RateLimit-Remaining'] = str(admitted['rate_remaining'])
+        return response
+
+    def _queue_headers(response, queue):
+        if queue:
+            response.headers['X-Queue-Depth'] = str(queue['pending'])
+            response.headers['X-Queue-Limit'] = str(queue['max_pending'])
 
     @api_bp.route('/api/tasks/<int:task_id>', methods=['GET'])
     @require_auth(db)
@@ -186,25 +272,12 @@ def create_api_blueprint(db, download_manager):
         if not task:
             return jsonify({'error': '任务不存在'}), 404
 
-        # 如果任务正在运行，先停止
-        if task_id in download_manager.get_active_tasks():
-            download_manager.stop_download(task_id)
+        if delete_file and task['file_path']:
+            file_cache.invalidate(task['file_path'])
 
-        # 删除文件
-        if delete_file:
-            # 1. 删除已下载的视频文件
-            if task['file_path'] and os.path.exists(task['file_path']):
-                try:
-                    os.remove(task['file_path'])
-                except:
-                    pass
-            
-            # 2. 删除临时文件
-            download_manager.clean_temp_files(task_id, task.get('custom_name'))
+        # 任务记录立即删除；停止进程与删除文件在后台完成，接口不等待进程退出
+        download_manager.delete_task(task, delete_file)
 
-        # 删除数据库记录
-        db.delete_task(task_id)
-    
         return jsonify({'success': True, 'message': '任务已删除'})
 
     @api_bp.route('/api/tasks/batch-delete', methods=['POST'])
@@ -212,8 +285,8 @@ def create_api_blueprint(db, download_manager):
     def batch_delete_tasks():
         """
         批量删除任务（请求 JSON: { ids: [1,2,3], delete_file: true }）
-        会先停止正在运行的任务，再删除文件/临时文件（可选），最后删除任务记录。
-        返回每个 id 的处理结果。
+        立即返回 202 与 job_id；停止运行中的任务（并行）、删除文件与任务记录在后台完成，
+        通过 GET /api/tasks/batch-delete/<job_id> 查询每个 id 的处理结果。
         """
         data = request.get_json() or {}
         ids = data.get('ids') or []
@@ -222,68 +295,102 @@ def create_api_blueprint(db, download_manager):
         if not isinstance(ids, list):
             return jsonify({'error': 'ids 必须为数组'}), 400
 
-        results = []
-        for tid in ids:
-            try:
-                tid_int = int(tid)
-            except Exception:
-                results.append({'id': tid, 'status': 'invalid_id'})
-                continue
-
-            task = db.get_task(tid_int)
-            if not task:
-                results.append({'id': tid_int, 'status': 'not_found'})
-                continue
-
-            # 停止运行中的任务
-            try:
-                if tid_int in download_manager.get_active_tasks():
-                    download_manager.stop_download(tid_int)
-            except Exception as e:
-                # 记录但继续处理删除
+        # 先让本进程缓存的视频文件句柄失效（删除本身在下载管理器的后台线程中进行）
+        if delete_file:
+            for tid in ids:
                 try:
-                    db.add_log(tid_int, f"stop before delete error: {str(e)}")
+                    task = db.get_task(int(tid))
                 except Exception:
-                    pass
+                    task = None
+                if task and task.get('file_path'):
+                    file_cache.invalidate(task['file_path'])
 
-            # 删除文件（可选）
-            if delete_file:
-                try:
-                    if task.get('file_path') and os.path.exists(task.get('file_path')):
-                        os.remove(task.get('file_path'))
-                except Exception:
-                    pass
-                try:
-                    download_manager.clean_temp_files(tid_int, task.get('custom_name'))
-                except Exception:
-                    pass
+        job = download_manager.batch_delete(ids, delete_file)
+        return jsonify({'success': True, 'job_id': job['job_id'], 'job': job}), 202
 
-            # 删除记录与日志
-            try:
-                db.delete_task(tid_int)
-                results.append({'id': tid_int, 'status': 'deleted'})
-            except Exception as e:
-                results.append({'id': tid_int, 'status': 'error', 'message': str(e)})
-
-        return jsonify({'success': True, 'results': results})
+    @api_bp.route('/api/tasks/batch-delete/<job_id>', methods=['GET'])
+    @require_auth(db)
+    def get_batch_delete_job(job_id):
+        """查询批量删除作业：status 为 running / completed，results 为每个 id 的结果"""
+        job = download_manager.get_batch_job(job_id)
+        if not job:
+            return jsonify({'error': '作业不存在或已过期'}), 404
+        return jsonify(job)
 
     @api_bp.route('/api/stats', methods=['GET'])
     @require_auth(db)
     def get_stats():
-        """获取统计信息"""
-        all_tasks = db.get_all_tasks()
-
-        stats = {
-            'total': len(all_tasks),
-            'completed': len([t for t in all_tasks if t['status'] == 'completed']),
-            'downloading': len([t for t in all_tasks if t['status'] == 'downloading']),
-            'failed': len([t for t in all_tasks if t['status'] == 'failed']),
-            'pending': len([t for t in all_tasks if t['status'] == 'pending']),
-            'active_tasks': download_manager.get_active_tasks()
-        }
+        """获取统计信息（计数由存储层增量维护，不扫描任务文件）"""
+        stats = db.get_task_stats()
+        stats.update(download_manager.get_runtime_stats())
 
         return jsonify(stats)
 
+    @api_bp.route('/api/events', methods=['GET'])
+    @require_auth(db)
+    def events_stream():
+        """
+        Server-Sent Events 推送任务变化，替代前端定时轮询
+        - 默认订阅任务事件：task_created / task_updated（只含变化字段）/ task_deleted / resync
+        - ?logs=<task_id> 时只订阅该任务的日志行（event: log）
+        """
+        logs_task = request.args.get('logs', type=int)
+        topics = [f'log:{logs_task}'] if logs_task else ['task']
+        sub = event_bus.subscribe(topics)
+
+        def stream():
+            try:
+                # 断线后浏览器 3 秒重连；连接建立时先让客户端做一次全量同步
+                yield 'retry: 3000\n\n'
+                yield format_sse(0, 'resync', {})
+                while True:
+                    item = sub.get(timeout=15)
+                    if item is None:
+                        # 心跳，防止代理断开空闲连接
+                        yield ': ping\n\n'
+                        continue
+                    yield format_sse(*item)
+            finally:
+                event_bus.unsubscribe(sub)
+
+        return Response(stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    @api_bp.route('/api/manager/status', methods=['GET'])
+    @require_auth(db)
+    def manager_status():
+        """获取下载管理器状态（是否处于排空模式、运行中与排队任务数、等待队列上限）"""
+        status = download_manager.get_drain_status()
+        status['queue'] = get_queue_status(db)
+        return jsonify(status)
+
+    @api_bp.route('/api/manager/drain', methods=['POST'])
+    @require_auth(db)
+    def manager_drain():
+        """
+        进入排空模式，停止派发新任务（请求 JSON: { terminate: false, timeout: 30 }）
+        terminate 为 true 时在后台等待 timeout 秒后终止仍在运行的任务，任务重置为 pending
+        """
+        data = request.get_json(silent=True) or {}
+        if data.get('terminate'):
+            try:
+                timeout = float(data.get('timeout', 30))
+            except Exception:
+                timeout = 30.0
+            threading.Thread(target=download_manager.shutdown, args=(timeout,), daemon=True).start()
+        else:
+            download_manager.drain()
+        return jsonify({'success': True, 'status': download_manager.get_drain_status()})
+
+    @api_bp.route('/api/manager/resume', methods=['POST'])
+    @require_auth(db)
+    def manager_resume():
+        """退出排空模式，恢复派发任务"""
+        download_manager.resume()
+        return jsonify({'success': True, 'status': download_manager.get_drain_status()})
+
     @api_bp.route('/api/download/<int:task_id>')
     @require_auth(db)
     def download_video(task_id):
@@ -292,9 +399,46 @@ def create_api_blueprint(db, download_manager):
         if not task or not task['file_path']:
             return jsonify({'error': '文件不存在'}), 404
 
-        download_dir = db.get_setting('download_dir', './downloads')
-        filename = os.path.basename(task['file_path'])
-        return send_from_directory(download_dir, filename, as_attachment=True)
+        settings = video_settings(db)
+        path = resolve_video_path(settings['download_dir'], os.path.basename(task['file_path']))
+        if not path:
+            return jsonify({'error': '文件不存在'}), 404
+        # 需要登录才能访问，只允许浏览器私有缓存
+        return send_video(path, as_attachment=True, max_age=settings['max_age'], public=False,
+                          accel_prefix=settings['accel_prefix'])
+
+    @api_bp.route('/api/tasks/<int:task_id>/<kind>.jpg')
+    @require_auth(db)
+    def task_thumbnail(task_id, kind):
+        """
+        任务封面 (poster) 或拖动预览雪碧图 (sprite)，缺失时提交生成并立即返回 202。
+        前端在 URL 上带文件版本参数，因此可以长期缓存。
+        """
+        if kind not in THUMBNAIL_KINDS:
+            return jsonify({'error': '不支持的类型'}), 404
+        task = db.get_task(task_id)
+        if not task or task.get('status') != 'completed' or not task.get('file_path'):
+            return jsonify({'error': '文件不存在'}), 404
+
+        state, path = get_thumbnail_service(db).get(task['file_path'], kind)
+        if state == 'pending':
+            response = jsonify({'status': 'pending', 'message': '预览图生成中'})
+            response.status_code = 202
+            response.headers['Retry-After'] = '5'
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        if state != 'ready':
+            # 生成失败在 thumbnail_failure_ttl 内直接返回 404，不再重复运行 ffmpeg
+            response = jsonify({'error': '预览图生成失败' if state == 'failed' else '文件不存在'})
+            response.status_code = 404
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        response = send_file(os.path.abspath(path), mimetype='image/jpeg', max_age=31536000, conditional=True)
+        # 需要登录才能访问，只允许浏览器私有缓存
+        response.cache_control.public = False
+        response.cache_control.private = True
+        response.cache_control.immutable = True
+        return response
 
     @api_bp.route('/api/settings', methods=['GET'])
     @require_auth(db)
@@ -351,185 +495,105 @@ def create_api_blueprint(db, download_manager):
             'ffmpeg_exists': os.path.exists(f_path) if ('/' in f_path or '\\' in f_path) else True,
         })
 
-    def _parse_video_logic(url, use_selenium):
-        """内部解析逻辑，返回字典或抛出异常"""
-        html_content = ""
-        
-        if use_selenium:
-            try:
-                from selenium import webdriver
-                from selenium.webdriver.chrome.options import Options
-                from selenium.webdriver.chrome.service import Service
-                import time
-                
-                chrome_options = Options()
-                chrome_options.add_argument('--headless')
-                chrome_options.add_argument('--no-sandbox')
-                chrome_options.add_argument('--disable-dev-shm-usage')
-                chrome_options.add_argument('--disable-gpu')
-                chrome_options.add_argument('--remote-debugging-port=9222')
-                chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-                
-                chromedriver_path = db.get_setting('chromedriver_path')
-                service = None
-                if chromedriver_path:
-                    if not os.path.isabs(chromedriver_path):
-                        chromedriver_path = os.path.abspath(chromedriver_path)
-                    
-                    if not os.path.exists(chromedriver_path):
-                            raise Exception(f'ChromeDriver 不存在: {chromedriver_path}')
-
-                    service = Service(executable_path=chromedriver_path)
-                
-                driver = webdriver.Chrome(service=service, options=chrome_options)
-                try:
-                    driver.get(url)
-                    time.sleep(5)
-                    html_content = driver.page_source
-                finally:
-                    driver.quit()
-                    
-            except ImportError:
-                raise Exception('服务器未安装 selenium 库')
-            except Exception as e:
-                raise Exception(f'Selenium 抓取失败: {str(e)}')
-        else:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Cache-Control': 'max-age=0',
-                'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-                'Sec-Ch-Ua-Mobile': '?0',
-                'Sec-Ch-Ua-Platform': '"Windows"',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Sec-Fetch-User': '?1',
-                'Upgrade-Insecure-Requests': '1'
-            }
-            
-            session = requests.Session()
-            response = session.get(url, headers=headers, timeout=15)
-            
-            if response.status_code == 403:
-                try:
-                    import cloudscraper
-                    scraper = cloudscraper.create_scraper(
-                        browser={
-                            'browser': 'chrome',
-                            'platform': 'windows',
-                            'desktop': True
-                        }
-                    )
-                    response = scraper.get(url)
-                    if response.status_code == 403:
-                            raise Exception('解析失败 (403 Forbidden): Cloudscraper 也无法绕过')
-                except ImportError:
-                    raise Exception('解析失败 (403 Forbidden): 未安装 cloudscraper')
-                except Exception as e:
-                    raise Exception(f'Cloudscraper 尝试失败: {str(e)}')
-            
-            response.raise_for_status()
-            html_content = response.text
-        
-        title = "未命名视频"
-        
-        def clean_title(text):
-            text = re.sub(r'<[^>]+>', '', text)
-            # 移除换行符，防止批量格式错乱
-            text = text.replace('\n', ' ').replace('\r', '')
-            text = re.sub(r'[^\w\s\-\u4e00-\u9fa5]', '', text)
-            return text.strip()
-
-        title_tag_match = re.search(r"<title>(.*?)</title>", html_content, re.IGNORECASE)
-        if title_tag_match:
-            raw_title = title_tag_match.group(1).strip()
-            if ' - ' in raw_title:
-                raw_title = raw_title.split(' - ')[0]
-            elif ' | ' in raw_title:
-                raw_title = raw_title.split(' | ')[0]
-            
-            cleaned = clean_title(raw_title)
-            if cleaned:
-                title = cleaned
-
-        m3u8_urls = set()
-        matches = re.findall(r"var\s+hlsUrl\s*=\s*['\"]([^'\"]+\.m3u8[^'\"]*)['\"]", html_content)
-        for m in matches: m3u8_urls.add(m)
-
-        matches = re.findall(r'"url"\s*:\s*"([^"]+\.m3u8[^"]*)"', html_content)
-        for m in matches:
-            m3u8_urls.add(m.replace('\\/', '/'))
-
-        matches = re.findall(r'src\s*=\s*["\']([^"\']+\.m3u8[^"\']*)["\']', html_content)
-        for m in matches: m3u8_urls.add(m)
-
-        matches = re.findall(r'(https?://[^\s"\'<>]+?\.m3u8[^\s"\'<>]*)', html_content)
-        for m in matches: m3u8_urls.add(m)
-
-        valid_urls = []
-        for u in m3u8_urls:
-            if u.startswith('http'):
-                valid_urls.append(u)
-        
-        if not valid_urls:
-            raise Exception('未找到 M3U8 链接或不支持该网站')
-            
-        return {
-            'success': True,
-            'count': len(valid_urls),
-            'results': valid_urls,
-            'title': title,
-            'url': url
-        }
-
     @api_bp.route('/api/parse/universal', methods=['POST'])
     @require_auth(db)
     def parse_universal():
-        """通用视频解析"""
+        """
+        通用视频解析
+        - no_cache: 跳过解析缓存，重新抓取页面
+        - probe: 探测每个候选 m3u8（类型、清晰度、时长、预估大小），剔除失效链接并排序，详情在 probe 字段
+        - auto_queue: 探测后把排名第一的链接直接加入下载队列（隐含 probe），结果在 queued 字段
+        """
         data = request.get_json()
         url = data.get('url', '').strip()
         use_selenium = data.get('use_selenium', False)
+        use_cache = not data.get('no_cache', False)
+        auto_queue = bool(data.get('auto_queue'))
+        probe = bool(data.get('probe')) or auto_queue
         
         if not url:
             return jsonify({'error': '请提供视频链接'}), 400
             
         try:
-            result = _parse_video_logic(url, use_selenium)
-            return jsonify(result)
+            start = time.time()
+            result = page_parser.parse_page(db, url, use_selenium, use_cache)
+            if probe:
+                result = apply_probe(db, result)
+            result['elapsed_ms'] = int((time.time() - start) * 1000)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
+        if auto_queue:
+            # 与 POST /api/tasks 相同的准入控制
+            try:
+                admit_submission(db, client_key(request), 1)
+                best = result['probe']['best']
+                task_id = db.create_task(best, result.get('title'), None)
+                start_queue.put({'task_id': task_id, 'url': best, 'name': result.get('title')})
+                result['queued'] = {'success': True, 'task_id': task_id, 'url': best}
+            except AdmissionError as e:
+                result['queued'] = {'success': False, 'error': str(e), 'code': e.code, 'retry_after': e.retry_after}
+        return jsonify(result)
+
+    @api_bp.route('/api/parse/stats', methods=['GET'])
+    @require_auth(db)
+    def parse_stats():
+        """解析相关的运行状态（浏览器池、解析缓存命中率）"""
+        return jsonify({
+            'browser_pool': get_browser_pool(db).get_stats(),
+            'cache': get_parse_cache(db).get_stats()
+        })
+
+    @api_bp.route('/api/parse/cache', methods=['DELETE'])
+    @require_auth(db)
+    def clear_parse_cache():
+        """清空解析缓存"""
+        get_parse_cache(db).clear()
+        return jsonify({'success': True})
+
     @api_bp.route('/api/parse/batch', methods=['POST'])
     @require_auth(db)
     def parse_batch():
-        """批量视频解析"""
-        data = request.get_json()
-        urls = data.get('urls', [])
+        """
+        批量视频解析（请求 JSON: { urls: [...], use_selenium: false, stream: false, no_cache: false, probe: false }）
+        页面在线程池中并发解析（同一站点有并发上限）；probe 为 true 时探测并排序每个页面的候选链接。
+        stream 为 true 或 Accept 为 application/x-ndjson 时按完成顺序逐行返回：
+        {"type": "result", "index": 0, ...} ... 最后一行 {"type": "summary", ...}；
+        否则等全部完成后按提交顺序返回 results 与 summary。
+        """
+        data = request.get_json() or {}
+        urls = [str(u).strip() for u in (data.get('urls') or []) if str(u).strip()]
         use_selenium = data.get('use_selenium', False)
-        
+        use_cache = not data.get('no_cache', False)
+        probe = bool(data.get('probe'))
+        stream = bool(data.get('stream')) or 'application/x-ndjson' in request.headers.get('Accept', '')
+
         if not urls:
             return jsonify({'error': '请提供视频链接列表'}), 400
-            
-        results = []
-        for url in urls:
-            url = str(url).strip()
-            if not url: continue
-            
-            try:
-                res = _parse_video_logic(url, use_selenium)
-                results.append(res)
-            except Exception as e:
-                results.append({
-                    'success': False,
-                    'url': url,
-                    'error': str(e)
-                })
-                
+
+        start = time.time()
+        if stream:
+            def generate():
+                results = []
+                for index, result in page_parser.parse_many(db, urls, use_selenium, use_cache, probe):
+                    results.append(result)
+                    yield json.dumps(dict(result, type='result', index=index), ensure_ascii=False) + '\n'
+                summary = page_parser.summarize(results, time.time() - start)
+                yield json.dumps(dict(summary, type='summary'), ensure_ascii=False) + '\n'
+
+            response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+            return response
+
+        results = [None] * len(urls)
+        for index, result in page_parser.parse_many(db, urls, use_selenium, use_cache, probe):
+            results[index] = result
+
         return jsonify({
             'success': True,
-            'results': results
+            'results': results,
+            'summary': page_parser.summarize(results, time.time() - start)
         })
 
     return api_bp
\ No newline at end of file
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, make_response
 import secrets
-from utils import get_admin_password, set_admin_password_hash, verify_password, set_auth_token, get_auth_token
+from utils import get_admin_password, set_admin_password_hash, verify_password, set_auth_token, verify_auth_token
 
 def create_auth_blueprint(db):
     auth_bp = Blueprint('auth', __name__)
@@ -63,7 +63,7 @@ def create_auth_blueprint(db):
             
         token = request.cookies.get('auth_token')
         # 使用随机 token 验证方式
-        if token and get_auth_token(db) == token:
+        if token and verify_auth_token(token, db):
             return jsonify({'authenticated': True, 'initialized': True})
         return jsonify({'authenticated': False, 'initialized': True})
 
@@ -1,5 +1,6 @@
-from flask import Blueprint, render_template, redirect, url_for, request, send_from_directory, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, jsonify
 from utils import get_admin_password, verify_auth_token
+from video_server import send_video, video_settings, resolve_video_path
 import os
 
 def create_views_blueprint(db):
@@ -88,11 +89,12 @@ def create_views_blueprint(db):
 
     @views_bp.route('/videos/<path:filename>')
     def serve_video(filename):
-        """提供视频文件 (公开访问，供 Aria2 和播放器使用)"""
-        download_dir = db.get_setting('download_dir', './downloads')
-        try:
-            return send_from_directory(download_dir, filename, as_attachment=False)
-        except Exception as e:
-            return jsonify({'error': f'文件不存在: {str(e)}'}), 404
+        """提供视频文件 (公开访问，供 Aria2 和播放器使用，支持 Range 拖动)"""
+        settings = video_settings(db)
+        path = resolve_video_path(settings['download_dir'], filename)
+        if not path:
+            return jsonify({'error': '文件不存在'}), 404
+        return send_video(path, as_attachment=False, max_age=settings['max_age'],
+                          accel_prefix=settings['accel_prefix'], accel_name=filename)
 
     return views_bp
\ No newline at end of file
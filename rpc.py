@@ -0,0 +1,376 @@
+"""
+下载守护进程的本地 RPC
+协议：POST /rpc，请求体 {"method": "...", "params": {...}}，响应 {"result": ...} 或 {"error": "..."}
+
+地址格式：
+- unix:///run/m3u8/downloader.sock  （Unix socket，权限 0660；unix://storage/downloader.sock 为相对路径）
+- http://127.0.0.1:5001             （本机 TCP，必须设置 DOWNLOADER_RPC_TOKEN）
+
+默认监听 ./storage/downloader.sock。TCP 端口本机任何用户都能连接，没有令牌时守护进程拒绝启动；
+令牌用 hmac.compare_digest 校验。删除路径的方法只接受下载目录或临时目录之内的路径。
+
+守护进程（daemon.py）持有唯一的 DownloadManager，也是任务文件和任务索引的唯一写入方；
+Web 进程设置环境变量 DOWNLOADER_RPC_ADDRESS 后只作为客户端：读任务直接读文件，
+写任务、控制下载都通过 RPC 转给守护进程，事件通过长轮询转发到本进程的事件总线。
+"""
+import os
+import hmac
+import json
+import time
+import uuid
+import socket
+import threading
+import http.client
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse
+
+import storage
+from events import event_bus
+
+RPC_ADDRESS_ENV = 'DOWNLOADER_RPC_ADDRESS'
+RPC_TOKEN_ENV = 'DOWNLOADER_RPC_TOKEN'
+DEFAULT_RPC_ADDRESS = 'unix://storage/downloader.sock'
+
+
+class RPCError(Exception):
+    """守护进程返回错误或无法连接"""
+
+
+def _parse_address(address):
+    """返回 ('unix', path) 或 ('tcp', (host, port))"""
+    if address.startswith('unix://'):
+        # 不用 urlparse：unix://storage/x.sock 会被拆成主机名 storage 与路径 /x.sock
+        return 'unix', address[len('unix://'):]
+    parsed = urlparse(address)
+    if parsed.scheme in ('http', 'tcp'):
+        return 'tcp', (parsed.hostname or '127.0.0.1', parsed.port or 5001)
+    raise ValueError(f"不支持的 RPC 地址: {address}")
+
+
+# ---------------- 服务端 ----------------
+
+class _RPCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path != '/rpc':
+            self._reply(404, {'error': 'not found'})
+            return
+        token = self.server.token
+        if token and not hmac.compare_digest(self.headers.get('X-RPC-Token', '').encode('utf-8'),
+                                             token.encode('utf-8')):
+            self._reply(403, {'error': 'RPC token 无效'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            method = self.server.methods.get(request.get('method'))
+            if method is None:
+                self._reply(404, {'error': f"未知方法: {request.get('method')}"})
+                return
+            result = method(**(request.get('params') or {}))
+            self._reply(200, {'result': result})
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+
+    def _reply(self, code, body):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # 不逐条打印调用日志（Unix socket 下也没有客户端地址）
+        pass
+
+
+class _UnixRPCServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class RPCServer:
+    """在后台线程中提供 RPC 服务"""
+
+    def __init__(self, address, methods, token=None):
+        kind, target = _parse_address(address)
+        if kind == 'unix':
+            # 清理上次异常退出留下的 socket 文件
+            try:
+                os.unlink(target)
+            except FileNotFoundError:
+                pass
+            self.server = _UnixRPCServer(target, _RPCHandler)
+            os.chmod(target, 0o660)
+        else:
+            if not token:
+                raise ValueError(f"TCP 地址 {address} 本机任何用户都能连接，必须设置 {RPC_TOKEN_ENV}，或改用 unix:// 地址")
+            self.server = ThreadingHTTPServer(target, _RPCHandler)
+        self.server.methods = methods
+        self.server.token = token
+        self.address = address
+        self.unix_path = target if kind == 'unix' else None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.unix_path:
+            try:
+                os.unlink(self.unix_path)
+            except Exception:
+                pass
+
+
+class EventRelay:
+    """守护进程侧：缓存最近的事件，供 Web 进程长轮询拉取"""
+
+    def __init__(self, bus=event_bus, size=2000):
+        # 每次启动生成新的 epoch，客户端据此发现守护进程重启
+        self.epoch = uuid.uuid4().hex
+        self.buffer = deque(maxlen=size)
+        self.cond = threading.Condition()
+        self.subscription = bus.subscribe(['*'])
+        self.thread = threading.Thread(target=self._pump, daemon=True)
+        self.thread.start()
+
+    def _pump(self):
+        while True:
+            item = self.subscription.get(timeout=30)
+            if item is None:
+                continue
+            with self.cond:
+                self.buffer.append(item)
+                self.cond.notify_all()
+
+    def _last_seq(self):
+        return self.buffer[-1][0] if self.buffer else 0
+
+    def poll(self, after=0, epoch=None, wait=25):
+        """
+        返回 {'epoch', 'events': [[seq, event, data], ...], 'last', 'reset'}
+        reset 为 True 表示客户端错过了事件（守护进程重启或缓存已被覆盖），应全量刷新
+        """
+        deadline = time.time() + max(0, min(float(wait), 60))
+        with self.cond:
+            if epoch != self.epoch:
+                return {'epoch': self.epoch, 'events': [], 'last': self._last_seq(), 'reset': True}
+            while True:
+                events = [list(item) for item in self.buffer if item[0] > after]
+                remaining = deadline - time.time()
+                if events or remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            gap = bool(self.buffer) and after > 0 and self.buffer[0][0] > after + 1
+            return {'epoch': self.epoch, 'events': events, 'last': self._last_seq(), 'reset': gap}
+
+
+def _is_within(path, roots):
+    """path 解析符号链接后是否位于某个根目录之内（不含根目录本身）"""
+    real = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        if real != root and os.path.commonpath([real, root]) == root:
+            return True
+    return False
+
+
+def build_methods(db, manager, relay):
+    """守护进程对外暴露的方法表"""
+
+    def remove_path_async(path):
+        # 只删除下载目录或临时目录中的文件，防止通过 RPC 删除任意路径
+        roots = [db.get_setting('download_dir', './downloads'), db.get_setting('temp_dir', './temp')]
+        if not path or not _is_within(str(path), roots):
+            print(f"拒绝删除下载目录与临时目录之外的路径: {path}")
+            return False
+        manager.remove_path_async(path)
+        return True
+
+    def clean_temp_files(task_id, custom_name=None):
+        # 临时目录为 temp_dir/<task_id>，task_id 必须是整数，避免拼出 ../ 路径
+        return manager.clean_temp_files(int(task_id))
+
+    return {
+        'ping': lambda: True,
+        # 任务写入与索引（守护进程是唯一写入方）
+        'create_task': db.create_task,
+        'update_task': lambda task_id, fields: db.update_task(task_id, **fields),
+        'add_log': db.add_log,
+        'delete_task': db.delete_task,
+        'get_change_seq': db.get_change_seq,
+        'get_task_changes': db.get_task_changes,
+        'get_task_stats': db.get_task_stats,
+        # 下载控制
+        'start_download': manager.start_download,
+        'stop_download': manager.stop_download,
+        'get_active_tasks': manager.get_active_tasks,
+        'batch_delete': manager.batch_delete,
+        'get_batch_job': manager.get_batch_job,
+        'remove_path_async': remove_path_async,
+        'clean_temp_files': clean_temp_files,
+        'get_runtime_stats': manager.get_runtime_stats,
+        'get_drain_status': manager.get_drain_status,
+        'drain': manager.drain,
+        'resume': manager.resume,
+        'shutdown': manager.shutdown,
+        # 事件转发
+        'poll_events': relay.poll,
+    }
+
+
+# ---------------- 客户端 ----------------
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class RPCClient:
+    def __init__(self, address, token=None, timeout=30):
+        self.kind, self.target = _parse_address(address)
+        self.address = address
+        self.token = token
+        self.timeout = timeout
+
+    def _connection(self, timeout):
+        if self.kind == 'unix':
+            return _UnixHTTPConnection(self.target, timeout)
+        return http.client.HTTPConnection(self.target[0], self.target[1], timeout=timeout)
+
+    def call(self, method, rpc_timeout=None, **params):
+        body = json.dumps({'method': method, 'params': params}, ensure_ascii=False, default=str)
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['X-RPC-Token'] = self.token
+        conn = self._connection(rpc_timeout or self.timeout)
+        try:
+            conn.request('POST', '/rpc', body.encode('utf-8'), headers)
+            response = conn.getresponse()
+            data = json.loads(response.read() or b'{}')
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            raise RPCError(f"无法连接下载守护进程 ({self.address}): {e}")
+        finally:
+            conn.close()
+        if 'error' in data:
+            raise RPCError(data['error'])
+        return data.get('result')
+
+
+class RemoteStorageDB(storage.StorageDB):
+    """Web 进程侧的存储包装器：读操作直接读文件，写操作与任务索引交给守护进程"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def create_task(self, url, custom_name=None, selection_policy=None):
+        return self.client.call('create_task', url=url, custom_name=custom_name, selection_policy=selection_policy)
+
+    def update_task(self, task_id, **kwargs):
+        return self.client.call('update_task', task_id=task_id, fields=kwargs)
+
+    def add_log(self, task_id, message):
+        return self.client.call('add_log', task_id=task_id, message=message)
+
+    def delete_task(self, task_id):
+        return self.client.call('delete_task', task_id=task_id)
+
+    def get_change_seq(self):
+        return self.client.call('get_change_seq')
+
+    def get_task_changes(self, since):
+        return self.client.call('get_task_changes', since=since)
+
+    def get_task_stats(self):
+        return self.client.call('get_task_stats')
+
+
+class RemoteDownloadManager:
+    """Web 进程侧的 DownloadManager 代理，接口与路由用到的方法一致"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def start_download(self, task_id, url, custom_name=None):
+        return tuple(self.client.call('start_download', task_id=task_id, url=url, custom_name=custom_name))
+
+    def stop_download(self, task_id):
+        return tuple(self.client.call('stop_download', task_id=task_id))
+
+    def get_active_tasks(self):
+        return self.client.call('get_active_tasks')
+
+    def batch_delete(self, ids, delete_file=True):
+        return self.client.call('batch_delete', ids=ids, delete_file=delete_file)
+
+    def get_batch_job(self, job_id):
+        return self.client.call('get_batch_job', job_id=job_id)
+
+    def remove_path_async(self, path):
+        return self.client.call('remove_path_async', path=path)
+
+    def clean_temp_files(self, task_id, custom_name=None):
+        return self.client.call('clean_temp_files', task_id=task_id, custom_name=custom_name)
+
+    def get_runtime_stats(self):
+        return self.client.call('get_runtime_stats')
+
+    def get_drain_status(self):
+        return self.client.call('get_drain_status')
+
+    def drain(self):
+        return self.client.call('drain')
+
+    def resume(self):
+        return self.client.call('resume')
+
+    def shutdown(self, timeout=30):
+        # shutdown 会阻塞到任务结束或超时，RPC 超时需要留出余量
+        return self.client.call('shutdown', rpc_timeout=timeout + 30, timeout=timeout)
+
+
+class EventBridge:
+    """Web 进程侧：长轮询守护进程的事件并转发到本进程的事件总线（供 /api/events 使用）"""
+
+    def __init__(self, client, bus=event_bus):
+        self.client = client
+        self.bus = bus
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        epoch = None
+        after = 0
+        while True:
+            try:
+                result = self.client.call('poll_events', rpc_timeout=40, after=after, epoch=epoch, wait=25)
+            except RPCError as e:
+                print(f"事件转发失败: {e}")
+                time.sleep(3)
+                continue
+
+            if result.get('reset') and epoch is not None:
+                # 错过了事件，让浏览器全量刷新
+                self.bus.publish('task', 'resync', {})
+            epoch = result.get('epoch')
+            for seq, event, data in result.get('events') or []:
+                topic = f"log:{data.get('task_id')}" if event == 'log' else 'task'
+                self.bus.publish(topic, event, data)
+                after = seq
+            after = max(after, result.get('last') or 0)
@@ -44,12 +44,14 @@ const api = {
 
     /**
      * 获取任务，支持 status 与分页参数
-     * getTasks(status='', page=1, per_page=20)
+     * getTasks(status='', page=1, per_page=20, fields=null)
+     * fields: 只返回指定字段的数组（默认返回全部字段）
      * 返回 { tasks: [...], pagination: {...} }
      */
-    async getTasks(status = '', page = 1, per_page = 20) {
+    async getTasks(status = '', page = 1, per_page = 20, fields = null) {
         let url = `${API_BASE}/tasks?page=${page}&per_page=${per_page}`;
         if (status) url += `&status=${encodeURIComponent(status)}`;
+        if (fields) url += `&fields=${fields.join(',')}`;
         const res = await fetch(url);
         if (!res.ok) throw new Error((await res.json()).error || '获取任务失败');
         return await res.json();
@@ -117,6 +119,15 @@ const api = {
         return await res.json();
     },
 
+    /**
+     * 查询批量删除作业进度（status: running / completed）
+     */
+    async getBatchDeleteJob(jobId) {
+        const res = await fetch(`${API_BASE}/tasks/batch-delete/${jobId}`);
+        if (!res.ok) throw new Error((await res.json()).error || '查询删除进度失败');
+        return await res.json();
+    },
+
     async getTaskLogs(taskId) {
         const res = await fetch(`${API_BASE}/tasks/${taskId}/logs`);
         return await res.json();
@@ -150,11 +161,11 @@ const api = {
         return await res.json();
     },
 
-    async parseUniversal(url, useSelenium = false) {
+    async parseUniversal(url, useSelenium = false, noCache = false, probe = false) {
         const res = await fetch(`${API_BASE}/parse/universal`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url, use_selenium: useSelenium })
+            body: JSON.stringify({ url, use_selenium: useSelenium, no_cache: noCache, probe })
         });
         if (!res.ok) throw new Error((await res.json()).error || '解析失败');
         return await res.json();
@@ -168,5 +179,40 @@ const api = {
         });
         if (!res.ok) throw new Error((await res.json()).error || '批量解析失败');
         return await res.json();
+    },
+
+    /**
+     * 流式批量解析：每解析完一个页面调用 onResult(index, result)，返回汇总 summary
+     */
+    async parseBatchStream(urls, useSelenium = false, onResult = () => {}, noCache = false, probe = false) {
+        const res = await fetch(`${API_BASE}/parse/batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
+            body: JSON.stringify({ urls, use_selenium: useSelenium, stream: true, no_cache: noCache, probe })
+        });
+        if (!res.ok) throw new Error((await res.json()).error || '批量解析失败');
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let summary = null;
+        while (true) {
+            const { done, value } = await reader.read();
+            if (value) buffer += decoder.decode(value, { stream: !done });
+            let newline;
+            while ((newline = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (!line) continue;
+                const item = JSON.parse(line);
+                if (item.type === 'summary') {
+                    summary = item;
+                } else {
+                    onResult(item.index, item);
+                }
+            }
+            if (done) break;
+        }
+        return summary;
     }
 };
\ No newline at end of file
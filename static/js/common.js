@@ -1,3 +1,12 @@
+// 任务列表页渲染用到的字段，列表接口只取这些（详情框单独获取完整任务）
+const TASK_LIST_FIELDS = [
+    'id', 'url', 'status', 'progress', 'created_at', 'completed_at', 'custom_name',
+    'file_path', 'file_size', 'duration', 'error_message', 'speed', 'eta',
+    'total_size', 'downloaded_size', 'retry_count', 'next_retry_at',
+    'aria2_gid', 'aria2_status', 'aria2_downloaded', 'aria2_total', 'aria2_speed',
+    'upload_progress', 'upload_speed'
+];
+
 // 工具函数
 const formatSize = (bytes) => {
     if (!bytes || bytes === 0) return '0 B';
@@ -44,8 +53,37 @@ const showToast = (message, type = 'info') => {
 const ui = {
     refreshTimer: null,
     currentTaskId: null,
+    eventSource: null,
+    logSource: null,
+    tasks: [],
+    refreshPending: null,
+    renderPending: null,
 
+    // 优先通过 SSE (/api/events) 接收增量更新；浏览器不支持或连接被拒绝时退回 2 秒轮询
     startRefreshTimer() {
+        this.stopRefreshTimer();
+        if (!window.EventSource) {
+            this.startPolling();
+            return;
+        }
+
+        const source = new EventSource(`${API_BASE}/events`);
+        this.eventSource = source;
+        // 连接（或重连）建立时服务端会先发 resync，届时做一次全量同步
+        source.addEventListener('resync', () => this.refreshData());
+        source.addEventListener('task_created', () => this.scheduleRefresh());
+        source.addEventListener('task_deleted', () => this.scheduleRefresh());
+        source.addEventListener('task_updated', (e) => this.applyTaskUpdate(JSON.parse(e.data)));
+        source.onerror = () => {
+            // 浏览器会自动重连；只有连接被关闭（如 401）时才退回轮询
+            if (source.readyState === EventSource.CLOSED) {
+                this.eventSource = null;
+                this.startPolling();
+            }
+        };
+    },
+
+    startPolling() {
         if (this.refreshTimer) clearInterval(this.refreshTimer);
         this.refreshData();
         this.refreshTimer = setInterval(() => this.refreshData(), 2000);
@@ -56,6 +94,41 @@ const ui = {
             clearInterval(this.refreshTimer);
             this.refreshTimer = null;
         }
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    },
+
+    // 合并单个任务的变化字段；状态变化可能使任务移入/移出当前列表，需重新拉取
+    applyTaskUpdate(event) {
+        const fields = event.fields || {};
+        const task = this.tasks.find(t => t.id === event.id);
+        if ('status' in fields && (!task || task.status !== fields.status)) {
+            this.scheduleRefresh();
+        }
+        if (!task) return;
+        Object.assign(task, fields);
+        this.scheduleRender();
+    },
+
+    // 合并短时间内的多次变化，只做一次全量刷新
+    scheduleRefresh() {
+        if (this.refreshPending) return;
+        this.refreshPending = setTimeout(() => {
+            this.refreshPending = null;
+            this.refreshData();
+        }, 500);
+    },
+
+    scheduleRender() {
+        if (this.renderPending) return;
+        this.renderPending = setTimeout(() => {
+            this.renderPending = null;
+            if (window.currentPageType && window.renderTaskList) {
+                window.renderTaskList(this.tasks);
+            }
+        }, 300);
     },
 
     async refreshData() {
@@ -70,29 +143,30 @@ const ui = {
                 if (window.currentPageType === 'downloading') {
                     // 获取所有下载中和等待中的任务，使用较大 per_page 来尽量一次拉取全部
                     const [downloadingData, pendingData] = await Promise.all([
-                        api.getTasks('downloading', 1, 1000),
-                        api.getTasks('pending', 1, 1000)
+                        api.getTasks('downloading', 1, 1000, TASK_LIST_FIELDS),
+                        api.getTasks('pending', 1, 1000, TASK_LIST_FIELDS)
                     ]);
                     const dTasks = (downloadingData && Array.isArray(downloadingData.tasks)) ? downloadingData.tasks : (downloadingData.tasks || []);
                     const pTasks = (pendingData && Array.isArray(pendingData.tasks)) ? pendingData.tasks : (pendingData.tasks || []);
                     tasks = [...dTasks, ...pTasks];
                     tasks.sort((a, b) => b.id - a.id);
                 } else if (window.currentPageType === 'completed') {
-                    const data = await api.getTasks('completed', 1, 20);
+                    const data = await api.getTasks('completed', 1, 20, TASK_LIST_FIELDS);
                     tasks = data && Array.isArray(data.tasks) ? data.tasks : [];
                 } else if (window.currentPageType === 'all') {
-                    const data = await api.getTasks('', 1, 20);
+                    const data = await api.getTasks('', 1, 20, TASK_LIST_FIELDS);
                     tasks = data && Array.isArray(data.tasks) ? data.tasks : [];
                 } else if (window.currentPageType === 'failed') {
-                    const data = await api.getTasks('failed', 1, 20);
+                    const data = await api.getTasks('failed', 1, 20, TASK_LIST_FIELDS);
                     tasks = data && Array.isArray(data.tasks) ? data.tasks : [];
                 }
                 
+                this.tasks = tasks;
                 window.renderTaskList(tasks);
             }
 
-            // 3. 如果详情模态框打开，更新日志
-            if (this.currentTaskId) {
+            // 3. 如果详情模态框打开且没有日志推送，轮询日志
+            if (this.currentTaskId && !this.logSource) {
                 this.refreshTaskLogs(this.currentTaskId);
             }
 
@@ -104,6 +178,39 @@ const ui = {
         }
     },
 
+    // 订阅单个任务的日志推送，新日志直接追加到详情框
+    watchTaskLogs(taskId) {
+        this.unwatchTaskLogs();
+        if (!window.EventSource) return;
+        const source = new EventSource(`${API_BASE}/events?logs=${taskId}`);
+        this.logSource = source;
+        source.addEventListener('resync', () => this.refreshTaskLogs(taskId));
+        source.addEventListener('log', (e) => this.appendTaskLog(JSON.parse(e.data)));
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED && this.logSource === source) {
+                this.logSource = null;
+            }
+        };
+    },
+
+    unwatchTaskLogs() {
+        if (this.logSource) {
+            this.logSource.close();
+            this.logSource = null;
+        }
+    },
+
+    appendTaskLog(log) {
+        const logContainer = document.getElementById('taskLogs');
+        if (!logContainer || log.task_id !== this.currentTaskId) return;
+        const isScrolledToBottom = logContainer.scrollHeight - logContainer.clientHeight <= logContainer.scrollTop + 1;
+        logContainer.insertAdjacentHTML('beforeend',
+            `<div class="log-line"><span class="text-muted">[${new Date(log.timestamp).toLocaleTimeString()}]</span> ${log.message}</div>`);
+        if (isScrolledToBottom) {
+            logContainer.scrollTop = logContainer.scrollHeight;
+        }
+    },
+
     updateStats(stats) {
         const setText = (id, val) => {
             const el = document.getElementById(id);
@@ -199,6 +306,7 @@ window.showTaskDetail = async (id) => {
                         <tr><td class="text-muted">生成名:</td><td>${generatedName}</td></tr>
                         <tr><td class="text-muted">大小:</td><td>${formatSize(task.file_size || 0)}</td></tr>
                         <tr><td class="text-muted">时长:</td><td>${task.duration || '-'}</td></tr>
+                        ${task.selected_variant ? `<tr><td class="text-muted">变体:</td><td>${task.selected_variant.resolution || '-'} / ${task.selected_variant.bandwidth ? Math.round(task.selected_variant.bandwidth / 1000) + ' kbps' : '-'}${task.expected_size ? ' (预计 ' + formatSize(task.expected_size) + ')' : ''}</td></tr>` : ''}
                         <tr><td class="text-muted">路径:</td><td class="text-break">${task.file_path || '-'}</td></tr>
                     </table>
                 </div>
@@ -222,9 +330,11 @@ window.showTaskDetail = async (id) => {
 
         modal.show();
         ui.refreshTaskLogs(id);
+        ui.watchTaskLogs(id);
 
         modalEl.addEventListener('hidden.bs.modal', () => {
             ui.currentTaskId = null;
+            ui.unwatchTaskLogs();
         }, { once: true });
 
     } catch (err) {
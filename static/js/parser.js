@@ -13,6 +13,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const activeTab = document.querySelector('#parserTabs .nav-link.active');
             const isBatch = activeTab.id === 'batch-tab';
             const useSelenium = document.getElementById('useSelenium').checked;
+            const noCache = document.getElementById('noCache').checked;
+            const probe = document.getElementById('probeLinks').checked;
             const btn = e.target.querySelector('button[type="submit"]');
             const resultDiv = document.getElementById('parseResult');
             
@@ -40,20 +42,26 @@ document.addEventListener('DOMContentLoaded', () => {
                     const urlList = urls.split('\n').map(u => u.trim()).filter(u => u);
                     if (urlList.length === 0) throw new Error('请输入有效的视频链接');
 
-                    const data = await api.parseBatch(urlList, useSelenium);
-                    
-                    batchResults = data.results;
-                    renderBatchResults(data.results);
-                    
+                    // 先列出所有链接，解析完成一个就更新一个
+                    batchResults = urlList.map(url => ({ url, pending: true }));
+                    renderBatchResults(batchResults);
                     resultDiv.classList.remove('d-none');
                     document.getElementById('batchParseResult').classList.remove('d-none');
 
+                    const summary = await api.parseBatchStream(urlList, useSelenium, (index, result) => {
+                        batchResults[index] = result;
+                        renderBatchResults(batchResults);
+                    }, noCache, probe);
+                    if (summary) {
+                        showToast(`解析完成：成功 ${summary.succeeded} / ${summary.total}，耗时 ${(summary.elapsed_ms / 1000).toFixed(1)} 秒`, 'success');
+                    }
+
                 } else {
                     // 单条解析逻辑
                     const urlInput = document.getElementById('videoPageUrl');
                     if (!urlInput.value.trim()) throw new Error('请输入视频链接');
 
-                    const data = await api.parseUniversal(urlInput.value, useSelenium);
+                    const data = await api.parseUniversal(urlInput.value, useSelenium, noCache, probe);
                     
                     currentTitle = data.title;
                     document.getElementById('parsedTitle').textContent = data.title;
@@ -64,7 +72,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     if (data.count === 1) {
                         // 单个结果
                         currentM3u8Url = data.results[0];
-                        document.getElementById('parsedUrl').textContent = currentM3u8Url;
+                        document.getElementById('parsedUrl').textContent = currentM3u8Url + probeSummary(data, currentM3u8Url, ' - ');
                         document.getElementById('singleResult').classList.remove('d-none');
                     } else {
                         // 多个结果
@@ -72,7 +80,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         document.getElementById('urlList').innerHTML = data.results.map((url, index) => `
                             <div class="list-group-item">
                                 <div class="d-flex w-100 justify-content-between align-items-center mb-2">
-                                    <h6 class="mb-0 text-truncate">链接 ${index + 1}</h6>
+                                    <h6 class="mb-0 text-truncate">链接 ${index + 1}${data.probe && index === 0 ? ' <span class="badge bg-success">推荐</span>' : ''}</h6>
                                     <div class="btn-group btn-group-sm">
                                         <button type="button" class="btn btn-outline-primary" onclick="selectForDownload('${url}')">
                                             <i class="bi bi-download"></i> 下载
@@ -83,6 +91,7 @@ document.addEventListener('DOMContentLoaded', () => {
                                     </div>
                                 </div>
                                 <small class="text-muted text-break font-monospace d-block">${url}</small>
+                                ${data.probe ? `<small class="text-secondary">${probeSummary(data, url)}</small>` : ''}
                             </div>
                         `).join('');
                     }
@@ -98,6 +107,20 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+// 探测结果的简要说明：清晰度 / 时长 / 预计大小
+function probeSummary(data, url, prefix = '') {
+    const info = data.probe && data.probe.candidates.find(c => c.url === url);
+    if (!info) return '';
+    const parts = [];
+    if (info.resolution) parts.push(info.resolution);
+    if (info.bandwidth) parts.push(Math.round(info.bandwidth / 1000) + ' kbps');
+    if (info.live) parts.push('直播');
+    else if (info.duration) parts.push(Math.round(info.duration / 60) + ' 分钟');
+    if (info.estimated_size) parts.push('约 ' + formatSize(info.estimated_size));
+    if (info.short) parts.push('短片');
+    return parts.length ? prefix + parts.join(' / ') : '';
+}
+
 function renderBatchResults(results) {
     const container = document.getElementById('batchResultList');
     document.getElementById('batchCount').textContent = results.length;
@@ -106,8 +129,12 @@ function renderBatchResults(results) {
         let statusHtml = '';
         let actionHtml = '';
         
-        if (item.success) {
+        if (item.pending) {
+            statusHtml = `<span class="badge bg-secondary">解析中</span>`;
+        } else if (item.success) {
             statusHtml = `<span class="badge bg-success">成功 (${item.count}个)</span>`;
+            if (item.cached) statusHtml += ` <span class="badge bg-secondary">缓存</span>`;
+            if (item.probe) statusHtml += ` <small class="text-muted">${probeSummary(item, item.results[0])}</small>`;
             // 默认取第一个结果作为下载链接
             const downloadUrl = item.results[0];
             actionHtml = `
@@ -25,6 +25,17 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // S3 / SFTP / WebDAV 开关联动
+    ['s3', 'sftp', 'webdav'].forEach(name => {
+        const check = document.getElementById(`${name}Enabled`);
+        const config = document.getElementById(`${name}Config`);
+        if (check && config) {
+            check.addEventListener('change', (e) => {
+                config.classList.toggle('d-none', !e.target.checked);
+            });
+        }
+    });
+
     // API 开关联动
     const apiCheck = document.getElementById('apiEnabled');
     const apiConfig = document.getElementById('apiConfig');
@@ -81,15 +92,15 @@ document.addEventListener('DOMContentLoaded', () => {
             const settings = {};
             
             // 处理 checkbox
-            settings['delete_after_download'] = formData.get('delete_after_download') ? 'true' : 'false';
-            settings['aria2_enabled'] = formData.get('aria2_enabled') ? 'true' : 'false';
-            settings['api_enabled'] = formData.get('api_enabled') ? 'true' : 'false';
-            settings['ftp_enabled'] = formData.get('ftp_enabled') ? 'true' : 'false';
-            settings['ftp_passive_mode'] = formData.get('ftp_passive_mode') ? 'true' : 'false';
-            settings['ftp_delete_after_upload'] = formData.get('ftp_delete_after_upload') ? 'true' : 'false';
+            const checkboxFields = [
+                'delete_after_download', 'aria2_enabled', 'api_enabled', 'ftp_enabled', 'ftp_passive_mode', 'ftp_delete_after_upload',
+                's3_enabled', 's3_delete_after_upload', 'sftp_enabled', 'sftp_delete_after_upload', 'webdav_enabled', 'webdav_delete_after_upload'
+            ];
+            checkboxFields.forEach(key => {
+                settings[key] = formData.get(key) ? 'true' : 'false';
+            });
             
             // 处理其他字段
-            const checkboxFields = ['delete_after_download', 'aria2_enabled', 'api_enabled', 'ftp_enabled', 'ftp_passive_mode', 'ftp_delete_after_upload'];
             for (let [key, value] of formData.entries()) {
                 if (!checkboxFields.includes(key)) {
                     settings[key] = value;
@@ -109,12 +109,25 @@ function createTaskCard(task) {
         `;
     }
 
+    // 已完成任务显示封面，鼠标在封面上横向移动时按位置显示预览帧
+    let thumb = '';
+    if (task.status === 'completed' && task.file_path) {
+        const version = encodeURIComponent(`${task.file_size || 0}-${task.completed_at || ''}`);
+        thumb = `
+                <div class="task-thumb" data-sprite="/api/tasks/${task.id}/sprite.jpg?v=${version}"
+                     onmousemove="scrubPreview(event, this)" onmouseleave="resetPreview(this)"
+                     onclick="playVideo('${task.file_path.replace(/\\/g, '\\\\')}', '${task.url}')">
+                    <img src="/api/tasks/${task.id}/poster.jpg?v=${version}" loading="lazy" alt=""
+                         onerror="retryThumb(this)">
+                </div>`;
+    }
+
     return `
         <div class="task-card ${task.status === 'completed' ? 'completed' : (task.status === 'failed' ? 'failed' : '')}">
             <div class="task-header d-flex align-items-start">
                 <div class="form-check me-3">
                     <input class="form-check-input task-checkbox" type="checkbox" value="${task.id}" id="taskCheckbox${task.id}">
-                </div>
+                </div>${thumb}
                 <div class="task-info flex-grow-1">
                     <h5 class="text-truncate" style="max-width: 500px;" title="${title}">${title}</h5>
                     <div class="small text-muted mb-1">
@@ -154,6 +167,21 @@ function createTaskCard(task) {
                     <i class="bi bi-film"></i> ${task.duration}
                 </div>
                 ` : ''}
+                ${task.aria2_status ? `
+                <div class="task-meta-item" title="Aria2 GID: ${task.aria2_gid || '-'}">
+                    <i class="bi bi-send"></i> Aria2: ${task.aria2_status}${task.aria2_total ? ` ${(100 * (task.aria2_downloaded || 0) / task.aria2_total).toFixed(1)}%` : ''}${task.aria2_status === 'active' ? ` ${formatSize(task.aria2_speed || 0)}/s` : ''}
+                </div>
+                ` : ''}
+                ${task.upload_progress !== null && task.upload_progress !== undefined ? `
+                <div class="task-meta-item">
+                    <i class="bi bi-cloud-upload"></i> FTP: ${task.upload_progress}%${task.upload_progress < 100 ? ` ${formatSize(task.upload_speed || 0)}/s` : ''}
+                </div>
+                ` : ''}
+                ${task.status === 'pending' && task.next_retry_at ? `
+                <div class="task-meta-item text-warning" title="${task.error_message || ''}">
+                    <i class="bi bi-arrow-repeat"></i> 第 ${task.retry_count} 次自动重试: ${formatDate(task.next_retry_at)}
+                </div>
+                ` : ''}
             </div>
 
             <div class="task-actions">
@@ -163,6 +191,47 @@ function createTaskCard(task) {
     `;
 }
 
+// 拖动预览：雪碧图为 10x10 网格，按鼠标横向位置选取对应的帧
+const SPRITE_COLUMNS = 10;
+const SPRITE_ROWS = 10;
+
+window.scrubPreview = (event, el) => {
+    const rect = el.getBoundingClientRect();
+    const ratio = Math.min(Math.max((event.clientX - rect.left) / rect.width, 0), 0.9999);
+    const index = Math.floor(ratio * SPRITE_COLUMNS * SPRITE_ROWS);
+    const col = index % SPRITE_COLUMNS;
+    const row = Math.floor(index / SPRITE_COLUMNS);
+    if (!el.classList.contains('scrubbing')) {
+        // 第一次悬停时才请求雪碧图
+        el.style.backgroundImage = `url("${el.dataset.sprite}")`;
+        el.style.backgroundSize = `${SPRITE_COLUMNS * 100}% ${SPRITE_ROWS * 100}%`;
+        el.classList.add('scrubbing');
+    }
+    el.style.backgroundPosition = `${col / (SPRITE_COLUMNS - 1) * 100}% ${row / (SPRITE_ROWS - 1) * 100}%`;
+};
+
+// 封面尚未生成时接口返回 202（不是图片，触发 onerror），隔几秒重试；多次失败后移除封面区域
+const THUMB_RETRIES = 6;
+window.retryThumb = (img) => {
+    const attempt = Number(img.dataset.retry || 0) + 1;
+    if (attempt > THUMB_RETRIES) {
+        const thumb = img.closest('.task-thumb');
+        if (thumb) thumb.remove();
+        return;
+    }
+    img.dataset.retry = attempt;
+    setTimeout(() => {
+        if (!img.isConnected) return;
+        const url = new URL(img.src, location.href);
+        url.searchParams.set('r', attempt);
+        img.src = url.toString();
+    }, 5000);
+};
+
+window.resetPreview = (el) => {
+    el.classList.remove('scrubbing');
+};
+
 // 任务操作函数
 window.stopTask = async (id) => {
     if (confirm('确定要停止该任务吗？')) {
@@ -305,24 +374,23 @@ window.batchDeleteSelected = async () => {
         btn.innerHTML = '删除中...';
 
         try {
-            const res = await fetch('/api/tasks/batch-delete', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ ids: ids, delete_file: deleteFile })
-            });
-            
-            if (!res.ok) {
-                throw new Error('批量删除请求失败');
+            // 接口立即返回作业 id，停止与删除在后台进行，这里轮询进度
+            const data = await api.batchDelete(ids, deleteFile);
+            let job = data.job;
+            while (job.status !== 'completed') {
+                btn.innerHTML = `删除中 ${job.done}/${job.total}...`;
+                await new Promise(resolve => setTimeout(resolve, 500));
+                job = await api.getBatchDeleteJob(data.job_id);
             }
-            
-            const data = await res.json();
-            if (data.success) {
-                showToast(`批量删除完成`, 'success');
-                ui.refreshData();
-                modal.hide();
+
+            const failed = job.results.filter(r => r.status !== 'deleted').length;
+            if (failed) {
+                showToast(`批量删除完成，${failed} 个任务未删除`, 'warning');
             } else {
-                showToast(data.error || '批量删除失败', 'danger');
+                showToast(`批量删除完成`, 'success');
             }
+            ui.refreshData();
+            modal.hide();
         } catch (err) {
             showToast(err.message, 'danger');
         } finally {
@@ -11,7 +11,7 @@ storage.py
 - get_setting(key, default=None)
 - set_setting(key, value)
 - get_all_settings()
-- create_task(url, custom_name=None) -> task_id
+- create_task(url, custom_name=None, selection_policy=None) -> task_id
 - get_task(task_id) -> dict or None
 - get_all_tasks() -> list[dict]
 - get_tasks_by_status(status) -> list[dict]
@@ -19,12 +19,23 @@ storage.py
 - delete_task(task_id)
 - add_log(task_id, message)
 - get_task_logs(task_id) -> list[dict]
+- get_change_seq() -> int
+- get_task_changes(since) -> dict
+- get_task_stats() -> dict
+- rebuild_task_index()
+- StorageDB: 以上函数的对象包装，并把任务变化发布到事件总线
+
+变更序号：每次创建/更新任务都会分配一个单调递增的序号并写入任务的 seq 字段，
+删除任务会留下墓碑记录（./storage/tombstones.json），客户端据此增量同步。
+同一份内存索引还维护各状态的任务数与文件总大小，统计接口无需扫描全部任务。
 """
 import os
 import json
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
 import threading
+from events import event_bus
 
 LOCK = threading.Lock()
 
@@ -32,19 +43,57 @@ STORAGE_DIR = Path('./storage')
 SETTINGS_PATH = STORAGE_DIR / 'settings.json'
 TASKS_DIR = STORAGE_DIR / 'tasks'
 LOGS_DIR = TASKS_DIR / 'logs'
+TOMBSTONES_PATH = STORAGE_DIR / 'tombstones.json'
+
+# 最多保留的删除记录数；更早的删除无法增量同步，客户端需要全量刷新
+TOMBSTONE_LIMIT = 1000
 
 DEFAULT_SETTINGS = {
     'max_concurrent_downloads': '3',
+    'max_pending_tasks': '2000',  # 等待队列上限，超过后提交返回 429（0 不限制）
+    'max_tasks_per_request': '500',  # 单次提交的任务数上限
+    'submit_rate_limit': '600',  # 每个 API Key / 客户端每分钟最多提交的任务数（0 不限制）
+    'parse_workers': '8',  # 批量解析的并发数
+    'parse_per_host_limit': '2',  # 批量解析时同一站点的并发上限
+    'selenium_pool_size': '2',  # 常驻的无头浏览器数量
+    'selenium_max_pages': '50',  # 每个浏览器处理多少个页面后重建
+    'selenium_idle_timeout': '300',  # 浏览器空闲多少秒后关闭
+    'selenium_wait_timeout': '10',  # 打开页面后等待 m3u8 请求或网络空闲的最长秒数
+    'parse_cache_ttl': '600',  # 页面解析结果的缓存秒数
+    'parse_cache_size': '500',  # 最多缓存的页面数（0 关闭缓存）
+    'parse_cache_persist': 'false',  # 是否把解析缓存保存到磁盘，重启后仍可命中
+    'parse_max_scan_bytes': '5242880',  # 解析时最多下载和扫描的页面大小（字节）
+    'probe_workers': '8',  # 探测 m3u8 候选链接的并发数
+    'probe_timeout': '8',  # 探测时下载单个播放列表的超时秒数
+    'probe_min_duration': '60',  # 时长低于此秒数的点播列表视为短片（常见于广告），排在后面
+    'shutdown_grace_period': '30',  # 关闭服务时等待运行中任务结束的秒数
+    # 自动重试（仅针对超时、网络错误等可恢复的失败）
+    'auto_retry_max': '3',
+    'auto_retry_base_delay': '10',
+    'auto_retry_max_delay': '600',
     'n_m3u8dl_path': './bin/N_m3u8DL-RE',
     'ffmpeg_path': './bin/ffmpeg',
     'download_dir': './downloads',
     'temp_dir': './temp',
+    'temp_sweep_interval': '600',  # 孤立临时目录的清理间隔（秒），0 表示关闭
+    'temp_orphan_max_age': '86400',  # 已结束任务的临时目录保留时长（秒）
     'aria2_enabled': 'false',
     'aria2_rpc_url': 'http://localhost:6800/jsonrpc',
     'aria2_rpc_secret': '',
     'aria2_out_dir': '',  # 可选：Aria2 在远端保存的目录（留空则使用 Aria2 默认）
+    'aria2_progress_interval': '5',  # Aria2 传输进度写入任务记录的最小间隔（秒）
     'delete_after_download': 'false',
     'public_host': 'http://localhost:5000',
+    'video_cache_max_age': '3600',  # 视频响应的 Cache-Control max-age（秒）
+    'thumbnail_dir': './storage/thumbnails',  # 封面与拖动预览图缓存目录
+    'thumbnail_cache_mb': '512',  # 缩略图缓存上限（MB），超出后按最近使用淘汰
+    'thumbnail_workers': '2',
+    'thumbnail_auto_generate': 'true',  # 下载完成后立即在后台生成
+    'thumbnail_failure_ttl': '3600',  # 生成失败后多少秒内不再重试（秒）
+    'compression_enabled': 'true',  # 压缩 JSON 响应（br 需安装 brotli，否则使用 gzip）
+    'compression_min_size': '1024',  # 小于该字节数的响应不压缩
+    'compression_level': '6',  # gzip 压缩级别 1-9
+    'video_accel_redirect': '',  # Nginx internal location 前缀（如 /protected-videos/），设置后由 Nginx 发送文件
     'api_enabled': 'false',
     'api_key': '',
     'ftp_enabled': 'false',
@@ -54,7 +103,45 @@ DEFAULT_SETTINGS = {
     'ftp_password': '',
     'ftp_remote_dir': '',
     'ftp_passive_mode': 'true',
-    'ftp_delete_after_upload': 'false'
+    'ftp_delete_after_upload': 'false',
+    'upload_progress_interval': '2',  # 上传进度写入任务记录的最小间隔（秒）
+    'ftp_pool_size': '4',  # 每个 FTP 服务器/用户/目录最多保持的连接数
+    'ftp_block_size': '1048576',  # FTP 上传块大小（字节）
+    'ftp_upload_retries': '3',  # FTP 上传中断后的断点续传重试次数
+    'ftp_retry_backoff': '5',  # 续传重试的初始等待秒数（每次翻倍）
+    's3_enabled': 'false',
+    's3_endpoint_url': '',  # S3 兼容服务地址（如 MinIO），留空使用 AWS
+    's3_region': '',
+    's3_bucket': '',
+    's3_access_key': '',
+    's3_secret_key': '',
+    's3_prefix': '',
+    's3_part_size': '16',  # 分片大小（MB，最小 5）
+    's3_concurrency': '4',  # 同时上传的分片数
+    's3_delete_after_upload': 'false',
+    'sftp_enabled': 'false',
+    'sftp_host': '',
+    'sftp_port': '22',
+    'sftp_username': '',
+    'sftp_password': '',
+    'sftp_key_path': '',  # 私钥路径（RSA / ECDSA / Ed25519 自动识别），留空使用密码
+    'sftp_key_passphrase': '',  # 私钥口令（可选）
+    'sftp_host_key': '',  # 服务器主机密钥：SHA256 指纹或 "ssh-ed25519 AAAA..."，留空时查 known_hosts
+    'sftp_known_hosts': '',  # known_hosts 文件路径，留空使用 ~/.ssh/known_hosts
+    'sftp_remote_dir': '',
+    'sftp_delete_after_upload': 'false',
+    'webdav_enabled': 'false',
+    'webdav_url': '',
+    'webdav_username': '',
+    'webdav_password': '',
+    'webdav_remote_dir': '',
+    'webdav_delete_after_upload': 'false',
+    # 清晰度选择策略（留空表示不限制，沿用 --auto-select 行为）
+    'select_max_height': '',
+    'select_max_bandwidth': '',
+    'select_video_codec': '',
+    'select_audio_lang': '',
+    'select_subtitle_lang': ''
 }
 
 
@@ -68,12 +155,32 @@ def init_storage():
         save_settings(DEFAULT_SETTINGS)
 
 
-def load_settings():
-    """读取 settings.json，返回 dict"""
+# settings.json 的解析结果，按文件的 (inode, mtime, size) 缓存；
+# 文件被本进程或其它进程（下载守护进程）替换后 stat 结果变化，缓存自动失效
+_settings_lock = threading.Lock()
+_settings_cache = {'key': None, 'values': None}
+
+
+def _settings_file_key(st):
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _cached_settings():
+    """返回缓存的设置 dict（只读，调用方不要修改）"""
+    try:
+        key = _settings_file_key(os.stat(SETTINGS_PATH))
+    except OSError:
+        key = None
+    with _settings_lock:
+        if key is not None and key == _settings_cache['key']:
+            return _settings_cache['values']
+
     init_storage()
     try:
         with open(SETTINGS_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            # 用打开的文件取 stat：设置总是原子替换，同一个 inode 的内容不会再变
+            key = _settings_file_key(os.fstat(f.fileno()))
+            values = json.load(f)
     except Exception:
         # 备份并重建默认
         try:
@@ -82,6 +189,15 @@ def load_settings():
             pass
         save_settings(DEFAULT_SETTINGS)
         return DEFAULT_SETTINGS.copy()
+    with _settings_lock:
+        _settings_cache['key'] = key
+        _settings_cache['values'] = values
+    return values
+
+
+def load_settings():
+    """读取 settings.json，返回 dict（副本，可以修改后传给 save_settings）"""
+    return dict(_cached_settings())
 
 
 def save_settings(settings):
@@ -93,11 +209,12 @@ def save_settings(settings):
     with open(tmp, 'w', encoding='utf-8') as f:
         json.dump(settings, f, ensure_ascii=False, indent=2)
     tmp.replace(SETTINGS_PATH)
+    with _settings_lock:
+        _settings_cache['key'] = None
 
 
 def get_setting(key, default=None):
-    settings = load_settings()
-    return settings.get(key, default)
+    return _cached_settings().get(key, default)
 
 
 def set_setting(key, value):
@@ -134,6 +251,83 @@ def _write_task_file(task_id, data):
     tmp.replace(path)
 
 
+# 任务索引：变更序号与统计计数（首次使用时从任务文件和墓碑记录重建）
+_changes = None
+
+
+def _index_task(changes, task):
+    """在 LOCK 内调用：按任务当前的状态和文件大小更新计数"""
+    tid = task['id']
+    old = changes['entries'].get(tid)
+    if old:
+        changes['counts'][old[0]] -= 1
+        changes['total_bytes'] -= old[1]
+    entry = (task.get('status') or '', task.get('file_size') or 0)
+    changes['entries'][tid] = entry
+    changes['counts'][entry[0]] += 1
+    changes['total_bytes'] += entry[1]
+
+
+def _unindex_task(changes, task_id):
+    old = changes['entries'].pop(task_id, None)
+    if old:
+        changes['counts'][old[0]] -= 1
+        changes['total_bytes'] -= old[1]
+
+
+def _load_changes():
+    """
+    在 LOCK 内调用：返回任务索引
+    {'seq', 'index': {task_id: seq}, 'tombstones', 'floor',
+     'entries': {task_id: (status, file_size)}, 'counts': Counter, 'total_bytes'}
+    """
+    global _changes
+    if _changes is not None:
+        return _changes
+    init_storage()
+    changes = {'index': {}, 'entries': {}, 'counts': Counter(), 'total_bytes': 0,
+               'tombstones': [], 'floor': 0}
+    for p in TASKS_DIR.glob("*.json"):
+        data = _read_task_file(p)
+        if data and 'id' in data:
+            changes['index'][data['id']] = data.get('seq') or 0
+            _index_task(changes, data)
+    try:
+        with open(TOMBSTONES_PATH, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        changes['tombstones'] = saved.get('tombstones', [])
+        changes['floor'] = saved.get('floor', 0)
+    except Exception:
+        pass
+    changes['seq'] = max([changes['floor']] + list(changes['index'].values()) +
+                         [t['seq'] for t in changes['tombstones']])
+    _changes = changes
+    return _changes
+
+
+def rebuild_task_index():
+    """丢弃内存索引并从磁盘重建（服务启动时调用）"""
+    global _changes
+    with LOCK:
+        _changes = None
+        _load_changes()
+
+
+def _bump_seq(task_id):
+    """在 LOCK 内调用：为任务分配新的变更序号"""
+    changes = _load_changes()
+    changes['seq'] += 1
+    changes['index'][task_id] = changes['seq']
+    return changes['seq']
+
+
+def _save_tombstones(changes):
+    tmp = TOMBSTONES_PATH.with_suffix('.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'floor': changes['floor'], 'tombstones': changes['tombstones']}, f)
+    tmp.replace(TOMBSTONES_PATH)
+
+
 def _next_task_id():
     """扫描 tasks 目录，返回下一个可用的整数 ID"""
     init_storage()
@@ -148,8 +342,8 @@ def _next_task_id():
     return max_id + 1
 
 
-def create_task(url, custom_name=None):
-    """创建新任务，返回任务 id"""
+def create_task(url, custom_name=None, selection_policy=None):
+    """创建新任务，返回任务 id；selection_policy 为任务级清晰度选择策略（可选）"""
     init_storage()
     with LOCK:
         task_id = _next_task_id()
@@ -172,9 +366,23 @@ def create_task(url, custom_name=None):
             'eta': '',
             'total_size': '',
             'downloaded_size': '',
-            'aria2_gid': ''
+            'aria2_gid': '',
+            'selection_policy': selection_policy or {},
+            'selected_variant': None,
+            'expected_size': None,
+            'retry_count': 0,
+            'failure_class': '',
+            'next_retry_at': None,
+            'aria2_status': '',
+            'aria2_downloaded': None,
+            'aria2_total': None,
+            'aria2_speed': None,
+            'upload_progress': None,
+            'upload_speed': None
         }
+        task['seq'] = _bump_seq(task_id)
         _write_task_file(task_id, task)
+        _index_task(_load_changes(), task)
     return task_id
 
 
@@ -213,16 +421,26 @@ def update_task(task_id, **kwargs):
         task = _read_task_file(path)
         if not task:
             return False
+        changed = False
         for k, v in kwargs.items():
             # 只允许更新白名单字段，防止注入或不小心覆盖重要字段
             if k in [
                 'url', 'status', 'progress', 'started_at', 'completed_at',
                 'file_path', 'file_size', 'duration', 'error_message',
                 'log_file', 'custom_name', 'speed', 'eta', 'total_size',
-                'downloaded_size', 'aria2_gid'
+                'downloaded_size', 'aria2_gid', 'selection_policy',
+                'selected_variant', 'expected_size', 'retry_count',
+                'failure_class', 'next_retry_at', 'aria2_status',
+                'aria2_downloaded', 'aria2_total', 'aria2_speed',
+                'upload_progress', 'upload_speed'
             ]:
                 task[k] = v
+                changed = True
+        if not changed:
+            return True
+        task['seq'] = _bump_seq(task_id)
         _write_task_file(task_id, task)
+        _index_task(_load_changes(), task)
     return True
 
 
@@ -241,18 +459,73 @@ def delete_task(task_id):
                 log.unlink()
         except Exception:
             pass
+        try:
+            changes = _load_changes()
+            _unindex_task(changes, task_id)
+            if changes['index'].pop(task_id, None) is not None:
+                changes['seq'] += 1
+                changes['tombstones'].append({'id': task_id, 'seq': changes['seq']})
+                if len(changes['tombstones']) > TOMBSTONE_LIMIT:
+                    dropped = changes['tombstones'][:-TOMBSTONE_LIMIT]
+                    changes['tombstones'] = changes['tombstones'][-TOMBSTONE_LIMIT:]
+                    changes['floor'] = dropped[-1]['seq']
+                _save_tombstones(changes)
+        except Exception:
+            pass
     return True
 
 
+def get_change_seq():
+    """当前最大变更序号，任何任务变化都会使其增大"""
+    with LOCK:
+        return _load_changes()['seq']
+
+
+def get_task_stats():
+    """按状态统计任务数与文件总大小（由内存索引增量维护，O(1)）"""
+    with LOCK:
+        changes = _load_changes()
+        counts = changes['counts']
+        stats = {
+            'total': len(changes['entries']),
+            'total_bytes': changes['total_bytes']
+        }
+        for status in ('pending', 'downloading', 'completed', 'failed', 'cancelled'):
+            stats[status] = counts.get(status, 0)
+    return stats
+
+
+def get_task_changes(since):
+    """
+    返回序号 since 之后的变化：
+    {'seq': 当前序号, 'tasks': [变化的任务], 'deleted': [被删除的任务 id], 'full': 是否需要全量刷新}
+    since 早于保留的删除记录时 full 为 True（部分删除已无法追溯）。
+    """
+    with LOCK:
+        changes = _load_changes()
+        seq = changes['seq']
+        changed_ids = [tid for tid, s in changes['index'].items() if s > since]
+        deleted = [t['id'] for t in changes['tombstones']
+                   if t['seq'] > since and changes['index'].get(t['id'], 0) < t['seq']]
+        full = since < changes['floor']
+    tasks = []
+    for tid in changed_ids:
+        data = get_task(tid)
+        if data:
+            tasks.append(data)
+    tasks.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    return {'seq': seq, 'tasks': tasks, 'deleted': sorted(set(deleted)), 'full': full}
+
+
 def add_log(task_id, message):
-    """向任务日志追加一行，并确保在任务 JSON 中保留简短信息"""
+    """向任务日志追加一行，并确保在任务 JSON 中保留简短信息；返回写入的日志项（任务不存在时返回 None）"""
     init_storage()
     ts = datetime.now().isoformat()
     line = f"[{ts}] {message}\n"
     logp = _log_path(task_id)
     # 确保任务存在，否则不写入日志（避免删除后出现幽灵任务）
     if not _task_path(task_id).exists():
-        return
+        return None
 
     try:
         with open(logp, 'a', encoding='utf-8') as f:
@@ -264,6 +537,7 @@ def add_log(task_id, message):
         update_task(task_id, updated_at=ts)
     except Exception:
         pass
+    return {'timestamp': ts, 'message': message}
 
 
 def get_task_logs(task_id):
@@ -295,3 +569,58 @@ def get_task_logs(task_id):
         pass
     return out
 
+
+# 提供一个兼容原先 Database 接口的轻量包装器给其他模块使用
+class StorageDB:
+    def get_setting(self, key, default=None):
+        return get_setting(key, default)
+
+    def set_setting(self, key, value):
+        return set_setting(key, value)
+
+    def get_all_settings(self):
+        return get_all_settings()
+
+    def create_task(self, url, custom_name=None, selection_policy=None):
+        task_id = create_task(url, custom_name, selection_policy)
+        event_bus.publish('task', 'task_created', {'id': task_id})
+        return task_id
+
+    def get_task(self, task_id):
+        return get_task(task_id)
+
+    def get_all_tasks(self):
+        return get_all_tasks()
+
+    def get_tasks_by_status(self, status):
+        return get_tasks_by_status(status)
+
+    def update_task(self, task_id, **kwargs):
+        ok = update_task(task_id, **kwargs)
+        if ok:
+            # 只推送变化的字段，前端按增量合并
+            event_bus.publish('task', 'task_updated', {'id': task_id, 'fields': kwargs})
+        return ok
+
+    def add_log(self, task_id, message):
+        entry = add_log(task_id, message)
+        if entry:
+            event_bus.publish(f'log:{task_id}', 'log', dict(entry, task_id=task_id))
+        return entry
+
+    def get_task_logs(self, task_id):
+        return get_task_logs(task_id)
+
+    def get_change_seq(self):
+        return get_change_seq()
+
+    def get_task_changes(self, since):
+        return get_task_changes(since)
+
+    def get_task_stats(self):
+        return get_task_stats()
+
+    def delete_task(self, task_id):
+        ok = delete_task(task_id)
+        event_bus.publish('task', 'task_deleted', {'id': task_id})
+        return ok
@@ -0,0 +1,128 @@
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from pathlib import Path
+from queue import Queue
+
+# 模块都在仓库根目录，测试直接按模块名导入
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+
+class FakeDB:
+    """内存版的 StorageDB：设置、任务与日志都放在字典/列表里，供不需要真实存储的测试使用"""
+
+    def __init__(self, settings=None, tasks=None):
+        self.settings = dict(settings or {})
+        self.tasks = tasks if tasks is not None else {}
+        self.logs = []      # [(task_id, message)]
+        self.deleted = []   # 被删除的任务 id，按删除顺序
+        self.seq = 0
+        self.changed = {}   # task_id -> 最后一次变化的序号
+
+    def _touch(self, task_id):
+        self.seq += 1
+        self.changed[task_id] = self.seq
+
+    def get_setting(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def set_setting(self, key, value):
+        self.settings[key] = value
+
+    def create_task(self, url, custom_name=None, selection_policy=None):
+        task_id = max(self.tasks, default=0) + 1
+        self.tasks[task_id] = {'id': task_id, 'url': url, 'status': 'pending', 'custom_name': custom_name,
+                               'file_path': '', 'selection_policy': selection_policy or {}}
+        self._touch(task_id)
+        return task_id
+
+    def get_task(self, task_id):
+        return self.tasks.get(task_id)
+
+    def get_all_tasks(self):
+        return list(self.tasks.values())
+
+    def update_task(self, task_id, **fields):
+        # 与真实存储一致：任务不存在（已删除）时不写入
+        task = self.tasks.get(task_id)
+        if task is None:
+            return False
+        task.update(fields)
+        self._touch(task_id)
+        return True
+
+    def delete_task(self, task_id):
+        self.deleted.append(task_id)
+        self.tasks.pop(task_id, None)
+        self._touch(task_id)
+        return True
+
+    def add_log(self, task_id, message):
+        # 真实存储不为不存在的任务写日志；这里照样记录，方便断言删除之后是否还有写入
+        self.logs.append((task_id, message))
+        return {'timestamp': '', 'message': message} if task_id in self.tasks else None
+
+    def get_change_seq(self):
+        return self.seq
+
+    def get_task_changes(self, since):
+        ids = [tid for tid, seq in self.changed.items() if seq > since]
+        return {'seq': self.seq, 'tasks': [self.tasks[t] for t in ids if t in self.tasks],
+                'deleted': sorted(t for t in ids if t not in self.tasks), 'full': False}
+
+    def get_task_stats(self):
+        counts = Counter(t.get('status') for t in self.tasks.values())
+        stats = {'total': len(self.tasks), 'total_bytes': sum(t.get('file_size') or 0 for t in self.tasks.values())}
+        for status in ('pending', 'downloading', 'completed', 'failed', 'cancelled'):
+            stats[status] = counts.get(status, 0)
+        return stats
+
+
+@pytest.fixture
+def db():
+    """空的 FakeDB，测试按需写入 db.settings / db.tasks"""
+    return FakeDB()
+
+
+@pytest.fixture
+def manager(db):
+    """
+    不调用 __init__ 的 DownloadManager：不恢复任务、不启动队列与删除线程，也不创建上传后端。
+    deletion_queue 中的内容即 remove_path_async 收到的路径。
+    """
+    from downloader import DownloadManager
+
+    m = DownloadManager.__new__(DownloadManager)
+    m.db = db
+    m.active_tasks = {}
+    m.waiting_queue = Queue()
+    m.queue_lock = threading.Lock()
+    m.cancel_flags = {}
+    m.retry_schedule = []
+    m.failure_counters = Counter()
+    m.retry_counters = Counter()
+    m.task_speeds = {}
+    m.draining = False
+    m.interrupted_tasks = set()
+    m.upload_backends = []
+    m.deletion_queue = Queue()
+    m.last_temp_sweep = time.time()
+    m.batch_jobs = OrderedDict()
+    m.batch_jobs_lock = threading.Lock()
+    return m
+
+
+@pytest.fixture
+def storage_dir(tmp_path, monkeypatch):
+    """在临时目录中使用 ./storage，并清空进程内的设置缓存与任务索引"""
+    import storage
+    monkeypatch.chdir(tmp_path)
+    with storage._settings_lock:
+        storage._settings_cache.update({'key': None, 'values': None})
+    monkeypatch.setattr(storage, '_changes', None)
+    yield tmp_path / 'storage'
+    with storage._settings_lock:
+        storage._settings_cache.update({'key': None, 'values': None})
@@ -0,0 +1,104 @@
+"""Aria2Monitor：用本地的假 JSON-RPC 服务验证 system.multicall 批量轮询"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from aria2_monitor import Aria2Monitor
+
+
+class FakeAria2(BaseHTTPRequestHandler):
+    """只实现 system.multicall + aria2.tellStatus，状态取自 server.statuses"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(payload)
+        results = []
+        for call in payload['params'][0]:
+            params = call['params']
+            if params and str(params[0]).startswith('token:'):
+                if params[0] != 'token:secret':
+                    results.append({'code': 1, 'message': 'Unauthorized'})
+                    continue
+                params = params[1:]
+            status = self.server.statuses.get(params[0])
+            if status is None:
+                results.append({'code': 1, 'message': f'GID {params[0]} is not found'})
+            else:
+                results.append([dict(status, gid=params[0])])
+        body = json.dumps({'jsonrpc': '2.0', 'id': payload['id'], 'result': results}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def configure(db, rpc_url):
+    db.settings.update({'aria2_rpc_url': rpc_url, 'aria2_rpc_secret': 'secret', 'aria2_progress_interval': '0'})
+    for task_id in range(1, 5):
+        db.tasks[task_id] = {'id': task_id}
+    return db
+
+
+@pytest.fixture
+def aria2():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAria2)
+    server.requests = []
+    server.statuses = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_poll_once_batches_all_gids(aria2, db, tmp_path):
+    configure(db, f'http://127.0.0.1:{aria2.server_address[1]}/jsonrpc')
+    done_file = tmp_path / 'done.mp4'
+    done_file.write_bytes(b'x')
+    aria2.statuses = {
+        'g1': {'status': 'complete', 'totalLength': '100', 'completedLength': '100', 'downloadSpeed': '0'},
+        'g2': {'status': 'active', 'totalLength': '100', 'completedLength': '40', 'downloadSpeed': '10'},
+        'g3': {'status': 'error', 'errorMessage': 'boom'},
+    }
+    monitor = Aria2Monitor(db)
+    # 直接写入跟踪表，不启动后台线程
+    for task_id, gid in enumerate(['g1', 'g2', 'g3', 'g4'], 1):
+        monitor.tracked[gid] = {'task_id': task_id, 'file_path': str(done_file), 'delete_file': gid == 'g1',
+                                'started': time.time(), 'last_write': 0, 'last_status': ''}
+    monitor.poll_once()
+
+    # 一轮只发一个 multicall 请求，每个调用都带 token
+    assert len(aria2.requests) == 1
+    calls = aria2.requests[0]['params'][0]
+    assert [c['params'][1] for c in calls] == ['g1', 'g2', 'g3', 'g4']
+    assert all(c['params'][0] == 'token:secret' for c in calls)
+
+    assert set(monitor.tracked) == {'g2'}
+    assert not done_file.exists()
+    assert db.tasks[1]['file_path'] == ''
+    assert db.tasks[2]['aria2_downloaded'] == 40
+    assert monitor.get_stats()['speed'] == 10
+    assert any('boom' in m for t, m in db.logs if t == 3)
+    assert any('查询失败' in m for t, m in db.logs if t == 4)
+
+
+def test_timeout_applies_when_aria2_unreachable(db):
+    # 申请一个端口后立即关闭，连接会被拒绝
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    configure(db, f'http://127.0.0.1:{port}/jsonrpc')
+    monitor = Aria2Monitor(db, poll_interval=0.1, track_timeout=0)
+    monitor.track(1, 'g1', '/nonexistent', delete_file=True)
+
+    deadline = time.time() + 5
+    while monitor.get_tracked_count() and time.time() < deadline:
+        time.sleep(0.05)
+    assert monitor.get_tracked_count() == 0
+    assert any('超时' in m for _, m in db.logs)
@@ -0,0 +1,119 @@
+"""删除任务：单个删除不等待进程退出；批量删除停止运行中的任务并删除记录"""
+import subprocess
+import sys
+import threading
+import time
+
+
+def make_job(manager, ids, job_id='j'):
+    job = {'job_id': job_id, 'status': 'running', 'delete_file': True, 'total': len(ids), 'done': 0,
+           'finished_at': None, 'results': [{'id': tid, 'status': 'queued'} for tid in ids]}
+    manager.batch_jobs[job_id] = job
+    return job
+
+
+def queued_paths(manager):
+    paths = []
+    while not manager.deletion_queue.empty():
+        paths.append(manager.deletion_queue.get())
+    return paths
+
+
+def sleeper():
+    # 与下载进程一样以新会话启动，stop_download 按进程组结束它
+    return subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'], start_new_session=True)
+
+
+def test_batch_delete_results(manager, db):
+    db.tasks.update({
+        1: {'id': 1, 'status': 'downloading', 'file_path': ''},
+        2: {'id': 2, 'status': 'completed', 'file_path': 'downloads/b.mp4'},
+        3: {'id': 3, 'status': 'pending', 'file_path': ''},
+    })
+    manager.active_tasks[1] = None
+    stopped = []
+    manager.stop_download = lambda tid: stopped.append(tid) or (True, '')
+    job = make_job(manager, [1, '2', 'abc', 99, 3])
+    manager._run_batch_delete(job)
+
+    snapshot = manager.get_batch_job('j')
+    assert [(r['id'], r['status']) for r in snapshot['results']] == [
+        (1, 'deleted'), (2, 'deleted'), ('abc', 'invalid_id'), (99, 'not_found'), (3, 'deleted')]
+    assert snapshot['status'] == 'completed'
+    assert snapshot['done'] == 5
+    assert sorted(stopped) == [1, 3]
+    assert db.deleted == [1, 2, 3]
+    assert 'downloads/b.mp4' in queued_paths(manager)
+
+
+def test_concurrent_batch_deletes_leave_no_orphaned_running_task(manager, db, tmp_path):
+    # 1、2 有运行中的进程；3 的工作线程已占位但进程尚未启动；4 在等待队列中；5 已完成
+    db.settings['temp_dir'] = str(tmp_path / 'temp')
+    processes = {1: sleeper(), 2: sleeper()}
+    for tid, status in ((1, 'downloading'), (2, 'downloading'), (3, 'downloading'), (4, 'pending'), (5, 'completed')):
+        db.tasks[tid] = {'id': tid, 'status': status, 'file_path': ''}
+        manager.cancel_flags[tid] = threading.Event()
+    manager.active_tasks.update({1: processes[1], 2: processes[2], 3: None})
+
+    # 两个覆盖相同 id 的批量删除同时运行，无论怎样交错，结果都应一致
+    jobs = [make_job(manager, [1, 2, 3, 4, 5], 'a'), make_job(manager, [5, 4, 3, 2, 1], 'b')]
+    workers = [threading.Thread(target=manager._run_batch_delete, args=(job,)) for job in jobs]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(30)
+
+    assert db.tasks == {}
+    assert manager.active_tasks == {}
+    # 运行中与等待中的任务都带着取消标志，工作线程启动进程后会自行结束，队列处理线程会跳过
+    assert all(manager.cancel_flags[tid].is_set() for tid in (1, 2, 3, 4))
+    assert all(p.poll() is not None for p in processes.values())
+    for job_id in ('a', 'b'):
+        assert manager.get_batch_job(job_id)['status'] == 'completed'
+
+
+def test_delete_task_returns_before_stop_finishes(manager, db, tmp_path):
+    db.settings['temp_dir'] = str(tmp_path / 'temp')
+    db.tasks[1] = {'id': 1, 'status': 'downloading', 'file_path': 'downloads/a.mp4'}
+    manager.active_tasks[1] = None
+    release = threading.Event()
+    stopped = threading.Event()
+
+    def slow_stop(tid):
+        release.wait(5)
+        stopped.set()
+
+    manager.stop_download = slow_stop
+    manager.delete_task(db.tasks[1], delete_file=True)
+
+    # 进程尚未退出，记录已删除、取消标志已设置，文件还没有加入删除队列
+    assert db.deleted == [1]
+    assert manager.cancel_flags[1].is_set()
+    assert manager.deletion_queue.empty()
+    release.set()
+    assert stopped.wait(5)
+    assert manager.deletion_queue.get(timeout=5) == 'downloads/a.mp4'
+    assert manager.deletion_queue.get(timeout=5) == str(tmp_path / 'temp' / '1')
+
+
+def test_sweep_runs_while_deletion_queue_busy(manager, db):
+    for i in range(1000):
+        manager.deletion_queue.put(f'temp/{i}')
+    manager.last_temp_sweep = 0
+    db.settings['temp_sweep_interval'] = '60'
+    manager._remove_path = lambda path: time.sleep(0.001)
+    swept = threading.Event()
+    remaining = []
+
+    def sweep():
+        remaining.append(manager.deletion_queue.qsize())
+        swept.set()
+
+    manager.sweep_orphaned_temp_dirs = sweep
+    threading.Thread(target=manager._deletion_worker, daemon=True).start()
+
+    # 删除队列还没处理完就已经执行过清理，且间隔内只清理一次
+    assert swept.wait(5)
+    assert remaining[0] > 0
+    time.sleep(0.05)
+    assert len(remaining) == 1
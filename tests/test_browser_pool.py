@@ -0,0 +1,111 @@
+"""浏览器池：页面结束后的会话清理与空闲浏览器的关闭"""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('selenium')
+
+from browser_pool import BrowserPool, _PooledDriver  # noqa: E402
+
+
+class FakeDriver:
+    def __init__(self, pool):
+        self.pool = pool
+        self.calls = []
+        self.quit_saw_lock_free = None
+        self.current_url = ''
+
+    def get_log(self, kind):
+        return []
+
+    def get(self, url):
+        self.calls.append(('get', url))
+        self.current_url = url.replace('/redirect', '/final')
+
+    @property
+    def page_source(self):
+        return '<html></html>'
+
+    def execute_script(self, script):
+        pass
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.calls.append((cmd, params))
+
+    def delete_all_cookies(self):
+        self.calls.append(('delete_all_cookies',))
+
+    def quit(self):
+        # 在另一个线程里尝试拿锁：quit 期间锁必须是空闲的
+        result = {}
+
+        def probe():
+            result['ok'] = self.pool.cond.acquire(timeout=1)
+            if result['ok']:
+                self.pool.cond.release()
+
+        t = threading.Thread(target=probe)
+        t.start()
+        t.join()
+        self.quit_saw_lock_free = result['ok']
+
+
+@pytest.fixture
+def pool(monkeypatch, db):
+    monkeypatch.setattr(BrowserPool, '_create_driver', lambda self: _PooledDriver(FakeDriver(self), 0))
+    db.settings.update({'selenium_wait_timeout': '0.2', 'selenium_idle_timeout': '60'})
+    p = BrowserPool(db)
+    yield p
+    p.close()
+
+
+def test_fetch_clears_cookies_and_storage(pool):
+    html, urls, reason, final_url = pool.fetch('https://a.example.com/redirect')
+    driver = pool.idle[0].driver
+    cleanup = driver.calls[1:]
+    assert cleanup[-1] == ('get', 'about:blank')
+    assert ('Network.clearBrowserCookies', {}) in cleanup
+    cleared = [params['origin'] for cmd, params in cleanup[:-1] if cmd == 'Storage.clearDataForOrigin']
+    assert cleared == ['https://a.example.com']
+    # Cookie 必须在离开页面之前通过 CDP 清除，而不是停在 about:blank 后调用 delete_all_cookies
+    assert ('delete_all_cookies',) not in cleanup
+
+
+def test_cleanup_failure_discards_browser(pool):
+    def fail(cmd, params):
+        raise RuntimeError('devtools gone')
+    item = pool._acquire(1)
+    item.driver.execute_cdp_cmd = fail
+    pool._release(item)
+    pool.fetch('https://a.example.com/')
+    assert pool.stats['crashed'] == 1
+    assert pool.total == 0
+
+
+def test_release_sweeps_idle_outside_lock(pool):
+    old = pool._acquire(1)
+    fresh = pool._acquire(1)
+    pool._release(old)
+    old.last_used = time.time() - 120
+    pool._release(fresh)
+    assert pool.idle == [fresh]
+    assert pool.total == 1
+    assert old.driver.quit_saw_lock_free is True
+
+
+def test_background_sweep(monkeypatch, db):
+    monkeypatch.setattr(BrowserPool, '_create_driver', lambda self: _PooledDriver(FakeDriver(self), 0))
+    monkeypatch.setattr(BrowserPool, '_sweep_interval', lambda self: 0.05)
+    db.settings['selenium_idle_timeout'] = '60'
+    pool = BrowserPool(db)
+    item = pool._acquire(1)
+    pool._release(item)
+    item.last_used = time.time() - 120
+    # 之后没有任何借用或归还，只能由后台线程关闭
+    deadline = time.time() + 5
+    while item.driver.quit_saw_lock_free is None and time.time() < deadline:
+        time.sleep(0.05)
+    pool.close()
+    assert pool.total == 0
+    assert item.driver.quit_saw_lock_free is True
@@ -0,0 +1,41 @@
+"""失败分类：进度行中的大小数字不能被当成 HTTP 状态码"""
+import pytest
+
+from downloader import DownloadManager
+
+PROGRESS_403 = 'Vid 1280x720 | 2500 Kbps ━━━━━━ 120/300 40.00% 403.25MB/1.07GB 5.20MBps 00:02:10'
+PROGRESS_500 = 'Vid 1280x720 | 2500 Kbps ━━━━━━ 12/300 4.00% 500.00KB/1.07GB 1.02MBps 00:10:00'
+
+
+def classify(lines, return_code=1):
+    return DownloadManager._classify_failure(None, return_code, lines)
+
+
+@pytest.mark.parametrize('lines, expected', [
+    ([PROGRESS_403, 'ERROR: The operation has timed out.'], 'timeout'),
+    (['ERROR: The operation has timed out.', PROGRESS_403], 'timeout'),
+    ([PROGRESS_500, 'ERROR: Connection reset by peer'], 'network'),
+    (['ERROR: Response status code does not indicate success: 403 (Forbidden).'], 'http_403'),
+    (['ERROR: Response status code does not indicate success: 404 (Not Found).'], 'http_404'),
+    (['ERROR: Response status code does not indicate success: 502 (Bad Gateway).'], 'http_5xx'),
+    (['ERROR: HTTP 503'], 'http_5xx'),
+    (['ERROR: The SSL connection could not be established'], 'network'),
+    (['ERROR: ffmpeg merge failed'], 'merge_error'),
+    (['WARN : No space left on device'], 'disk_full'),
+])
+def test_classify(lines, expected):
+    assert classify(lines) == expected
+
+
+def test_progress_and_info_lines_are_not_errors():
+    lines = [PROGRESS_403, PROGRESS_500, 'INFO : Using ffmpeg to merge segments',
+             'INFO : Loading SSL config', 'INFO : Downloading 403 segments']
+    assert classify(lines) == 'unknown'
+    assert classify(lines, return_code=-9) == 'killed'
+
+
+def test_error_lines_take_priority():
+    # 最后一行是普通信息行时，仍以较早的 ERROR 行为准
+    lines = ['ERROR: Response status code does not indicate success: 500 (Internal Server Error).',
+             'INFO : request timeout set to 100s']
+    assert classify(lines) == 'http_5xx'
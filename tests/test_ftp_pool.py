@@ -0,0 +1,92 @@
+"""FTPConnectionPool：分组上限、运行时调整上限、凭据变化后不复用旧连接"""
+import threading
+import time
+
+import pytest
+
+import ftp_uploader
+from ftp_uploader import FTPConnectionPool
+
+
+class FakeUploader:
+    created = []
+
+    def __init__(self, host, port, username, password, remote_dir='', use_passive=True, dir_cache=None):
+        self.host, self.port, self.username, self.password = host, port, username, password
+        self.remote_dir, self.use_passive = remote_dir, use_passive
+        self.ftp = None
+        self.last_used = 0
+        self.closed = False
+        FakeUploader.created.append(self)
+
+    def connect(self):
+        self.ftp = object()
+        self.last_used = time.time()
+        return True, "已连接"
+
+    def is_alive(self):
+        return not self.closed
+
+    def disconnect(self):
+        self.closed = True
+        self.ftp = None
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeUploader.created = []
+    monkeypatch.setattr(ftp_uploader, 'FTPUploader', FakeUploader)
+    return FTPConnectionPool(max_size=2)
+
+
+def acquire(pool, password='pw', timeout=None):
+    return pool.acquire('ftp.example.com', 21, 'user', password, '/videos', True, timeout=timeout)[0]
+
+
+def test_limit_and_reuse(pool):
+    a, b = acquire(pool), acquire(pool)
+    assert a is not None and b is not None
+    assert acquire(pool, timeout=0.1) is None
+    pool.release(a)
+    assert acquire(pool, timeout=0.1) is a
+    assert len(FakeUploader.created) == 2
+
+
+def test_growing_limit_applies_to_existing_group(pool):
+    held = [acquire(pool), acquire(pool)]
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(acquire(pool, timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    assert not result
+    pool.set_max_size(3)
+    waiter.join(2)
+    assert result and result[0] is not None
+    for uploader in held + result:
+        pool.release(uploader)
+
+
+def test_shrinking_limit_applies_to_existing_group(pool):
+    a, b = acquire(pool), acquire(pool)
+    pool.set_max_size(1)
+    pool.release(a)
+    # 仍有 1 个借出，新上限为 1，必须等待
+    assert acquire(pool, timeout=0.1) is None
+    pool.release(b)
+    assert acquire(pool, timeout=0.1) is not None
+    # 多出的空闲连接不会保留
+    assert sum(len(bucket) for bucket in pool.idle.values()) <= 1
+
+
+def test_credential_change_does_not_reuse_sessions(pool):
+    old = acquire(pool, password='old')
+    pool.release(old)
+    new = acquire(pool, password='new')
+    assert new is not old
+    assert new.password == 'new'
+    # 旧凭据的空闲连接被关闭
+    assert old.closed
+    assert all(u.password == 'new' for bucket in pool.idle.values() for u in bucket)
+    # 密码不以明文出现在分组键里
+    pool.release(new)
+    assert all('new' not in key for key in pool.idle)
@@ -0,0 +1,139 @@
+"""页面中 m3u8 链接的提取：转义还原、相对地址补全、噪声过滤与扫描上限"""
+import json
+from pathlib import Path
+
+import pytest
+
+import page_parser
+from page_parser import extract_m3u8_urls
+
+PAGE = 'https://site.com/watch/1'
+CORPUS_DIR = Path(__file__).resolve().parent.parent / 'benchmarks' / 'corpus'
+
+
+def test_json_escaped_slashes():
+    html = r'<script>var s = {"url":"https:\/\/cdn.site.com\/a\/index.m3u8"};</script>'
+    assert extract_m3u8_urls(html, PAGE) == ['https://cdn.site.com/a/index.m3u8']
+
+
+def test_double_escaped_slashes():
+    html = r'<script>var s = "{\"url\":\"https:\\\/\\\/cdn.site.com\\\/b.m3u8\"}";</script>'
+    assert extract_m3u8_urls(html, PAGE) == ['https://cdn.site.com/b.m3u8']
+
+
+@pytest.mark.parametrize('escaped', [r'\u002F', r'\u002f'])
+def test_unicode_escaped_slashes(escaped):
+    html = '<script>{"src":"https:' + escaped * 2 + 'cdn.site.com' + escaped + 'c.m3u8"}</script>'
+    assert extract_m3u8_urls(html, PAGE) == ['https://cdn.site.com/c.m3u8']
+
+
+def test_html_entity_ampersand():
+    html = '<video src="https://cdn.site.com/d.m3u8?token=1&amp;expires=2"></video>'
+    assert extract_m3u8_urls(html, PAGE) == ['https://cdn.site.com/d.m3u8?token=1&expires=2']
+
+
+def test_relative_urls_use_page_url():
+    html = '<video src="/live/main.m3u8"></video><source src="sub/720p.m3u8">'
+    assert extract_m3u8_urls(html, PAGE) == [
+        'https://site.com/live/main.m3u8',
+        'https://site.com/watch/sub/720p.m3u8',
+    ]
+
+
+def test_base_href_wins_over_page_url():
+    html = '<head><base href="https://static.site.com/media/"></head><video src="hls/e.m3u8"></video>'
+    assert extract_m3u8_urls(html, PAGE) == ['https://static.site.com/media/hls/e.m3u8']
+    # 相对的 base href 按页面地址解析
+    html = '<base href="/cdn/"><video src="f.m3u8"></video>'
+    assert extract_m3u8_urls(html, PAGE) == ['https://site.com/cdn/f.m3u8']
+
+
+def test_unquoted_attributes():
+    html = '<video src=/hls/index.m3u8 autoplay></video><source data-src=https://cdn.site.com/g.m3u8>'
+    assert extract_m3u8_urls(html, PAGE) == [
+        'https://site.com/hls/index.m3u8',
+        'https://cdn.site.com/g.m3u8',
+    ]
+
+
+def test_relative_noise_rejected():
+    html = ('<p>支持 .m3u8 格式，例如 playlist.m3u8 或 foo/bar.m3u8 都可以</p>'
+            '<script>if (name.endsWith(".m3u8")) {}</script>'
+            '<script>var re = /\\.m3u8$/; var ext = \'.m3u8\';</script>'
+            '<a href="data:application/x-mpegurl,x.m3u8">x</a>')
+    assert extract_m3u8_urls(html, PAGE) == []
+
+
+def test_relative_without_base_is_dropped():
+    assert extract_m3u8_urls('<video src="/live/main.m3u8"></video>') == []
+    assert extract_m3u8_urls('<video src="https://cdn.site.com/h.m3u8"></video>') == ['https://cdn.site.com/h.m3u8']
+
+
+def test_order_and_dedup():
+    html = ('"https://cdn.site.com/2.m3u8" "https://cdn.site.com/1.m3u8" '
+            "'https://cdn.site.com/2.m3u8' https://cdn.site.com/3.m3u8")
+    assert extract_m3u8_urls(html, PAGE) == [
+        'https://cdn.site.com/2.m3u8', 'https://cdn.site.com/1.m3u8', 'https://cdn.site.com/3.m3u8']
+
+
+def test_max_chars_cap():
+    html = '<video src="https://cdn.site.com/i.m3u8"></video>'
+    padding = 'x' * 1000
+    assert extract_m3u8_urls(padding + html, PAGE, max_chars=500) == []
+    assert extract_m3u8_urls(padding + html, PAGE, max_chars=2000) == ['https://cdn.site.com/i.m3u8']
+
+
+def test_adversarial_input_is_linear():
+    html = 'http://a.b/' * 200000 + '"https://cdn.site.com/j.m3u8"'
+    assert extract_m3u8_urls(html, PAGE) == ['https://cdn.site.com/j.m3u8']
+
+
+class FakeResponse:
+    def __init__(self, body, content_type='text/html'):
+        self.body = body
+        self.headers = {'Content-Type': content_type}
+        self.encoding = 'utf-8' if 'charset' in content_type else None
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            self.read += min(chunk_size, len(self.body) - i)
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+def test_read_limited_stops_downloading_at_cap():
+    response = FakeResponse(b'a' * (10 * 1024 * 1024))
+    text = page_parser._read_limited(response, 256 * 1024)
+    assert len(text) == 256 * 1024
+    # 达到上限后不再继续读取响应体
+    assert response.read < 512 * 1024
+    assert response.closed
+
+
+def test_read_limited_uses_meta_charset():
+    body = '<meta charset="gbk"><title>中文</title>'.encode('gbk')
+    assert '中文' in page_parser._read_limited(FakeResponse(body), 1024)
+
+
+def test_max_scan_bytes_setting():
+    class DB:
+        def __init__(self, value):
+            self.value = value
+
+        def get_setting(self, key, default=None):
+            return self.value
+
+    assert page_parser._max_scan_bytes(DB('1048576')) == 1048576
+    assert page_parser._max_scan_bytes(DB('10')) == 64 * 1024
+    assert page_parser._max_scan_bytes(DB('bad')) == page_parser.DEFAULT_MAX_SCAN_BYTES
+
+
+@pytest.mark.parametrize('name', sorted(json.loads((CORPUS_DIR / 'expected.json').read_text())))
+def test_benchmark_corpus(name):
+    expected = json.loads((CORPUS_DIR / 'expected.json').read_text())[name]
+    html = (CORPUS_DIR / name).read_text(encoding='utf-8')
+    assert extract_m3u8_urls(html, 'https://site.com/watch') == expected
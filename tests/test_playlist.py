@@ -0,0 +1,114 @@
+"""清晰度选择：select_variant 的策略与 build_select_args 生成的 N_m3u8DL-RE 参数"""
+import pytest
+
+import playlist
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2"
+360p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,AVERAGE-BANDWIDTH=2000000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2"
+720p/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2000000,RESOLUTION=1280x720,CODECS="hvc1.1.6.L93.B0,mp4a.40.2"
+720p-hevc/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=5000000,RESOLUTION=1920x1080,CODECS="avc1.640028,mp4a.40.2"
+https://other.example.com/1080p/index.m3u8
+"""
+
+
+def policy(**values):
+    return playlist.build_policy(lambda key, default='': '', overrides=values)
+
+
+@pytest.fixture
+def variants():
+    return playlist.parse_master_playlist(MASTER, 'https://cdn.example.com/video/master.m3u8')
+
+
+def test_parse_master_playlist(variants):
+    assert [v['height'] for v in variants] == [360, 720, 720, 1080]
+    assert variants[1]['average_bandwidth'] == 2000000
+    assert variants[0]['url'] == 'https://cdn.example.com/video/360p/index.m3u8'
+    assert variants[3]['url'] == 'https://other.example.com/1080p/index.m3u8'
+
+
+def test_no_policy_picks_highest(variants):
+    assert playlist.select_variant(variants, policy())['height'] == 1080
+
+
+def test_max_height(variants):
+    chosen = playlist.select_variant(variants, policy(max_height=720))
+    # 同为 720p 时取码率更高的一个
+    assert chosen['url'].endswith('/720p/index.m3u8')
+    assert playlist.select_variant(variants, policy(max_height=1000))['height'] == 720
+    assert playlist.select_variant(variants, policy(max_height=360))['height'] == 360
+
+
+def test_max_bandwidth(variants):
+    assert playlist.select_variant(variants, policy(max_bandwidth=2200000))['url'].endswith('/720p-hevc/index.m3u8')
+
+
+def test_limits_below_every_variant_pick_smallest(variants):
+    assert playlist.select_variant(variants, policy(max_height=240))['height'] == 360
+    assert playlist.select_variant(variants, policy(max_bandwidth=100000))['height'] == 360
+
+
+def test_preferred_codec(variants):
+    assert playlist.select_variant(variants, policy(video_codec='hvc1'))['url'].endswith('/720p-hevc/index.m3u8')
+    # 没有匹配的编码时忽略偏好
+    assert playlist.select_variant(variants, policy(video_codec='av01'))['height'] == 1080
+
+
+def test_target_height_from_settings(variants):
+    settings = {'select_max_height': '720', 'select_video_codec': 'avc1'}
+    global_policy = playlist.build_policy(lambda key, default='': settings.get(key, default))
+    assert playlist.select_variant(variants, global_policy)['url'].endswith('/720p/index.m3u8')
+    # 任务级策略优先于全局设置，0 表示不限制
+    task_policy = playlist.build_policy(lambda key, default='': settings.get(key, default), {'max_height': '0'})
+    assert playlist.select_variant(variants, task_policy)['height'] == 1080
+
+
+def test_missing_attributes():
+    text = """#EXTM3U
+#EXT-X-STREAM-INF:PROGRAM-ID=1
+a.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=1000000
+b.m3u8
+#EXT-X-STREAM-INF:RESOLUTION=854x480
+c.m3u8
+"""
+    variants = playlist.parse_master_playlist(text, 'https://cdn.example.com/')
+    assert [(v['bandwidth'], v['height'], v['resolution']) for v in variants] == [
+        (None, None, ''), (1000000, None, ''), (None, 480, '854x480')]
+    # 有分辨率的排在前面；高度上限不排除未标注分辨率的变体
+    assert playlist.select_variant(variants, policy())['url'].endswith('/c.m3u8')
+    assert playlist.select_variant(variants, policy(max_height=360))['url'].endswith('/b.m3u8')
+    assert playlist.select_variant(variants, policy(max_bandwidth=500000))['url'].endswith('/c.m3u8')
+    assert playlist.select_variant([], policy()) is None
+
+
+def test_select_args_pin_chosen_variant(variants):
+    chosen = playlist.select_variant(variants, policy(max_height=720))
+    assert playlist.build_select_args(policy(max_height=720), chosen) == [
+        '--select-video', r'bwMin=2500:bwMax=2500:res="1280x720":for=best',
+        '--select-audio', 'best',
+        '--select-subtitle', 'best',
+    ]
+
+
+def test_select_args_round_bandwidth_outward():
+    args = playlist.build_select_args(policy(), {'bandwidth': 2499500, 'resolution': ''})
+    assert args[1] == 'bwMin=2499:bwMax=2500:for=best'
+
+
+def test_select_args_without_variant():
+    assert playlist.build_select_args(policy()) == [
+        '--select-video', 'best', '--select-audio', 'best', '--select-subtitle', 'best']
+    # 没有变体时按码率上限与编码过滤，高度上限无法表达
+    args = playlist.build_select_args(policy(max_height=720, max_bandwidth=3000000, video_codec='hvc1'))
+    assert args[1] == 'bwMax=3000:codecs="hvc1":for=best'
+
+
+def test_select_args_languages():
+    args = playlist.build_select_args(policy(audio_lang='zh, en', subtitle_lang='zh-Hans'))
+    assert args[3] == 'lang="zh|en":for=all'
+    assert args[5] == r'lang="zh\-Hans":for=all'
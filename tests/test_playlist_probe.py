@@ -0,0 +1,207 @@
+"""m3u8 候选探测：用本地 HTTP 服务验证主/媒体列表识别、剔除、排序、大小估算与请求头"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import playlist_probe
+
+
+def media_playlist(durations, endlist=True, byteranges=None):
+    lines = ['#EXTM3U', '#EXT-X-VERSION:4', '#EXT-X-TARGETDURATION:10']
+    for i, duration in enumerate(durations):
+        lines.append(f'#EXTINF:{duration},')
+        if byteranges:
+            lines.append(f'#EXT-X-BYTERANGE:{byteranges[i]}@{sum(byteranges[:i])}')
+            lines.append('all.ts')
+        else:
+            lines.append(f'seg{i}.ts')
+    if endlist:
+        lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def master_playlist(variants):
+    """variants: [(路径, BANDWIDTH, RESOLUTION 或 None, AVERAGE-BANDWIDTH 或 None)]"""
+    lines = ['#EXTM3U']
+    for path, bandwidth, resolution, average in variants:
+        attrs = [f'BANDWIDTH={bandwidth}']
+        if average:
+            attrs.append(f'AVERAGE-BANDWIDTH={average}')
+        if resolution:
+            attrs.append(f'RESOLUTION={resolution}')
+        lines.append('#EXT-X-STREAM-INF:' + ','.join(attrs))
+        lines.append(path)
+    return '\n'.join(lines) + '\n'
+
+
+class FakeCDN(BaseHTTPRequestHandler):
+    """server.routes: 路径 -> (状态码, 内容)；.ts 分片只响应 HEAD，长度取 server.segment_size"""
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, send_body):
+        self.server.requests.append((self.command, self.path, self.headers.get('Referer'),
+                                     self.headers.get('User-Agent')))
+        if self.path.endswith('.ts'):
+            status, body = 200, b''
+            length = self.server.segment_size
+        else:
+            status, text = self.server.routes.get(self.path, (404, 'not found'))
+            body = text.encode('utf-8')
+            length = len(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/vnd.apple.mpegurl')
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+
+@pytest.fixture
+def cdn():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCDN)
+    server.routes = {}
+    server.requests = []
+    server.segment_size = 0
+    server.base = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def probe(db, cdn, *paths, referer=None):
+    return playlist_probe.probe_candidates(db, [cdn.base + p for p in paths], referer=referer)
+
+
+def test_master_playlist_selects_variant_by_policy(db, cdn):
+    db.settings['select_max_height'] = '720'
+    cdn.routes.update({
+        '/master.m3u8': (200, master_playlist([
+            ('v360.m3u8', 800000, '640x360', None),
+            ('v720.m3u8', 3000000, '1280x720', 2400000),
+            ('v1080.m3u8', 6000000, '1920x1080', None),
+        ])),
+        '/v720.m3u8': (200, media_playlist([10] * 60)),
+    })
+    info = probe(db, cdn, '/master.m3u8')['candidates'][0]
+
+    assert info['type'] == 'master'
+    assert info['variants'] == 3
+    assert info['variant_url'] == cdn.base + '/v720.m3u8'
+    assert (info['height'], info['bandwidth']) == (720, 3000000)
+    assert info['duration'] == 600
+    assert info['segments'] == 60
+    assert info['live'] is False
+    # 有平均码率时按平均码率估算：2400000 bps × 600 秒 / 8
+    assert info['estimated_size'] == 2400000 * 600 // 8
+    assert [path for method, path, _, _ in cdn.requests] == ['/master.m3u8', '/v720.m3u8']
+
+
+def test_media_playlist_estimates_size_from_segment_head(db, cdn):
+    cdn.segment_size = 500000
+    cdn.routes['/media.m3u8'] = (200, media_playlist([6] * 20))
+    info = probe(db, cdn, '/media.m3u8')['candidates'][0]
+
+    assert info['type'] == 'media'
+    assert info['duration'] == 120
+    # 没有码率信息：取中间一个分片的 Content-Length × 分片数
+    assert info['estimated_size'] == 500000 * 20
+    assert ('HEAD', '/seg10.ts') in [(method, path) for method, path, _, _ in cdn.requests]
+
+
+def test_byterange_playlist_sums_ranges_without_head(db, cdn):
+    ranges = [1000, 2000, 3000]
+    cdn.routes['/range.m3u8'] = (200, media_playlist([10, 10, 50], byteranges=ranges))
+    info = probe(db, cdn, '/range.m3u8')['candidates'][0]
+
+    assert info['estimated_size'] == sum(ranges)
+    assert [method for method, _, _, _ in cdn.requests] == ['GET']
+
+
+def test_unusable_links_are_dropped(db, cdn):
+    cdn.routes.update({
+        '/page.m3u8': (200, '<!DOCTYPE html><html><body>登录后观看</body></html>'),
+        '/empty.m3u8': (200, '#EXTM3U\n#EXT-X-ENDLIST\n'),
+        '/ok.m3u8': (200, media_playlist([10] * 10)),
+    })
+    result = probe(db, cdn, '/gone.m3u8', '/page.m3u8', '/empty.m3u8', '/ok.m3u8')
+
+    assert [c['url'] for c in result['candidates']] == [cdn.base + '/ok.m3u8']
+    assert result['best'] == cdn.base + '/ok.m3u8'
+    errors = {d['url'][len(cdn.base):]: d['error'] for d in result['dropped']}
+    assert '404' in errors['/gone.m3u8']
+    assert errors['/page.m3u8'] == '不是有效的 M3U8'
+    assert errors['/empty.m3u8'] == '播放列表中没有分片'
+    assert all(d['alive'] is False for d in result['dropped'])
+
+
+def test_short_ad_ranked_last(db, cdn):
+    # 广告是 1080p 的 15 秒短片，正片只有 720p，正片仍然排在前面
+    cdn.routes.update({
+        '/ad.m3u8': (200, master_playlist([('ad1080.m3u8', 6000000, '1920x1080', None)])),
+        '/ad1080.m3u8': (200, media_playlist([5, 5, 5])),
+        '/main.m3u8': (200, master_playlist([('main720.m3u8', 3000000, '1280x720', None)])),
+        '/main720.m3u8': (200, media_playlist([10] * 300)),
+        '/low.m3u8': (200, master_playlist([('low360.m3u8', 800000, '640x360', None)])),
+        '/low360.m3u8': (200, media_playlist([10] * 300)),
+    })
+    result = probe(db, cdn, '/ad.m3u8', '/low.m3u8', '/main.m3u8')
+
+    order = [c['url'][len(cdn.base):] for c in result['candidates']]
+    assert order == ['/main.m3u8', '/low.m3u8', '/ad.m3u8']
+    assert result['candidates'][-1]['short'] is True
+    assert result['candidates'][-1]['duration'] == 15
+
+
+def test_min_duration_setting(db, cdn):
+    db.settings['probe_min_duration'] = '10'
+    cdn.routes['/ad.m3u8'] = (200, media_playlist([5, 5, 5]))
+    assert probe(db, cdn, '/ad.m3u8')['candidates'][0]['short'] is False
+
+
+def test_live_playlist(db, cdn):
+    # 直播列表只有最近几个分片：不算短片，也不估算大小
+    cdn.segment_size = 500000
+    cdn.routes['/live.m3u8'] = (200, media_playlist([6, 6, 6], endlist=False))
+    info = probe(db, cdn, '/live.m3u8')['candidates'][0]
+
+    assert info['live'] is True
+    assert info['short'] is False
+    assert info['estimated_size'] is None
+    assert [method for method, _, _, _ in cdn.requests] == ['GET']
+
+
+def test_referer_and_user_agent_sent_on_every_request(db, cdn):
+    cdn.routes.update({
+        '/master.m3u8': (200, master_playlist([('v.m3u8', 1000000, None, None)])),
+        '/v.m3u8': (200, media_playlist([10] * 4)),
+        '/media.m3u8': (200, media_playlist([10] * 4)),
+    })
+    cdn.segment_size = 1000
+    result = probe(db, cdn, '/master.m3u8', '/media.m3u8', referer='https://site.example.com/watch/1')
+
+    assert len(result['candidates']) == 2
+    # 主列表、变体列表、媒体列表与分片 HEAD 都带上页面地址
+    assert {method for method, _, _, _ in cdn.requests} == {'GET', 'HEAD'}
+    assert all(referer == 'https://site.example.com/watch/1' for _, _, referer, _ in cdn.requests)
+    assert all(agent == playlist_probe.playlist.USER_AGENT for _, _, _, agent in cdn.requests)
+
+
+def test_apply_probe_replaces_results(db, cdn):
+    cdn.routes['/ok.m3u8'] = (200, media_playlist([10] * 10))
+    parsed = {'url': 'https://site.example.com/watch/1', 'results': [cdn.base + '/gone.m3u8', cdn.base + '/ok.m3u8']}
+    applied = playlist_probe.apply_probe(db, parsed)
+    assert applied['results'] == [cdn.base + '/ok.m3u8']
+    assert applied['count'] == 1
+    assert applied['probe']['best'] == cdn.base + '/ok.m3u8'
+
+    with pytest.raises(Exception, match='均不可用'):
+        playlist_probe.apply_probe(db, dict(parsed, results=[cdn.base + '/gone.m3u8']))
@@ -0,0 +1,46 @@
+"""自动重试计划：手动启动/停止后不应再被重试路径重新入队"""
+import heapq
+import threading
+import time
+
+
+def schedule_retry(manager, task_id, due):
+    manager.db.tasks[task_id] = {'id': task_id, 'status': 'pending'}
+    manager.cancel_flags[task_id] = threading.Event()
+    heapq.heappush(manager.retry_schedule, (due, task_id, {'task_id': task_id, 'url': 'u', 'custom_name': None}))
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get())
+    return items
+
+
+def test_manual_start_cancels_scheduled_retry(manager):
+    schedule_retry(manager, 1, time.time() - 1)
+    manager.start_download(1, 'u')
+    manager._requeue_due_retries()
+    assert [it['task_id'] for it in drain(manager.waiting_queue)] == [1]
+    assert manager.retry_schedule == []
+
+
+def test_stop_cancels_scheduled_retry(manager):
+    schedule_retry(manager, 1, time.time() + 60)
+    schedule_retry(manager, 2, time.time() - 1)
+    manager.stop_download(1)
+    assert [item[1] for item in manager.retry_schedule] == [2]
+    assert manager.db.get_task(1)['status'] == 'cancelled'
+
+
+def test_requeue_skips_cancelled_tasks(manager):
+    schedule_retry(manager, 1, time.time() - 1)
+    schedule_retry(manager, 2, time.time() - 1)
+    schedule_retry(manager, 3, time.time() - 1)
+    # 1: 取消标志已设置；2: 状态已被改为 cancelled；3: 正常到期
+    manager.cancel_flags[1].set()
+    manager.db.update_task(2, status='cancelled')
+    manager._requeue_due_retries()
+    assert [it['task_id'] for it in drain(manager.waiting_queue)] == [3]
+    assert manager.db.get_task(2)['status'] == 'cancelled'
+    assert not any(task_id in (1, 2) for task_id, _ in manager.db.logs)
@@ -0,0 +1,111 @@
+"""守护进程 RPC：监听方式、令牌校验与删除路径的限制"""
+import os
+import socket
+import stat
+
+import pytest
+
+from rpc import RPCServer, RPCClient, RPCError, build_methods
+
+
+class FakeRelay:
+    def poll(self, after=0, epoch=None, wait=25):
+        return {}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    download_dir = tmp_path / 'downloads'
+    temp_dir = tmp_path / 'temp'
+    download_dir.mkdir()
+    temp_dir.mkdir()
+    return download_dir, temp_dir
+
+
+def queued_paths(manager):
+    paths = []
+    while not manager.deletion_queue.empty():
+        paths.append(manager.deletion_queue.get())
+    return paths
+
+
+@pytest.fixture
+def rpc(tmp_path, dirs, db, manager):
+    download_dir, temp_dir = dirs
+    db.settings.update({'download_dir': str(download_dir), 'temp_dir': str(temp_dir)})
+    address = f"unix://{tmp_path / 'rpc.sock'}"
+    server = RPCServer(address, build_methods(db, manager, FakeRelay()))
+    server.start()
+    yield RPCClient(address, timeout=5), manager, server
+    server.close()
+
+
+def test_tcp_requires_token():
+    with pytest.raises(ValueError, match='DOWNLOADER_RPC_TOKEN'):
+        RPCServer(f'http://127.0.0.1:{free_port()}', {'ping': lambda: True})
+
+
+def test_tcp_token_checked():
+    address = f'http://127.0.0.1:{free_port()}'
+    server = RPCServer(address, {'ping': lambda: True}, token='s3cret')
+    server.start()
+    try:
+        assert RPCClient(address, token='s3cret').call('ping') is True
+        for token in (None, 'wrong', 's3cret-longer'):
+            with pytest.raises(RPCError, match='token'):
+                RPCClient(address, token=token).call('ping')
+    finally:
+        server.close()
+
+
+def test_unix_socket_mode(rpc):
+    client, manager, server = rpc
+    assert stat.S_IMODE(os.stat(server.unix_path).st_mode) == 0o660
+    assert client.call('ping') is True
+
+
+def test_relative_unix_address(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('storage')
+    server = RPCServer('unix://storage/downloader.sock', {'ping': lambda: True})
+    server.start()
+    try:
+        assert os.path.exists(tmp_path / 'storage' / 'downloader.sock')
+        assert RPCClient('unix://storage/downloader.sock').call('ping') is True
+    finally:
+        server.close()
+
+
+def test_remove_path_limited_to_download_and_temp_dirs(rpc, dirs, tmp_path):
+    client, manager, server = rpc
+    download_dir, temp_dir = dirs
+    inside = [str(download_dir / 'a.mp4'), str(temp_dir / '12')]
+    for path in inside:
+        assert client.call('remove_path_async', path=path) is True
+
+    (download_dir / 'link').symlink_to(tmp_path)
+    outside = [
+        '/etc/passwd',
+        str(download_dir),                        # 目录本身
+        str(download_dir / '..' / 'other.txt'),   # ../ 跳出
+        str(download_dir / 'link' / 'x'),         # 符号链接跳出
+        str(tmp_path / 'downloads-evil' / 'x'),   # 前缀相同的兄弟目录
+        '',
+    ]
+    for path in outside:
+        assert client.call('remove_path_async', path=path) is False
+    assert queued_paths(manager) == inside
+
+
+def test_clean_temp_files_requires_integer_id(rpc, dirs):
+    client, manager, server = rpc
+    client.call('clean_temp_files', task_id=7)
+    with pytest.raises(RPCError):
+        client.call('clean_temp_files', task_id='../../etc')
+    assert queued_paths(manager) == [str(dirs[1] / '7')]
@@ -0,0 +1,18 @@
+"""设置读取：各模块的设置修改后立即生效"""
+import storage
+
+
+def test_module_settings_follow_changes_immediately(storage_dir):
+    """视频与压缩设置直接读 storage 的缓存，修改后下一个请求就生效"""
+    from response_utils import compression_settings
+    from video_server import video_settings
+
+    db = storage.StorageDB()
+    storage.init_storage()
+    assert video_settings(db)['max_age'] == 3600
+    assert compression_settings(db)['enabled'] is True
+
+    db.set_setting('video_cache_max_age', '60')
+    db.set_setting('compression_enabled', 'false')
+    assert video_settings(db)['max_age'] == 60
+    assert compression_settings(db)['enabled'] is False
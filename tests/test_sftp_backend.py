@@ -0,0 +1,127 @@
+"""SFTP 后端：主机密钥校验与私钥类型识别"""
+import socket
+import threading
+
+import pytest
+
+paramiko = pytest.importorskip('paramiko')
+
+from upload_backends import SFTPBackend, _ssh_fingerprint  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def host_key():
+    return paramiko.ECDSAKey.generate()
+
+
+@pytest.fixture
+def backend(db):
+    """按 sftp_ 前缀的设置创建后端"""
+    def make(**settings):
+        db.settings.update({f'sftp_{k}': v for k, v in settings.items()})
+        db.tasks[1] = {'id': 1}
+        return SFTPBackend(db)
+    return make
+
+
+def test_fingerprint_setting(backend, host_key):
+    assert backend(host_key=_ssh_fingerprint(host_key))._verify_host_key(host_key, 'h', 22) is None
+    # 没有 SHA256: 前缀、带 = 补位也接受
+    assert backend(host_key=_ssh_fingerprint(host_key)[7:] + '=')._verify_host_key(host_key, 'h', 22) is None
+    with pytest.raises(Exception, match='中间人'):
+        backend(host_key='SHA256:' + 'A' * 43)._verify_host_key(host_key, 'h', 22)
+
+
+def test_public_key_line_setting(backend, host_key):
+    line = f"{host_key.get_name()} {host_key.get_base64()}"
+    assert backend(host_key=line)._verify_host_key(host_key, 'h', 22) is None
+    other = paramiko.ECDSAKey.generate()
+    with pytest.raises(Exception, match='中间人'):
+        backend(host_key=line)._verify_host_key(other, 'h', 22)
+
+
+def test_known_hosts(backend, host_key, tmp_path):
+    known_hosts = tmp_path / 'known_hosts'
+    known_hosts.write_text(f"[sftp.example.com]:2222 {host_key.get_name()} {host_key.get_base64()}\n")
+    b = backend(known_hosts=str(known_hosts))
+    assert b._verify_host_key(host_key, 'sftp.example.com', 2222) is None
+    with pytest.raises(Exception, match='中间人'):
+        b._verify_host_key(paramiko.ECDSAKey.generate(), 'sftp.example.com', 2222)
+    # 不在 known_hosts 中的主机直接拒绝
+    with pytest.raises(Exception, match='已拒绝连接'):
+        b._verify_host_key(host_key, 'other.example.com', 22)
+
+
+@pytest.mark.parametrize('key_class, kwargs', [
+    ('RSAKey', {'bits': 2048}),
+    ('ECDSAKey', {}),
+])
+def test_private_key_type_detection(backend, tmp_path, key_class, kwargs):
+    key = getattr(paramiko, key_class).generate(**kwargs)
+    path = tmp_path / 'id'
+    key.write_private_key_file(str(path), password='secret')
+    loaded = backend(key_passphrase='secret')._load_private_key(str(path))
+    assert loaded.asbytes() == key.asbytes()
+
+
+class RecordingServer(paramiko.ServerInterface):
+    def __init__(self):
+        self.password_attempts = []
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        self.password_attempts.append((username, password))
+        return paramiko.AUTH_FAILED
+
+
+@pytest.fixture
+def ssh_server(host_key):
+    """只做握手与认证记录的 SSH 服务器，每个连接记录收到的密码"""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(5)
+    servers = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(host_key)
+            server = RecordingServer()
+            servers.append(server)
+            try:
+                transport.start_server(server=server)
+            except Exception:
+                pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield listener.getsockname()[1], servers
+    listener.close()
+
+
+def upload(backend, port, tmp_path, **settings):
+    source = tmp_path / 'a.mp4'
+    source.write_bytes(b'x')
+    b = backend(host='127.0.0.1', port=str(port), username='u', password='p', **settings)
+    return b, b._upload(1, str(source))
+
+
+def test_unknown_host_rejected_before_sending_password(backend, ssh_server, tmp_path):
+    port, servers = ssh_server
+    b, ok = upload(backend, port, tmp_path, known_hosts=str(tmp_path / 'empty_known_hosts'))
+    assert ok is False
+    assert any('已拒绝连接' in m for _, m in b.db.logs)
+    assert all(not s.password_attempts for s in servers)
+
+
+def test_matching_fingerprint_proceeds_to_auth(backend, ssh_server, host_key, tmp_path):
+    port, servers = ssh_server
+    b, ok = upload(backend, port, tmp_path, host_key=_ssh_fingerprint(host_key))
+    # 测试服务器拒绝所有密码，但说明主机密钥校验已通过
+    assert ok is False
+    assert any(s.password_attempts == [('u', 'p')] for s in servers)
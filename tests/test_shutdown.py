@@ -0,0 +1,53 @@
+"""优雅关闭：只中断仍在运行的进程，关闭过程中正常结束的下载不能被改回 pending"""
+import subprocess
+import sys
+
+import pytest
+
+
+def spawn(code):
+    return subprocess.Popen([sys.executable, '-c', code], start_new_session=True)
+
+
+@pytest.fixture
+def tasks(db):
+    for tid in (1, 2, 3, 4):
+        db.tasks[tid] = {'id': tid, 'url': f'https://cdn.example.com/{tid}.m3u8', 'status': 'downloading',
+                         'custom_name': None}
+    return db.tasks
+
+
+def queued_ids(manager):
+    ids = []
+    while not manager.waiting_queue.empty():
+        ids.append(manager.waiting_queue.get()['task_id'])
+    return ids
+
+
+def test_shutdown_requeues_only_interrupted_tasks(manager, db, tasks, monkeypatch):
+    exited = spawn('pass')
+    exited.wait()
+    running = spawn('import time; time.sleep(30)')
+    # 快照时仍在运行，结束信号送达前自己以退出码 0 结束
+    finishing = spawn('import time; time.sleep(0.3)')
+    manager.active_tasks.update({1: exited, 2: running, 3: finishing, 4: None})
+
+    terminate = manager._terminate_process
+
+    def terminate_or_wait(process, timeout=5):
+        if process is finishing:
+            process.wait()
+        else:
+            terminate(process, timeout)
+
+    monkeypatch.setattr(manager, '_terminate_process', terminate_or_wait)
+    interrupted = manager.shutdown(timeout=0)
+
+    assert sorted(interrupted) == [2, 4]
+    assert running.poll() is not None
+    assert sorted(queued_ids(manager)) == [2, 4]
+    assert {tid: t['status'] for tid, t in tasks.items()} == {
+        1: 'downloading', 2: 'pending', 3: 'downloading', 4: 'pending'}
+    # 已经退出或正常结束的进程不算中断，工作线程照常按退出码记录结果
+    assert manager.interrupted_tasks == {2, 4}
+    assert manager.draining is True
@@ -0,0 +1,69 @@
+"""get_task_stats 的增量计数必须与全量扫描 TASKS_DIR 的结果一致"""
+import random
+from collections import Counter
+
+import storage
+
+STATUSES = ('pending', 'downloading', 'completed', 'failed', 'cancelled')
+
+
+def scan_stats():
+    """不经过索引，直接读取每个任务文件统计"""
+    counts = Counter()
+    total = total_bytes = 0
+    for p in storage.TASKS_DIR.glob('*.json'):
+        data = storage._read_task_file(p)
+        if not data:
+            continue
+        total += 1
+        counts[data.get('status') or ''] += 1
+        total_bytes += data.get('file_size') or 0
+    stats = {'total': total, 'total_bytes': total_bytes}
+    for status in STATUSES:
+        stats[status] = counts.get(status, 0)
+    return stats
+
+
+def test_stats_track_mutations(storage_dir):
+    assert storage.get_task_stats() == scan_stats()
+
+    rng = random.Random(20261019)
+    ids = []
+    for step in range(300):
+        op = rng.random()
+        if op < 0.3 or not ids:
+            ids.append(storage.create_task(f'https://example.com/{step}.m3u8'))
+        elif op < 0.75:
+            tid = rng.choice(ids)
+            status = rng.choice(STATUSES)
+            fields = {'status': status}
+            if status == 'completed':
+                fields['file_size'] = rng.randint(1, 10 ** 9)
+            elif rng.random() < 0.3:
+                fields['file_size'] = None
+            storage.update_task(tid, **fields)
+        elif op < 0.85:
+            # 只改进度等字段，状态计数不应变化
+            storage.update_task(rng.choice(ids), progress=rng.random() * 100, speed='1MB/s')
+        else:
+            tid = ids.pop(rng.randrange(len(ids)))
+            storage.delete_task(tid)
+            # 重复删除、更新已删除的任务都不能影响计数
+            storage.delete_task(tid)
+            storage.update_task(tid, status='completed', file_size=123)
+        assert storage.get_task_stats() == scan_stats(), f'第 {step} 步后计数不一致'
+
+    # 从磁盘重建的索引与增量维护的结果相同
+    incremental = storage.get_task_stats()
+    storage.rebuild_task_index()
+    assert storage.get_task_stats() == incremental
+
+
+def test_stats_on_existing_tasks(storage_dir):
+    """启动时已有的任务文件在首次统计时计入"""
+    for i in range(5):
+        tid = storage.create_task(f'https://example.com/{i}.m3u8')
+        storage.update_task(tid, status='completed', file_size=1000 * (i + 1))
+    storage._changes = None
+    assert storage.get_task_stats() == scan_stats()
+    assert storage.get_task_stats()['total_bytes'] == 15000
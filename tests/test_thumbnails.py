@@ -0,0 +1,115 @@
+"""缩略图服务：不阻塞请求，生成失败后在 TTL 内直接返回 failed"""
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+from thumbnails import ThumbnailService
+
+# 假的 ffmpeg：-i 探测时输出时长，生成图片时把最后一个参数（输出路径）写成一个小文件
+FAKE_FFMPEG = """#!/bin/sh
+echo "  Duration: 00:01:40.00, start: 0.000000" >&2
+for last; do :; done
+case "$last" in *.jpg) printf 'JPEG' > "$last" ;; esac
+"""
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'movie.mp4'
+    path.write_bytes(b'not really a video')
+    return str(path)
+
+
+@pytest.fixture
+def service(tmp_path, db):
+    """按给定的 ffmpeg 路径与设置创建服务（同一测试中的多个实例共用缩略图目录）"""
+    def make(ffmpeg, **settings):
+        db.settings.update({'thumbnail_dir': str(tmp_path / 'thumbs'), 'ffmpeg_path': ffmpeg}, **settings)
+        return ThumbnailService(db)
+    return make
+
+
+def wait_idle(svc):
+    deadline = time.time() + 10
+    while svc.pending and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_pending_then_ready(service, tmp_path, video):
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+    svc = service(str(ffmpeg))
+
+    state, path = svc.get(video, 'poster')
+    assert (state, path) == ('pending', None)
+    wait_idle(svc)
+    for kind in ('poster', 'sprite'):
+        state, path = svc.get(video, kind)
+        assert state == 'ready'
+        assert open(path, 'rb').read() == b'JPEG'
+
+
+def test_get_does_not_block(service, tmp_path, video, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(ThumbnailService, '_generate', lambda self, file_path, key: release.wait(10))
+    svc = service('ffmpeg')
+    start = time.time()
+    assert svc.get(video, 'poster') == ('pending', None)
+    assert svc.get(video, 'sprite') == ('pending', None)
+    assert time.time() - start < 1
+    assert len(svc.pending) == 1  # 同一文件只提交一次
+    release.set()
+
+
+def test_failure_is_cached(service, tmp_path, video, monkeypatch):
+    svc = service(str(tmp_path / 'missing-ffmpeg'))
+    assert svc.get(video, 'poster')[0] == 'pending'
+    wait_idle(svc)
+
+    calls = []
+    monkeypatch.setattr(ThumbnailService, '_generate', lambda self, file_path, key: calls.append(key))
+    for _ in range(5):
+        assert svc.get(video, 'poster') == ('failed', None)
+        assert svc.get(video, 'sprite') == ('failed', None)
+    assert calls == []
+
+    # 另一个进程（新的服务实例）也能看到失败标记
+    assert service('ffmpeg').get(video, 'poster') == ('failed', None)
+
+
+def test_failure_expires(service, tmp_path, video, monkeypatch):
+    svc = service(str(tmp_path / 'missing-ffmpeg'), thumbnail_failure_ttl='60')
+    svc.get(video, 'poster')
+    wait_idle(svc)
+    assert svc.get(video, 'poster')[0] == 'failed'
+
+    marker = svc._failure_path(svc.cache_key(video), 'poster')
+    old = time.time() - 120
+    os.utime(marker, (old, old))
+    calls = []
+    monkeypatch.setattr(ThumbnailService, '_generate', lambda self, file_path, key: calls.append(key))
+    assert svc.get(video, 'poster')[0] == 'pending'
+    wait_idle(svc)
+    assert len(calls) == 1
+
+
+def test_changed_file_is_retried(service, tmp_path, video):
+    svc = service(str(tmp_path / 'missing-ffmpeg'))
+    svc.get(video, 'poster')
+    wait_idle(svc)
+    assert svc.get(video, 'poster')[0] == 'failed'
+    # 文件内容变化后缓存键不同，不受旧的失败标记影响
+    with open(video, 'ab') as f:
+        f.write(b'more')
+    assert svc.get(video, 'poster')[0] == 'pending'
+    wait_idle(svc)
+
+
+def test_missing_source(service, tmp_path):
+    svc = service('ffmpeg')
+    assert svc.get(str(tmp_path / 'nope.mp4'), 'poster') == ('missing', None)
+    assert svc.get(str(tmp_path / 'nope.mp4'), 'other') == ('missing', None)
@@ -0,0 +1,144 @@
+"""视频输出：Range / 条件请求与截断处理（Flask 测试客户端）"""
+import os
+import re
+
+import pytest
+from flask import Flask
+from werkzeug.wsgi import FileWrapper
+
+import video_server
+from video_server import send_video, _RangeStream
+
+DATA = bytes(range(256)) * 400  # 102400 字节
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'movie.mp4'
+    path.write_bytes(DATA)
+    return str(path)
+
+
+@pytest.fixture
+def client(video):
+    app = Flask(__name__)
+
+    @app.route('/video')
+    def serve():
+        return send_video(video)
+
+    yield app.test_client()
+    video_server.file_cache.invalidate(video)
+
+
+def test_full_response(client):
+    r = client.get('/video')
+    assert r.status_code == 200
+    assert r.data == DATA
+    assert r.headers['Accept-Ranges'] == 'bytes'
+    assert r.headers['Content-Length'] == str(len(DATA))
+
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=0-99', 0, 99),
+    ('bytes=100-', 100, len(DATA) - 1),
+    ('bytes=-500', len(DATA) - 500, len(DATA) - 1),
+    ('bytes=-999999', 0, len(DATA) - 1),          # 后缀超过文件大小时返回整个文件
+    ('bytes=102000-999999', 102000, len(DATA) - 1),  # 结尾超出时截到文件末尾
+])
+def test_single_range(client, header, start, end):
+    r = client.get('/video', headers={'Range': header})
+    assert r.status_code == 206
+    assert r.headers['Content-Range'] == f'bytes {start}-{end}/{len(DATA)}'
+    assert r.headers['Content-Length'] == str(end - start + 1)
+    assert r.data == DATA[start:end + 1]
+
+
+def test_single_range_with_file_wrapper(client):
+    """到文件末尾的区间交给 wsgi.file_wrapper 发送"""
+    r = client.get('/video', headers={'Range': 'bytes=1000-'},
+                   environ_base={'wsgi.file_wrapper': FileWrapper})
+    assert r.status_code == 206
+    assert r.data == DATA[1000:]
+
+
+def test_multiple_ranges(client):
+    r = client.get('/video', headers={'Range': 'bytes=0-9, 200-299, -5'})
+    assert r.status_code == 206
+    boundary = re.search(r'boundary=(\w+)', r.headers['Content-Type']).group(1)
+    assert r.headers['Content-Type'].startswith('multipart/byteranges')
+    assert r.headers['Content-Length'] == str(len(r.data))
+
+    parts = r.data.split(f'--{boundary}'.encode())
+    assert parts[-1] == b'--\r\n'
+    bodies = []
+    for part in parts[1:-1]:
+        head, body = part.split(b'\r\n\r\n', 1)
+        assert body.endswith(b'\r\n')
+        bodies.append((re.search(rb'Content-Range: bytes (\d+)-(\d+)/(\d+)', head).groups(), body[:-2]))
+    size = len(DATA)
+    assert bodies == [
+        ((b'0', b'9', str(size).encode()), DATA[0:10]),
+        ((b'200', b'299', str(size).encode()), DATA[200:300]),
+        ((str(size - 5).encode(), str(size - 1).encode(), str(size).encode()), DATA[-5:]),
+    ]
+
+
+@pytest.mark.parametrize('header', ['bytes=200000-', 'bytes=102400-102500', 'bytes=-0'])
+def test_unsatisfiable_range(client, header):
+    r = client.get('/video', headers={'Range': header})
+    assert r.status_code == 416
+    assert r.headers['Content-Range'] == f'bytes */{len(DATA)}'
+
+
+@pytest.mark.parametrize('header', ['items=0-10', 'bytes=10-5', 'bytes=abc'])
+def test_invalid_range_returns_full_file(client, header):
+    r = client.get('/video', headers={'Range': header})
+    assert r.status_code == 200
+    assert r.data == DATA
+
+
+def test_if_range(client):
+    etag = client.get('/video').headers['ETag']
+    r = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert r.status_code == 206
+    assert r.data == DATA[:10]
+
+    # ETag 不匹配：忽略 Range，返回整个文件
+    r = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+    assert r.status_code == 200
+    assert r.data == DATA
+
+    last_modified = client.get('/video').headers['Last-Modified']
+    r = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': last_modified})
+    assert r.status_code == 206
+    r = client.get('/video', headers={'Range': 'bytes=0-9', 'If-Range': 'Mon, 01 Jan 2001 00:00:00 GMT'})
+    assert r.status_code == 200
+
+
+def test_not_modified(client):
+    first = client.get('/video')
+    r = client.get('/video', headers={'If-None-Match': first.headers['ETag']})
+    assert r.status_code == 304
+    assert r.data == b''
+    assert r.headers['ETag'] == first.headers['ETag']
+
+    r = client.get('/video', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert r.status_code == 304
+    r = client.get('/video', headers={'If-None-Match': '"other"'})
+    assert r.status_code == 200
+
+
+def test_truncated_file_raises(video):
+    entry = video_server.file_cache.acquire(video)
+    stream = _RangeStream(entry, [(b'', 0, len(DATA) - 1)])
+    with open(video, 'r+b') as f:
+        f.truncate(1000)
+    received = b''
+    with pytest.raises(IOError, match='截断'):
+        for chunk in stream:
+            received += chunk
+    stream.close()
+    assert received == DATA[:1000]
+    # 缓存项已失效，下次请求会重新打开文件
+    assert video not in video_server.file_cache.entries
@@ -0,0 +1,55 @@
+"""WebDAV 上传：请求必须带 Content-Length 且不能同时使用 chunked 编码"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from upload_backends import WebDAVBackend
+
+
+class FakeDAV(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_MKCOL(self):
+        self.server.requests.append(('MKCOL', self.path, dict(self.headers), b''))
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_PUT(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        self.server.requests.append(('PUT', self.path, dict(self.headers), body))
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+@pytest.fixture
+def dav():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeDAV)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_put_sends_content_length_without_chunked(dav, db, tmp_path):
+    payload = bytes(range(256)) * 12000  # 约 3 MB
+    source = tmp_path / '视频 1.mp4'
+    source.write_bytes(payload)
+    db.settings.update({'webdav_url': f'http://127.0.0.1:{dav.server_address[1]}/dav', 'webdav_remote_dir': 'a/b',
+                        'upload_progress_interval': '0'})
+    db.tasks[1] = {'id': 1}
+
+    assert WebDAVBackend(db)._upload(1, str(source)) is True
+
+    methods = [(m, p) for m, p, _, _ in dav.requests]
+    assert methods[:2] == [('MKCOL', '/dav/a'), ('MKCOL', '/dav/a/b')]
+    _, path, headers, body = dav.requests[-1]
+    assert path == '/dav/a/b/%E8%A7%86%E9%A2%91%201.mp4'
+    assert headers.get('Content-Length') == str(len(payload))
+    assert 'Transfer-Encoding' not in headers
+    assert body == payload
+    assert db.tasks[1]['upload_progress'] == 100.0
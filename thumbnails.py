@@ -0,0 +1,245 @@
+"""
+视频封面与拖动预览雪碧图
+- 封面：在视频约 10% 处截取一帧（最多 60 秒处），宽 480
+- 雪碧图：只解码关键帧，均匀取 100 帧拼成 10x10 网格，每格 160x90，用于在任务卡片上悬停预览
+- 结果写入 thumbnail_dir，总大小超过 thumbnail_cache_mb 时按最近使用时间淘汰
+- 缓存键由文件路径、大小和修改时间决定，文件变化后自动生成新的图片
+- 下载完成后由后台线程池预先生成；请求时缺失则提交生成并立即返回 pending（同一文件只生成一次）
+- 生成失败时写入 <缓存键>.<类型>.failed 标记，thumbnail_failure_ttl 秒内不再重试，
+  多个 worker 进程共享同一个标记，损坏的文件不会每次请求都重新运行 ffmpeg
+"""
+import os
+import re
+import time
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+SPRITE_TILE_WIDTH = 160
+SPRITE_TILE_HEIGHT = 90
+POSTER_WIDTH = 480
+
+KINDS = ('poster', 'sprite')
+
+# 访问时刷新修改时间的最小间隔，避免每次请求都写元数据
+TOUCH_INTERVAL = 600
+
+
+def probe_duration(ffmpeg_path, file_path):
+    """用 ffmpeg -i 读取时长（秒），失败时返回 None"""
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-i', file_path],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True, timeout=30)
+        match = re.search(r'Duration:\s*(\d+):(\d{2}):(\d{2}(?:\.\d+)?)', result.stderr)
+        if match:
+            hours, minutes, seconds = match.groups()
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except Exception:
+        pass
+    return None
+
+
+class ThumbnailService:
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.pending = {}  # 缓存键: Future，同一文件同时只生成一次
+        try:
+            workers = max(1, int(db.get_setting('thumbnail_workers', 2)))
+        except Exception:
+            workers = 2
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnail')
+
+    def cache_dir(self):
+        path = self.db.get_setting('thumbnail_dir', './storage/thumbnails')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def cache_key(self, file_path):
+        st = os.stat(file_path)
+        raw = f"{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+    def _output_path(self, key, kind):
+        return os.path.join(self.cache_dir(), f"{key}.{kind}.jpg")
+
+    def _failure_path(self, key, kind):
+        return os.path.join(self.cache_dir(), f"{key}.{kind}.failed")
+
+    def _failure_ttl(self):
+        try:
+            return float(self.db.get_setting('thumbnail_failure_ttl', 3600))
+        except Exception:
+            return 3600.0
+
+    def _recently_failed(self, key, kind):
+        """失败标记未过期时返回 True；过期的标记顺便删除"""
+        marker = self._failure_path(key, kind)
+        try:
+            if time.time() - os.path.getmtime(marker) < self._failure_ttl():
+                return True
+            os.remove(marker)
+        except OSError:
+            pass
+        return False
+
+    def get(self, file_path, kind, wait=0):
+        """
+        返回 (状态, 图片路径)：
+        ready 已生成；pending 已提交生成，稍后再取；failed 最近生成失败；missing 源文件不存在。
+        wait > 0 时最多等待生成 wait 秒，默认不等待，请求线程不会被 ffmpeg 占住。
+        """
+        if kind not in KINDS or not file_path or not os.path.isfile(file_path):
+            return 'missing', None
+        key = self.cache_key(file_path)
+        output = self._output_path(key, kind)
+        if os.path.exists(output):
+            self._touch(output)
+            return 'ready', output
+        if self._recently_failed(key, kind):
+            return 'failed', None
+
+        future = self._submit(file_path, key)
+        if wait > 0:
+            try:
+                future.result(timeout=wait)
+            except Exception:
+                pass
+            if os.path.exists(output):
+                return 'ready', output
+            if self._recently_failed(key, kind):
+                return 'failed', None
+        return 'pending', None
+
+    def submit(self, file_path):
+        """下载完成后预先生成（不等待结果）"""
+        try:
+            if os.path.isfile(file_path):
+                self._submit(file_path, self.cache_key(file_path))
+        except Exception:
+            pass
+
+    def _submit(self, file_path, key):
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None:
+                return future
+            future = self.executor.submit(self._generate_and_mark, file_path, key)
+            self.pending[key] = future
+        # 回调在锁外注册：任务已经完成时 add_done_callback 会在当前线程立即调用 _done
+        future.add_done_callback(lambda f: self._done(key))
+        return future
+
+    def _done(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def _generate_and_mark(self, file_path, key):
+        """生成后仍缺失的图片写入失败标记"""
+        try:
+            self._generate(file_path, key)
+        except Exception as e:
+            print(f"生成缩略图异常 {file_path}: {e}")
+        for kind in KINDS:
+            if not os.path.exists(self._output_path(key, kind)) and not self._recently_failed(key, kind):
+                try:
+                    open(self._failure_path(key, kind), 'w').close()
+                except OSError:
+                    pass
+
+    def _generate(self, file_path, key):
+        ffmpeg_path = self.db.get_setting('ffmpeg_path', 'ffmpeg')
+        duration = probe_duration(ffmpeg_path, file_path)
+
+        poster = self._output_path(key, 'poster')
+        if not os.path.exists(poster):
+            offset = min(duration * 0.1, 60) if duration else 0
+            self._run_ffmpeg([ffmpeg_path, '-v', 'error', '-y', '-ss', f'{offset:.2f}', '-i', file_path,
+                              '-frames:v', '1', '-vf', f'scale={POSTER_WIDTH}:-2', '-q:v', '4'], poster)
+
+        sprite = self._output_path(key, 'sprite')
+        if not os.path.exists(sprite) and duration:
+            frames = SPRITE_COLUMNS * SPRITE_ROWS
+            w, h = SPRITE_TILE_WIDTH, SPRITE_TILE_HEIGHT
+            # -skip_frame nokey 只解码关键帧，多 GB 的文件也只需数秒
+            vf = (f'fps={frames}/{duration:.3f},'
+                  f'scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,'
+                  f'tile={SPRITE_COLUMNS}x{SPRITE_ROWS}')
+            self._run_ffmpeg([ffmpeg_path, '-v', 'error', '-y', '-skip_frame', 'nokey', '-i', file_path,
+                              '-vf', vf, '-frames:v', '1', '-an', '-q:v', '5'], sprite)
+
+        self._enforce_limit()
+
+    def _run_ffmpeg(self, cmd, output):
+        """先写临时文件再改名，读者不会看到写了一半的图片"""
+        tmp = output + '.tmp.jpg'
+        try:
+            subprocess.run(cmd + [tmp], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=300, check=True)
+            os.replace(tmp, output)
+        except Exception as e:
+            print(f"生成缩略图失败 {output}: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _touch(self, path):
+        try:
+            if time.time() - os.path.getmtime(path) > TOUCH_INTERVAL:
+                os.utime(path)
+        except OSError:
+            pass
+
+    def _enforce_limit(self):
+        """总大小超过上限时删除最久未使用的图片，直到降到上限的 90%"""
+        try:
+            limit = float(self.db.get_setting('thumbnail_cache_mb', 512)) * 1024 * 1024
+        except Exception:
+            limit = 512 * 1024 * 1024
+        files = []
+        total = 0
+        now = time.time()
+        ttl = self._failure_ttl()
+        with os.scandir(self.cache_dir()) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith('.tmp.jpg'):
+                    continue
+                if entry.name.endswith('.failed'):
+                    # 过期的失败标记（源文件可能早已删除）直接清理，不计入大小
+                    try:
+                        if now - entry.stat().st_mtime >= ttl:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+                    continue
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        if total <= limit:
+            return
+        files.sort()
+        for _, size, path in files:
+            if total <= limit * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_thumbnail_service(db):
+    """进程内共享的缩略图服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ThumbnailService(db)
+        return _service
@@ -0,0 +1,520 @@
+"""
+上传后端模块
+下载完成后把文件分发到一个或多个远端存储，每种存储实现为一个 UploadBackend：
+- ftp: FTP（共享连接池 + 断点续传）
+- s3: S3 兼容对象存储（并行分片上传，需要 boto3）
+- sftp: SFTP（需要 paramiko）
+- webdav: WebDAV（HTTP PUT）
+
+每个后端通过 `<name>_enabled` 设置开启，`<name>_delete_after_upload` 控制上传成功后是否删除本地文件，
+并累计上传次数、失败次数、字节数与耗时，供 /api/stats 展示吞吐。
+"""
+import os
+import mmap
+import base64
+import hashlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+
+from ftp_uploader import ftp_pool
+
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+except ImportError:
+    boto3 = None
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+
+class UploadBackend:
+    """上传后端基类"""
+
+    name = ''
+    label = ''
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.Lock()
+        self.metrics = {
+            'uploads': 0,
+            'failures': 0,
+            'bytes': 0,
+            'seconds': 0.0,
+            'last_speed': 0
+        }
+
+    def setting(self, key, default=''):
+        return self.db.get_setting(f'{self.name}_{key}', default)
+
+    def int_setting(self, key, default):
+        try:
+            return int(self.setting(key, default))
+        except Exception:
+            return default
+
+    def is_enabled(self):
+        return self.setting('enabled', 'false') == 'true'
+
+    def delete_after_upload(self):
+        return self.setting('delete_after_upload', 'false') == 'true'
+
+    def log(self, task_id, message):
+        try:
+            self.db.add_log(task_id, f"[{self.label}] {message}")
+        except Exception:
+            pass
+
+    def make_progress(self, task_id):
+        """
+        生成节流的进度回调 (uploaded, total)：
+        按 upload_progress_interval 写入 upload_progress / upload_speed，日志每跨过 10% 只记一次
+        """
+        try:
+            interval = float(self.db.get_setting('upload_progress_interval', 2))
+        except Exception:
+            interval = 2.0
+        started = time.time()
+        state = {'last_report': 0.0, 'last_bytes': 0, 'last_bucket': -1}
+        lock = threading.Lock()
+
+        def progress(uploaded, total):
+            now = time.time()
+            finished = total > 0 and uploaded >= total
+            with lock:
+                if not finished and now - state['last_report'] < interval:
+                    return
+                elapsed = now - state['last_report'] if state['last_report'] else now - started
+                speed = (uploaded - state['last_bytes']) / elapsed if elapsed > 0 else 0
+                state['last_report'] = now
+                state['last_bytes'] = uploaded
+                percent = (uploaded / total) * 100 if total > 0 else 0
+                bucket = int(percent // 10)
+                new_bucket = bucket != state['last_bucket']
+                state['last_bucket'] = bucket
+            try:
+                self.db.update_task(task_id, upload_progress=round(percent, 1), upload_speed=int(speed))
+                if new_bucket:
+                    self.log(task_id, f"上传进度: {percent:.1f}% ({speed / 1024 / 1024:.2f} MB/s)")
+            except Exception:
+                pass
+
+        return progress
+
+    def upload(self, task_id, file_path):
+        """上传文件，返回是否成功；同时记录吞吐指标"""
+        started = time.time()
+        try:
+            size = os.path.getsize(file_path)
+        except Exception:
+            size = 0
+        try:
+            success = self._upload(task_id, file_path)
+        except Exception as e:
+            self.log(task_id, f"上传异常: {e}")
+            success = False
+
+        elapsed = max(time.time() - started, 1e-6)
+        with self.lock:
+            if success:
+                self.metrics['uploads'] += 1
+                self.metrics['bytes'] += size
+                self.metrics['seconds'] += elapsed
+                self.metrics['last_speed'] = int(size / elapsed)
+            else:
+                self.metrics['failures'] += 1
+
+        if success:
+            try:
+                self.db.update_task(task_id, upload_progress=100, upload_speed=int(size / elapsed))
+            except Exception:
+                pass
+            self.log(task_id, f"上传成功: {os.path.basename(file_path)}，{size / 1024 / 1024:.1f} MB 用时 {elapsed:.1f} 秒，平均 {size / elapsed / 1024 / 1024:.2f} MB/s")
+        return success
+
+    def _upload(self, task_id, file_path):
+        raise NotImplementedError
+
+    def get_metrics(self):
+        with self.lock:
+            m = dict(self.metrics)
+        m['avg_speed'] = int(m['bytes'] / m['seconds']) if m['seconds'] > 0 else 0
+        m['seconds'] = round(m['seconds'], 2)
+        return m
+
+
+class FTPBackend(UploadBackend):
+    """FTP 上传（共享连接池，失败后按远端大小断点续传）"""
+
+    name = 'ftp'
+    label = 'FTP'
+
+    def _upload(self, task_id, file_path):
+        ftp_host = self.setting('host', '')
+        ftp_port = self.int_setting('port', 21)
+        ftp_username = self.setting('username', '')
+        ftp_password = self.setting('password', '')
+        ftp_remote_dir = self.setting('remote_dir', '')
+        ftp_passive = self.setting('passive_mode', 'true') == 'true'
+
+        if not ftp_host or not ftp_username:
+            self.log(task_id, "配置不完整，跳过上传")
+            return False
+
+        self.log(task_id, f"开始上传到 {ftp_host}")
+
+        # ftp_pool_size 修改后对所有连接分组立即生效
+        ftp_pool.set_max_size(max(1, self.int_setting('pool_size', 4)))
+        uploader, msg = ftp_pool.acquire(
+            host=ftp_host,
+            port=ftp_port,
+            username=ftp_username,
+            password=ftp_password,
+            remote_dir=ftp_remote_dir,
+            use_passive=ftp_passive
+        )
+        if uploader is None:
+            self.log(task_id, f"连接失败: {msg}")
+            return False
+
+        self.log(task_id, f"{msg}，开始上传文件...")
+
+        blocksize = max(8192, self.int_setting('block_size', 1024 * 1024))
+        retries = max(0, self.int_setting('upload_retries', 3))
+        try:
+            backoff = float(self.setting('retry_backoff', 5))
+        except Exception:
+            backoff = 5.0
+
+        filename = os.path.basename(file_path)
+        stats = {'attempts': 1, 'resumed_bytes': 0}
+        try:
+            success, msg, stats = uploader.upload_file_resumable(
+                file_path, filename, self.make_progress(task_id), blocksize=blocksize,
+                retries=retries, backoff=backoff, log=lambda m: self.log(task_id, m)
+            )
+        except Exception as e:
+            success, msg = False, str(e)
+        # 上传失败的连接状态不确定，不放回连接池
+        ftp_pool.release(uploader, reusable=success)
+        if stats['attempts'] > 1:
+            self.log(task_id, f"共尝试 {stats['attempts']} 次，续传复用 {stats['resumed_bytes']} 字节")
+        if not success:
+            self.log(task_id, f"上传失败: {msg}")
+        return success
+
+
+class _MmapPartReader:
+    """把 mmap 的一段包装成只读文件对象，分片上传时按需读取而不整体复制到内存"""
+
+    def __init__(self, mm, start, length):
+        self.mm = mm
+        self.start = start
+        self.length = length
+        self.pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0 or self.pos + size > self.length:
+            size = self.length - self.pos
+        begin = self.start + self.pos
+        self.pos += size
+        return self.mm[begin:begin + size]
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self.pos = offset
+        elif whence == 1:
+            self.pos += offset
+        else:
+            self.pos = self.length + offset
+        self.pos = max(0, min(self.pos, self.length))
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def __len__(self):
+        return self.length
+
+
+class _ProgressFileReader:
+    """包装已打开的本地文件：每次读取后回调进度，并提供文件长度"""
+
+    def __init__(self, f, size, progress):
+        self.f = f
+        self.size = size
+        self.progress = progress
+        self.sent = 0
+
+    def read(self, size=-1):
+        chunk = self.f.read(size)
+        if chunk:
+            self.sent += len(chunk)
+            self.progress(self.sent, self.size)
+        return chunk
+
+    def __len__(self):
+        return self.size
+
+
+class S3Backend(UploadBackend):
+    """S3 兼容对象存储：大文件并行分片上传，同时在途的分片数受 s3_concurrency 限制"""
+
+    name = 's3'
+    label = 'S3'
+
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def _client(self):
+        endpoint = self.setting('endpoint_url', '') or None
+        concurrency = max(1, self.int_setting('concurrency', 4))
+        return boto3.client(
+            's3',
+            endpoint_url=endpoint,
+            region_name=self.setting('region', '') or None,
+            aws_access_key_id=self.setting('access_key', '') or None,
+            aws_secret_access_key=self.setting('secret_key', '') or None,
+            config=BotoConfig(max_pool_connections=concurrency + 2, retries={'max_attempts': 5})
+        )
+
+    def _upload(self, task_id, file_path):
+        if boto3 is None:
+            self.log(task_id, "服务器未安装 boto3，跳过上传")
+            return False
+        bucket = self.setting('bucket', '')
+        if not bucket:
+            self.log(task_id, "未配置 Bucket，跳过上传")
+            return False
+
+        prefix = self.setting('prefix', '').strip('/')
+        key = f"{prefix}/{os.path.basename(file_path)}" if prefix else os.path.basename(file_path)
+        part_size = max(self.MIN_PART_SIZE, self.int_setting('part_size', 16) * 1024 * 1024)
+        concurrency = max(1, self.int_setting('concurrency', 4))
+        size = os.path.getsize(file_path)
+        client = self._client()
+        progress = self.make_progress(task_id)
+
+        self.log(task_id, f"开始上传到 s3://{bucket}/{key}")
+        if size <= part_size:
+            with open(file_path, 'rb') as f:
+                client.put_object(Bucket=bucket, Key=key, Body=f)
+            progress(size, size)
+            return True
+
+        upload_id = client.create_multipart_upload(Bucket=bucket, Key=key)['UploadId']
+        part_count = (size + part_size - 1) // part_size
+        self.log(task_id, f"分片上传: {part_count} 个分片，每片 {part_size // 1024 // 1024} MB，并发 {concurrency}")
+
+        uploaded = {'bytes': 0}
+        counter_lock = threading.Lock()
+
+        try:
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                def upload_part(number):
+                    start = (number - 1) * part_size
+                    length = min(part_size, size - start)
+                    result = client.upload_part(
+                        Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                        Body=_MmapPartReader(mm, start, length), ContentLength=length
+                    )
+                    with counter_lock:
+                        uploaded['bytes'] += length
+                        done = uploaded['bytes']
+                    progress(done, size)
+                    return {'PartNumber': number, 'ETag': result['ETag']}
+
+                # 线程池大小即在途分片上限，每个分片只在读取时映射对应区间，不会整体载入内存
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    parts = list(pool.map(upload_part, range(1, part_count + 1)))
+
+            client.complete_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            return True
+        except Exception as e:
+            self.log(task_id, f"分片上传失败: {e}")
+            try:
+                client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            except Exception:
+                pass
+            return False
+
+
+def _ssh_fingerprint(key):
+    """OpenSSH 格式的 SHA256 指纹，如 SHA256:nThbg6kXUpJWGl7E1IGOCspRomTxdCARLviKw6E5SY8"""
+    digest = hashlib.sha256(key.asbytes()).digest()
+    return 'SHA256:' + base64.b64encode(digest).decode('ascii').rstrip('=')
+
+
+class SFTPBackend(UploadBackend):
+    """
+    SFTP 上传（paramiko）
+    连接时校验服务器主机密钥：优先使用 sftp_host_key（SHA256 指纹或 "类型 公钥" 一行），
+    否则查找 sftp_known_hosts（默认 ~/.ssh/known_hosts）；都没有或不匹配时拒绝连接。
+    私钥类型（RSA / ECDSA / Ed25519）按文件内容自动识别。
+    """
+
+    name = 'sftp'
+    label = 'SFTP'
+
+    def _known_hosts(self, host, port):
+        """返回 (known_hosts 中的主机名, 该主机已知的公钥 {类型: 公钥} 或 None)"""
+        path = os.path.expanduser(self.setting('known_hosts', '') or '~/.ssh/known_hosts')
+        host_keys = paramiko.HostKeys()
+        if os.path.exists(path):
+            host_keys.load(path)
+        name = host if port == 22 else f"[{host}]:{port}"
+        return name, host_keys.lookup(name)
+
+    def _prefer_known_key_types(self, transport, host, port):
+        """只用 known_hosts 中已有的密钥类型协商，避免服务器换用另一种类型的主机密钥导致误判"""
+        if self.setting('host_key', '').strip():
+            return
+        _, known = self._known_hosts(host, port)
+        if not known:
+            return
+        options = transport.get_security_options()
+        types = [t for t in options.key_types
+                 if t in known or (t.startswith('rsa-sha2-') and 'ssh-rsa' in known)]
+        if types:
+            options.key_types = types
+
+    def _verify_host_key(self, key, host, port):
+        """校验服务器公钥，不通过时抛出异常（此时尚未发送任何凭据）"""
+        fingerprint = _ssh_fingerprint(key)
+        expected = self.setting('host_key', '').strip()
+        if expected:
+            if ' ' in expected:
+                # known_hosts 格式的公钥："ssh-ed25519 AAAA..."
+                parts = expected.split()
+                matched = parts[0] == key.get_name() and parts[1] == key.get_base64()
+            else:
+                matched = expected.split(':', 1)[-1].rstrip('=') == fingerprint.split(':', 1)[1]
+            if not matched:
+                raise Exception(f"主机密钥与 sftp_host_key 不一致（服务器 {fingerprint}），可能存在中间人攻击，已拒绝连接")
+            return
+
+        name, known = self._known_hosts(host, port)
+        if known is None:
+            raise Exception(f"{name} 不在 known_hosts 中且未设置 sftp_host_key（服务器 {fingerprint}），已拒绝连接")
+        known_key = known.get(key.get_name())
+        if known_key is None or known_key.asbytes() != key.asbytes():
+            raise Exception(f"主机密钥与 known_hosts 不一致（服务器 {fingerprint}），可能存在中间人攻击，已拒绝连接")
+
+    def _load_private_key(self, key_path):
+        """按文件内容识别私钥类型"""
+        passphrase = self.setting('key_passphrase', '') or None
+        if hasattr(paramiko.PKey, 'from_path'):
+            return paramiko.PKey.from_path(key_path, password=passphrase.encode() if passphrase else None)
+        # paramiko 3.2 之前没有 PKey.from_path，逐个类型尝试
+        last_error = None
+        for key_class in (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey):
+            try:
+                return key_class.from_private_key_file(key_path, password=passphrase)
+            except paramiko.SSHException as e:
+                last_error = e
+        raise last_error
+
+    def _upload(self, task_id, file_path):
+        if paramiko is None:
+            self.log(task_id, "服务器未安装 paramiko，跳过上传")
+            return False
+        host = self.setting('host', '')
+        username = self.setting('username', '')
+        if not host or not username:
+            self.log(task_id, "配置不完整，跳过上传")
+            return False
+
+        port = self.int_setting('port', 22)
+        remote_dir = self.setting('remote_dir', '').rstrip('/')
+        key_path = self.setting('key_path', '')
+        transport = paramiko.Transport((host, port))
+        # 增大窗口和包大小，提升高延迟链路上的吞吐
+        transport.default_window_size = 64 * 1024 * 1024
+        transport.packetizer.REKEY_BYTES = pow(2, 40)
+        transport.packetizer.REKEY_PACKETS = pow(2, 40)
+        try:
+            self._prefer_known_key_types(transport, host, port)
+            transport.start_client(timeout=30)
+            # 先校验主机密钥，通过后才发送密码或公钥
+            self._verify_host_key(transport.get_remote_server_key(), host, port)
+            if key_path:
+                transport.auth_publickey(username, self._load_private_key(key_path))
+            else:
+                transport.auth_password(username, self.setting('password', ''))
+            sftp = paramiko.SFTPClient.from_transport(transport)
+
+            if remote_dir:
+                current = ''
+                for part in remote_dir.strip('/').split('/'):
+                    current += '/' + part
+                    try:
+                        sftp.stat(current)
+                    except IOError:
+                        sftp.mkdir(current)
+
+            remote_path = f"{remote_dir}/{os.path.basename(file_path)}" if remote_dir else os.path.basename(file_path)
+            self.log(task_id, f"开始上传到 {host}:{remote_path}")
+            sftp.put(file_path, remote_path, callback=self.make_progress(task_id))
+            sftp.close()
+            return True
+        except Exception as e:
+            self.log(task_id, f"上传失败: {e}")
+            return False
+        finally:
+            transport.close()
+
+
+class WebDAVBackend(UploadBackend):
+    """WebDAV 上传：MKCOL 逐级创建目录，PUT 流式上传"""
+
+    name = 'webdav'
+    label = 'WebDAV'
+
+    def __init__(self, db):
+        super().__init__(db)
+        self.session = requests.Session()
+
+    def _upload(self, task_id, file_path):
+        base_url = self.setting('url', '').rstrip('/')
+        if not base_url:
+            self.log(task_id, "未配置 WebDAV 地址，跳过上传")
+            return False
+        username = self.setting('username', '')
+        auth = (username, self.setting('password', '')) if username else None
+        remote_dir = self.setting('remote_dir', '').strip('/')
+
+        url = base_url
+        for part in [p for p in remote_dir.split('/') if p]:
+            url += '/' + quote(part)
+            # 目录已存在时返回 405，忽略
+            self.session.request('MKCOL', url, auth=auth, timeout=30)
+
+        target = f"{url}/{quote(os.path.basename(file_path))}"
+        size = os.path.getsize(file_path)
+
+        self.log(task_id, f"开始上传到 {target}")
+        # 传入文件对象，requests 按 __len__ 设置 Content-Length 并流式发送（不使用 chunked）
+        with open(file_path, 'rb') as f:
+            response = self.session.put(target, data=_ProgressFileReader(f, size, self.make_progress(task_id)),
+                                        auth=auth, timeout=(30, 600))
+        if response.status_code not in (200, 201, 204):
+            self.log(task_id, f"上传失败: HTTP {response.status_code} {response.text[:200]}")
+            return False
+        return True
+
+
+BACKEND_CLASSES = [FTPBackend, S3Backend, SFTPBackend, WebDAVBackend]
+
+
+def create_backends(db):
+    """实例化所有上传后端（是否启用在上传时按设置判断）"""
+    return [cls(db) for cls in BACKEND_CLASSES]
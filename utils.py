@@ -1,6 +1,11 @@
 from flask import request, jsonify
 from functools import wraps
+from collections import OrderedDict
 import secrets
+import hashlib
+import hmac
+import threading
+import time
 from pathlib import Path
 
 # 尝试使用 bcrypt，如果不可用会提示在运行时安装
@@ -16,6 +21,20 @@ if not secret_file.exists():
     secret_file.write_text(secrets.token_hex(32))
 SECRET_KEY = secret_file.read_text().strip()
 
+# 已验证过的 X-Admin-Password：HMAC(存储的密码哈希 + 请求头) -> 过期时间
+# bcrypt 每个凭据只验证一次；修改密码后存储的哈希变化，旧记录自然失效
+VERIFIED_CACHE_TTL = 300
+VERIFIED_CACHE_SIZE = 256
+_verified_lock = threading.Lock()
+_verified_credentials = OrderedDict()
+
+
+def _safe_equals(a, b):
+    """常量时间比较，避免通过响应时间逐字节猜测 token / API Key"""
+    if not a or not b:
+        return False
+    return hmac.compare_digest(str(a).encode('utf-8'), str(b).encode('utf-8'))
+
 def get_admin_password(db):
     """
     兼容函数：返回任一表示已初始化的值（旧的 admin_password 或 新的 admin_password_hash）
@@ -65,7 +84,7 @@ def verify_password(password, db):
             # 处理 sha256 fallback
             stored_hash = hash_val.split(':', 1)[1]
             current_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-            return current_hash == stored_hash
+            return _safe_equals(current_hash, stored_hash)
         elif bcrypt:
             try:
                 return bcrypt.checkpw(password.encode('utf-8'), hash_val.encode('utf-8'))
@@ -75,7 +94,7 @@ def verify_password(password, db):
     # 兼容旧明文存储
     old = db.get_setting('admin_password')
     if old:
-        return password == old
+        return _safe_equals(password, old)
     return False
 
 def set_auth_token(db, token):
@@ -89,31 +108,59 @@ def verify_auth_token(token, db):
     if not token:
         return False
     stored = get_auth_token(db)
-    return stored == token
+    return _safe_equals(stored, token)
+
+
+def verify_password_cached(password, db, stored_hash):
+    """
+    带缓存的密码验证，用于每个请求都携带 X-Admin-Password 的 API 客户端
+    只缓存验证成功的结果，错误密码每次仍走完整的 bcrypt 验证
+    """
+    key = hmac.new(SECRET_KEY.encode('utf-8'), f"{stored_hash}\0{password}".encode('utf-8'),
+                   hashlib.sha256).hexdigest()
+    now = time.time()
+    with _verified_lock:
+        expires = _verified_credentials.get(key)
+        if expires and expires > now:
+            return True
+
+    if not verify_password(password, db):
+        return False
+
+    with _verified_lock:
+        _verified_credentials[key] = now + VERIFIED_CACHE_TTL
+        _verified_credentials.move_to_end(key)
+        while len(_verified_credentials) > VERIFIED_CACHE_SIZE:
+            _verified_credentials.popitem(last=False)
+    return True
 
 def require_auth(db):
     """验证密码装饰器工厂函数"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            # 只取一次设置（已按文件变化缓存，不会每次解析 settings.json）
+            settings = db.get_all_settings()
+            stored_hash = settings.get('admin_password_hash') or settings.get('admin_password')
+
             # 检查系统是否已初始化
-            if not get_admin_password(db):
+            if not stored_hash:
                  return jsonify({'error': '系统未初始化', 'code': 'NOT_INITIALIZED'}), 403
 
             # 1. 检查 API Key (如果开启)
             api_key = request.headers.get('X-API-Key')
             if api_key:
-                if db.get_setting('api_enabled') == 'true' and api_key == db.get_setting('api_key'):
+                if settings.get('api_enabled') == 'true' and _safe_equals(api_key, settings.get('api_key')):
                     return f(*args, **kwargs)
 
             # 2. 检查 Cookie token（随机 token 存储在 settings.auth_token）
             token = request.cookies.get('auth_token')
-            if token and verify_auth_token(token, db):
+            if token and _safe_equals(token, settings.get('auth_token')):
                 return f(*args, **kwargs)
 
-            # 3. 检查 Header 密码（兼容旧方式），使用 verify_password 进行哈希/明文验证
+            # 3. 检查 Header 密码（兼容旧方式），验证成功的凭据短时间缓存，避免每个请求都做 bcrypt
             password = request.headers.get('X-Admin-Password')
-            if password and verify_password(password, db):
+            if password and verify_password_cached(password, db, stored_hash):
                 return f(*args, **kwargs)
 
             return jsonify({'error': '未授权，请重新登录或提供有效的 API Key'}), 401
@@ -0,0 +1,329 @@
+"""
+视频文件输出（/videos/<filename> 与 /api/download/<id>）
+- 正确处理单个与多个 Range（multipart/byteranges），不满足时返回 416
+- ETag / Last-Modified / If-None-Match / If-Range，Cache-Control
+- 打开的文件描述符放在一个小的 LRU 缓存里，拖动进度条产生的大量小 Range 请求不必反复 open/stat；
+  读取使用 os.pread，多个请求可以安全地共享同一个 fd
+- Range 一直到文件末尾时（浏览器拖动时最常见的 bytes=N-）交给 WSGI 服务器的 wsgi.file_wrapper，
+  gunicorn 等服务器会用 sendfile 零拷贝发送
+- 设置 video_accel_redirect 后只返回 X-Accel-Redirect，由 Nginx 负责发送文件
+"""
+import os
+import re
+import stat
+import time
+import threading
+import mimetypes
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from flask import request, Response, jsonify
+from werkzeug.security import safe_join
+
+CHUNK_SIZE = 256 * 1024
+# Range 数量上限，超过时按整个文件返回，防止构造大量小 Range 放大开销
+MAX_RANGES = 16
+
+_RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class _CachedFile:
+    def __init__(self, path, fd, st):
+        self.path = path
+        self.fd = fd
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        self.checked_at = time.time()
+        self.last_used = self.checked_at
+        self.refs = 0
+        self.evicted = False
+
+
+class OpenFileCache:
+    """按路径缓存已打开的 fd；超过 revalidate 秒重新 stat，文件被替换或删除时自动失效"""
+
+    def __init__(self, max_size=32, revalidate=2.0, idle_timeout=60):
+        self.max_size = max_size
+        self.revalidate = revalidate
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, path):
+        """返回引用计数 +1 的缓存项，文件不存在时抛出 FileNotFoundError"""
+        now = time.time()
+        with self.lock:
+            self._sweep_idle(now)
+            entry = self.entries.get(path)
+            if entry and now - entry.checked_at > self.revalidate:
+                try:
+                    st = os.stat(path)
+                    stale = st.st_size != entry.size or st.st_mtime != entry.mtime
+                except OSError:
+                    stale = True
+                if stale:
+                    self._evict(path)
+                    entry = None
+                else:
+                    entry.checked_at = now
+            if entry:
+                self.entries.move_to_end(path)
+                entry.last_used = now
+                entry.refs += 1
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # 打开文件放在锁外，慢速磁盘不阻塞其它请求
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                raise FileNotFoundError(path)
+        except Exception:
+            os.close(fd)
+            raise
+        entry = _CachedFile(path, fd, st)
+        entry.refs = 1
+        with self.lock:
+            if path in self.entries:
+                self._evict(path)
+            self.entries[path] = entry
+            while len(self.entries) > self.max_size:
+                self._evict(next(iter(self.entries)))
+        return entry
+
+    def release(self, entry):
+        with self.lock:
+            entry.refs -= 1
+            if entry.evicted and entry.refs <= 0:
+                self._close(entry)
+
+    def invalidate(self, path):
+        """文件被删除或替换时调用，立即关闭缓存的 fd"""
+        path = os.path.abspath(path)
+        with self.lock:
+            if path in self.entries:
+                self._evict(path)
+
+    def _sweep_idle(self, now):
+        """关闭长时间未使用的 fd，避免已删除的大文件一直占用磁盘空间"""
+        for path in [p for p, e in self.entries.items() if e.refs <= 0 and now - e.last_used > self.idle_timeout]:
+            self._evict(path)
+
+    def _evict(self, path):
+        entry = self.entries.pop(path)
+        entry.evicted = True
+        if entry.refs <= 0:
+            self._close(entry)
+
+    def _close(self, entry):
+        try:
+            os.close(entry.fd)
+        except OSError:
+            pass
+
+    def get_stats(self):
+        with self.lock:
+            return {'open_files': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+file_cache = OpenFileCache()
+
+
+class _RangeStream:
+    """用 pread 输出一个或多个区间；WSGI 服务器结束响应时调用 close 释放缓存引用"""
+
+    def __init__(self, entry, parts):
+        self.entry = entry
+        self.parts = parts  # [(前缀 bytes, start, end), ...]，end 为包含的最后一个字节
+        self.closed = False
+
+    def __iter__(self):
+        fd = self.entry.fd
+        for prefix, start, end in self.parts:
+            if prefix:
+                yield prefix
+            offset = start
+            while offset <= end:
+                data = os.pread(fd, min(CHUNK_SIZE, end - offset + 1), offset)
+                if not data:
+                    # 文件在响应过程中被截断：Content-Length 已经发出，静默结束会让客户端把
+                    # 不完整的内容当成完整响应缓存下来，抛出异常让服务器中断连接
+                    file_cache.invalidate(self.entry.path)
+                    raise IOError(f"文件在输出过程中被截断: {self.entry.path} ({offset}/{end + 1})")
+                offset += len(data)
+                yield data
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            file_cache.release(self.entry)
+
+
+def parse_ranges(header, size):
+    """
+    解析 Range 头，返回 [(start, end), ...]；
+    头无效或区间过多时返回 None（按整个文件响应），所有区间都无法满足时返回 []
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    specs = header[6:].split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs:
+        match = _RANGE_RE.match(spec)
+        if not match or (not match.group(1) and not match.group(2)):
+            return None
+        first, last = match.group(1), match.group(2)
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+        else:
+            # bytes=-N：最后 N 个字节
+            length = int(last)
+            if length == 0:
+                continue
+            start = max(0, size - length)
+            end = size - 1
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+    return ranges
+
+
+def _not_modified(entry):
+    inm = request.headers.get('If-None-Match')
+    if inm:
+        return entry.etag in [t.strip() for t in inm.split(',')] or inm.strip() == '*'
+    ims = request.headers.get('If-Modified-Since')
+    if ims:
+        try:
+            return int(entry.mtime) <= parsedate_to_datetime(ims).timestamp()
+        except Exception:
+            return False
+    return False
+
+
+def _if_range_matches(entry):
+    """If-Range 不匹配时应忽略 Range 返回整个文件"""
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith('W/'):
+        return value == entry.etag
+    try:
+        return int(entry.mtime) <= parsedate_to_datetime(value).timestamp()
+    except Exception:
+        return False
+
+
+def send_video(path, as_attachment=False, max_age=3600, public=True, accel_prefix='', accel_name=None):
+    """
+    输出视频文件；path 必须是已经过 safe_join 校验的本地路径
+    accel_name: 相对下载目录的文件名，用于拼接 X-Accel-Redirect（默认取 path 的文件名）
+    """
+    filename = os.path.basename(path)
+    disposition = 'attachment' if as_attachment else 'inline'
+    disposition = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+    if accel_prefix:
+        # Nginx 内部 location 负责 Range 与 sendfile
+        if not os.path.isfile(path):
+            return jsonify({'error': '文件不存在'}), 404
+        response = Response(status=200)
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(accel_name or filename)
+        response.headers['Content-Disposition'] = disposition
+        return response
+
+    try:
+        entry = file_cache.acquire(path)
+    except OSError:
+        return jsonify({'error': '文件不存在'}), 404
+
+    try:
+        size = entry.size
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'ETag': entry.etag,
+            'Last-Modified': formatdate(entry.mtime, usegmt=True),
+            'Cache-Control': f"{'public' if public else 'private'}, max-age={int(max_age)}",
+            'Content-Disposition': disposition,
+        }
+
+        if _not_modified(entry):
+            file_cache.release(entry)
+            return Response(status=304, headers=headers)
+
+        ranges = parse_ranges(request.headers.get('Range'), size) if _if_range_matches(entry) else None
+        if ranges == []:
+            file_cache.release(entry)
+            headers['Content-Range'] = f'bytes */{size}'
+            return Response(status=416, headers=headers)
+
+        if ranges is None:
+            status, start, end = 200, 0, size - 1
+        elif len(ranges) == 1:
+            status, (start, end) = 206, ranges[0]
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            return _multipart_response(entry, ranges, mimetype, headers)
+
+        headers['Content-Length'] = str(end - start + 1)
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper and end == size - 1 and size > 0:
+            # 一直到文件末尾的区间交给服务器（gunicorn 会用 sendfile）；
+            # 需要独立的文件偏移，所以单独打开一次，缓存的 fd 不动
+            file_cache.release(entry)
+            f = open(path, 'rb')
+            f.seek(start)
+            body = file_wrapper(f, CHUNK_SIZE)
+        else:
+            body = _RangeStream(entry, [(b'', start, end)] if size > 0 else [])
+        return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
+    except Exception:
+        file_cache.release(entry)
+        raise
+
+
+def _multipart_response(entry, ranges, mimetype, headers):
+    boundary = os.urandom(12).hex()
+    parts = []
+    length = 0
+    for start, end in ranges:
+        prefix = (f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n'
+                  f'Content-Range: bytes {start}-{end}/{entry.size}\r\n\r\n').encode('ascii')
+        parts.append((prefix, start, end))
+        length += len(prefix) + end - start + 1
+    closing = f'\r\n--{boundary}--\r\n'.encode('ascii')
+    length += len(closing)
+    parts.append((closing, 1, 0))  # 空区间：只输出结尾分隔符
+    headers['Content-Length'] = str(length)
+    return Response(_RangeStream(entry, parts), status=206, headers=headers,
+                    content_type=f'multipart/byteranges; boundary={boundary}', direct_passthrough=True)
+
+
+def video_settings(db):
+    """视频输出相关设置（storage 已按 settings.json 的变化缓存，这里每次直接读取，修改立即生效）"""
+    values = {
+        'download_dir': db.get_setting('download_dir', './downloads'),
+        'accel_prefix': db.get_setting('video_accel_redirect', '') or '',
+    }
+    try:
+        values['max_age'] = int(db.get_setting('video_cache_max_age', 3600))
+    except Exception:
+        values['max_age'] = 3600
+    return values
+
+
+def resolve_video_path(download_dir, filename):
+    """把文件名限制在下载目录内，越界时返回 None"""
+    return safe_join(os.path.abspath(download_dir), filename)